@@ -1,8 +1,11 @@
 # Write the benchmarking functions here.
 # See "Writing benchmarks" in the asv docs for more information.
+import tempfile
+from pathlib import Path
+
 import numpy as np
 
-from streamtracer import StreamTracer, VectorGrid
+from streamtracer import StreamTracer, TiledVectorGrid, VectorGrid
 
 
 class TimeSuite:
@@ -22,6 +25,181 @@ class TimeSuite:
         self.tracer.trace(seed, self.grid)
 
 
+class InterpolationSuite:
+    """
+    Compare linear and cubic interpolation when tracing through a helical field.
+
+    The field lines are known analytically, so each benchmark picks the
+    largest step size that gets the footpoint at the top of the box to within
+    ``tolerance`` of the exact value.
+    """
+
+    params = ["linear", "cubic"]
+    param_names = ["interpolation"]
+    tolerance = 1e-3
+    step_sizes = 0.5 ** np.arange(1, 12)
+    n_seeds = 50
+
+    def setup(self, interpolation):
+        xcoords = np.linspace(-3, 3, 13)
+        self.zcoords = np.linspace(0, 6, 25)
+        _, _, z = np.meshgrid(xcoords, xcoords, self.zcoords, indexing="ij")
+        v = np.stack([np.cos(z), np.sin(z), np.ones_like(z)], axis=-1)
+        self.grid = VectorGrid(
+            v, grid_coords=[xcoords, xcoords, self.zcoords], interpolation=interpolation
+        )
+        rng = np.random.default_rng(seed=42)
+        self.seeds = np.zeros((self.n_seeds, 3))
+        self.seeds[:, :2] = rng.uniform(-0.5, 0.5, size=(self.n_seeds, 2))
+        self.step_size = next(
+            step
+            for step in self.step_sizes
+            if self._footpoint_error(step) < self.tolerance
+        )
+
+    def _tracer(self, step_size):
+        # Enough steps to reach the top of the box, as the field lines have a
+        # length of sqrt(2) times the height of the box, with a 10% margin
+        max_steps = int(np.ceil(1.1 * np.sqrt(2) * self.zcoords[-1] / step_size))
+        return StreamTracer(max_steps, step_size)
+
+    def _footpoint_error(self, step_size):
+        tracer = self._tracer(step_size)
+        tracer.trace(self.seeds, self.grid, direction=1)
+        top = self.zcoords[-1]
+        errors = []
+        for seed, xs in zip(self.seeds, tracer.xs, strict=True):
+            # Linearly interpolate between the last two points to the top boundary
+            (x0, y0, z0), (x1, y1, z1) = xs[-2:]
+            f = (top - z0) / (z1 - z0)
+            x, y = x0 + f * (x1 - x0), y0 + f * (y1 - y0)
+            exact = seed[0] + np.sin(top), seed[1] + 1 - np.cos(top)
+            errors.append(np.hypot(x - exact[0], y - exact[1]))
+        return np.max(errors)
+
+    def track_steps_to_tolerance(self, interpolation):
+        return int(np.ceil(np.sqrt(2) * self.zcoords[-1] / self.step_size))
+
+    track_steps_to_tolerance.unit = "steps"
+
+    def time_trace_to_tolerance(self, interpolation):
+        tracer = self._tracer(self.step_size)
+        tracer.trace(self.seeds, self.grid, direction=1)
+
+
+class IncrementalSuite:
+    """
+    Compare a full trace with an incremental re-trace after a local change to the field.
+
+    The field is perturbed in a box that covers ``fraction`` of the cells
+    along y and z, so roughly that fraction squared of the streamlines pass
+    through the changed region and need re-tracing.
+    """
+
+    params = [0.05, 0.2, 1.0]
+    param_names = ["fraction"]
+
+    def setup(self, fraction):
+        n = 64
+        v = np.zeros((n, n, n, 3))
+        v[..., 0] = 1
+        self.grid = VectorGrid(v, [1, 1, 1])
+        v_new = v.copy()
+        width = max(int(fraction * n), 2)
+        v_new[:, :width, :width, 1] = 0.01
+        self.new_grid = VectorGrid(v_new, [1, 1, 1])
+
+        rng = np.random.default_rng(seed=42)
+        self.seeds = rng.uniform(0, n - 1, size=(2000, 3))
+        self.seeds[:, 0] = 0
+        self.tracer = StreamTracer(1000, 0.1)
+        self.tracer.trace(self.seeds, self.grid, direction=1, record_cells=True)
+
+    def time_full_trace(self, fraction):
+        tracer = StreamTracer(1000, 0.1)
+        tracer.trace(self.seeds, self.new_grid, direction=1)
+
+    def time_retrace(self, fraction):
+        self.tracer.retrace(self.new_grid)
+
+    # Retracing replaces the grid on the tracer, so run setup before every call
+    time_retrace.number = 1
+
+    def track_fraction_retraced(self, fraction):
+        tracer = StreamTracer(1000, 0.1)
+        tracer.trace(self.seeds, self.grid, direction=1, record_cells=True)
+        return len(tracer.retrace(self.new_grid)) / len(self.seeds)
+
+    track_fraction_retraced.unit = "fraction"
+
+
+class ConstructionSuite:
+    """
+    Time and peak memory of creating a cyclic grid from a field stored on disk.
+    """
+
+    params = [True, False]
+    param_names = ["validate"]
+    shape = (128, 128, 128, 3)
+
+    def setup(self, validate):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = Path(self.tmpdir.name) / "field.dat"
+        v = np.memmap(path, dtype=np.float64, mode="w+", shape=self.shape)
+        v[..., 0] = 1
+        v.flush()
+        del v
+        self.vectors = np.memmap(path, dtype=np.float64, mode="r", shape=self.shape)
+
+    def teardown(self, validate):
+        del self.vectors
+        self.tmpdir.cleanup()
+
+    def time_construct(self, validate):
+        VectorGrid(
+            self.vectors, [1, 1, 1], cyclic=[True, True, True], validate=validate
+        )
+
+    def peakmem_construct(self, validate):
+        VectorGrid(
+            self.vectors, [1, 1, 1], cyclic=[True, True, True], validate=validate
+        )
+
+    def time_coords(self, validate):
+        grid = VectorGrid(self.vectors, [1, 1, 1], validate=validate)
+        for _ in range(100):
+            coords = [grid.xcoords, grid.ycoords, grid.zcoords]
+        return coords
+
+
+class TiledSuite:
+    """
+    Trace through a tiled field, with seeds spread over every tile or all in one tile.
+    """
+
+    params = ["spread", "one_tile"]
+    param_names = ["seeds"]
+
+    def setup(self, seeds):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        v = np.zeros((64, 64, 64, 3))
+        v[..., 0] = 1
+        v[..., 1] = 0.1
+        TiledVectorGrid.write(self.tmpdir.name, v, tile_shape=(16, 16, 16))
+        self.grid = TiledVectorGrid(self.tmpdir.name, [1, 1, 1])
+
+        rng = np.random.default_rng(seed=42)
+        high = 63 if seeds == "spread" else 15
+        self.seeds = rng.uniform(0, high, size=(2000, 3))
+        self.tracer = StreamTracer(1000, 0.1)
+
+    def teardown(self, seeds):
+        self.tmpdir.cleanup()
+
+    def time_trace(self, seeds):
+        self.tracer.trace(self.seeds, self.grid, direction=1)
+
+
 """
 class MemSuite:
     def mem_list(self):
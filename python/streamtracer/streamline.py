@@ -1,8 +1,35 @@
+import json
+import zlib
+import asyncio
+import itertools
+from pathlib import Path
+
 import numpy as np
 
-from streamtracer._streamtracer_rust import trace_streamlines
+from streamtracer._streamtracer_rust import (
+    CellBvh,
+    TileCache,
+    cyclic_faces_match,
+    deposit_density,
+    find_nulls,
+    interpolate_scalars,
+    interpolate_vectors,
+    line_integral_convolution,
+    trace_streamlines,
+    trace_streamlines_curvilinear,
+    trace_streamlines_multiblock,
+    trace_streamlines_recording,
+    trace_streamlines_tiled,
+)
 
-__all__ = ["StreamTracer", "VectorGrid"]
+__all__ = [
+    "CurvilinearGrid",
+    "MultiBlockGrid",
+    "NullPoints",
+    "StreamTracer",
+    "TiledVectorGrid",
+    "VectorGrid",
+]
 
 
 class VectorGrid:
@@ -33,6 +60,28 @@ class VectorGrid:
     grid_coords : list[array], optional
         A list of length 3 storing the (x, y, z) coordinates of the grid. If not
         specified ``grid_spacing`` must be specified.
+    interpolation : {"linear", "cubic"}, optional
+        How to interpolate the vectors between grid points. ``"linear"`` (the
+        default) uses tri-linear interpolation. ``"cubic"`` uses tricubic
+        Hermite interpolation, which is smooth across cell faces and so allows
+        larger step sizes for the same accuracy. The derivatives it needs are
+        estimated with finite differences the first time they are used, and
+        cached on the grid, taking seven times the memory of *vectors*.
+    validate : `bool`, optional
+        Whether to check that the vectors match on each side of any cyclic
+        dimensions whenever *cyclic* is set. Defaults to `True`. Checking
+        reads both faces of the grid, which can be slow for large fields
+        stored on disk, so it can be turned off and run later (or not at all)
+        with `VectorGrid.validate`.
+
+    Notes
+    -----
+    The grid coordinates are computed the first time they are used, and cached
+    as read-only arrays. The cached coordinates, along with any cached
+    derivatives used for cubic interpolation, are cleared whenever *vectors*,
+    *grid_spacing*, *grid_coords*, *origin_coord* or *cyclic* are reassigned.
+    Modifying *vectors* in place does not clear them, so reassign *vectors*
+    after modifying it when using cubic interpolation.
     """
 
     def __init__(
@@ -43,6 +92,8 @@ class VectorGrid:
         cyclic=None,
         *,
         grid_coords=None,
+        interpolation="linear",
+        validate=True,
     ):
         if grid_spacing is not None and grid_coords is not None:
             raise ValueError(
@@ -56,11 +107,13 @@ class VectorGrid:
             raise ValueError(
                 'Specifying both "grid_coords" and "origin_coord" is ambiguous.'
             )
+        self._validate = validate
         self.grid_spacing = grid_spacing
         self.vectors = vectors
         self.cyclic = cyclic
         self.coords = grid_coords
         self.origin_coord = origin_coord
+        self.interpolation = interpolation
 
     @property
     def grid_spacing(self):
@@ -78,6 +131,7 @@ class VectorGrid:
                     f"grid spacing must have shape (3,), got " f"{val.shape}"
                 )
         self._grid_spacing = val
+        self._reset_caches()
 
     @property
     def vectors(self):
@@ -95,6 +149,7 @@ class VectorGrid:
                 "vectors must have shape (nx, ny, nz, 3), " f"got {val.shape}"
             )
         self._vectors = val
+        self._reset_caches()
 
     @property
     def coords(self):
@@ -116,6 +171,7 @@ class VectorGrid:
                         f"coordinates but got {shape}"
                     )
         self._coords = val
+        self._reset_caches()
 
     @property
     def cyclic(self):
@@ -129,23 +185,100 @@ class VectorGrid:
     def cyclic(self, val):
         if val is None:
             val = [False, False, False]
+        if self._validate:
+            self._check_cyclic_faces(val)
+        self._cyclic = np.array(val, dtype=bool)
+        self._reset_caches()
+
+    def validate(self):
+        """
+        Check that the vectors match on each side of any cyclic dimensions.
+
+        This is done automatically when *cyclic* is set, unless the grid was
+        created with ``validate=False``.
+
+        Raises
+        ------
+        AssertionError
+            If the vectors do not match on each side of a cyclic dimension.
+        """
+        self._check_cyclic_faces(self.cyclic)
+
+    def _check_cyclic_faces(self, cyclic):
         dims = {0: "x", 1: "y", 2: "z"}
         s = [slice(None)] * 4
-        for i, c in enumerate(val):
-            if c:
-                slc = s.copy()
-                slc[i] = slice(0, 1)
-                side1 = self.vectors[tuple(slc)]
-                slc[i] = slice(-1, None)
-                side2 = self.vectors[tuple(slc)]
-
-                np.testing.assert_equal(
-                    side1,
-                    side2,
-                    err_msg=f"grid values in dimension {dims[i]} (size {self.vectors.shape[i]}) "
-                    "do not match on each side of the cube",
+        for i, c in enumerate(cyclic):
+            if not c:
+                continue
+            # Fast check that doesn't copy the faces, for numpy arrays of
+            # native byte order floats
+            if (
+                isinstance(self.vectors, np.ndarray)
+                and self.vectors.dtype.isnative
+                and self.vectors.dtype.type in (np.float32, np.float64)
+                and cyclic_faces_match(self.vectors, i)
+            ):
+                continue
+            slc = s.copy()
+            slc[i] = slice(0, 1)
+            side1 = self.vectors[tuple(slc)]
+            slc[i] = slice(-1, None)
+            side2 = self.vectors[tuple(slc)]
+
+            np.testing.assert_equal(
+                side1,
+                side2,
+                err_msg=f"grid values in dimension {dims[i]} (size {self.vectors.shape[i]}) "
+                "do not match on each side of the cube",
+            )
+
+    def _reset_caches(self):
+        """
+        Clear the coordinates and derivatives cached on the grid.
+        """
+        self._coord_cache = None
+        self._relative_coord_cache = None
+        self._derivative_cache = None
+
+    @property
+    def interpolation(self):
+        """
+        How the vectors are interpolated between grid points, either ``"linear"`` or ``"cubic"``.
+        """
+        return self._interpolation
+
+    @interpolation.setter
+    def interpolation(self, val):
+        if val not in ("linear", "cubic"):
+            raise ValueError(f'interpolation must be "linear" or "cubic" (got {val!r})')
+        self._interpolation = val
+
+    @property
+    def _derivatives(self):
+        """
+        Derivatives of the vectors used for cubic interpolation, or `None` for linear interpolation.
+
+        This is a (7, nx, ny, nz, 3) shaped array of the derivatives with
+        respect to (x, y, z, xy, xz, yz, xyz). It is computed on first use and
+        cached until the vectors or grid are reassigned.
+        """
+        if self.interpolation == "linear":
+            return None
+        if self._derivative_cache is None:
+            coords = self._relative_coords()
+            vectors = np.asarray(self.vectors, dtype=np.float64)
+            # Write each derivative straight into the output, so only one
+            # temporary gradient exists at a time
+            derivatives = np.empty((7, *vectors.shape))
+            for i in range(3):
+                derivatives[i] = _gradient(vectors, coords[i], i, self.cyclic[i])
+            # (xy, xz, yz, xyz) from (x, x, y, xy), along (y, z, z, z)
+            for i, source, axis in [(3, 0, 1), (4, 0, 2), (5, 1, 2), (6, 3, 2)]:
+                derivatives[i] = _gradient(
+                    derivatives[source], coords[axis], axis, self.cyclic[axis]
                 )
-        self._cyclic = np.array(val, dtype=bool)
+            self._derivative_cache = derivatives
+        return self._derivative_cache
 
     @property
     def origin_coord(self):
@@ -165,14 +298,20 @@ class VectorGrid:
                 )
         else:
             self._origin_coord = np.array(val)
+        self._reset_caches()
 
     def _get_coords(self, i):
-        if self.grid_spacing is not None:
-            return (
-                self.grid_spacing[i] * np.arange(self.vectors.shape[i])
-                + self.origin_coord[i]
-            )
-        return self.coords[i]
+        if self._coord_cache is None:
+            if self.grid_spacing is not None:
+                coords = [
+                    self.grid_spacing[j] * np.arange(self.vectors.shape[j])
+                    + self.origin_coord[j]
+                    for j in range(3)
+                ]
+            else:
+                coords = [np.array(self.coords[j]) for j in range(3)]
+            self._coord_cache = _read_only(coords)
+        return self._coord_cache[i]
 
     @property
     def xcoords(self):
@@ -195,6 +334,1021 @@ class VectorGrid:
         """
         return self._get_coords(2)
 
+    def interpolate(self, points, out=None):
+        """
+        Interpolate the vectors at a set of points.
+
+        Interpolation uses the same scheme as tracing (see
+        `VectorGrid.interpolation`), and is done in parallel. Points are first
+        wrapped across any cyclic boundaries, and points that are then outside
+        the grid are given a value of NaN.
+
+        Parameters
+        ----------
+        points : array-like with shape ``(n, 3)``
+            Points to interpolate at.
+        out : `numpy.ndarray`, optional
+            A ``float64`` array with shape ``(n, 3)`` to write the interpolated
+            vectors to. If not given a new array is created.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            Interpolated vectors, with shape ``(n, 3)``.
+        """
+        points = self._interpolation_points(points)
+        out = _check_out(out, (points.shape[0], 3))
+        xcoords, ycoords, zcoords = self._relative_coords()
+        interpolate_vectors(
+            points,
+            xcoords,
+            ycoords,
+            zcoords,
+            self.vectors,
+            self.cyclic,
+            self._derivatives,
+            out,
+        )
+        return out
+
+    def interpolate_scalar(self, values, points, out=None):
+        """
+        Interpolate a scalar defined on the same grid as the vectors.
+
+        Interpolation is tri-linear and is done in parallel. Points are first
+        wrapped across any cyclic boundaries, and points that are then outside
+        the grid are given a value of NaN.
+
+        Parameters
+        ----------
+        values : array-like
+            A (nx, ny, nz) shaped array of scalar values at each grid point.
+        points : array-like with shape ``(n, 3)``
+            Points to interpolate at.
+        out : `numpy.ndarray`, optional
+            A ``float64`` array with shape ``(n,)`` to write the interpolated
+            values to. If not given a new array is created.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            Interpolated values, with shape ``(n,)``.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != self.vectors.shape[:3]:
+            raise ValueError(
+                f"values must have shape {self.vectors.shape[:3]}, got {values.shape}"
+            )
+        points = self._interpolation_points(points)
+        out = _check_out(out, (points.shape[0],))
+        xcoords, ycoords, zcoords = self._relative_coords()
+        interpolate_scalars(points, xcoords, ycoords, zcoords, values, self.cyclic, out)
+        return out
+
+    def find_nulls(self):
+        """
+        Find the null points of the vectors, where all three components vanish.
+
+        Cells where any component of the vectors does not change sign between
+        the cell corners are skipped, and then nulls are found in the
+        remaining cells in parallel using Newton iterations. Nulls are found
+        in the tri-linear interpolation of the vectors, regardless of
+        `VectorGrid.interpolation`, and at most one null is found in each cell.
+        Nulls on a cyclic boundary are only returned once, at the lower end of
+        the cyclic axis.
+
+        Returns
+        -------
+        `NullPoints`
+        """
+        positions, jacobians = find_nulls(
+            *self._relative_coords(), self.vectors, self.cyclic
+        )
+        return NullPoints(positions + self.origin_coord, jacobians)
+
+    def lic(self, axis, position, *, shape=None, length=10, noise=None, min_hits=1):
+        """
+        Render a line integral convolution (LIC) image of the vectors on a slice plane.
+
+        The slice is perpendicular to one of the coordinate axes, and only the
+        components of the vectors in the plane are used. Pixels are uniformly
+        spaced, and cover the extent of the grid along the two in-plane axes.
+        The image is computed in parallel with the FastLIC method, which reuses
+        each streamline traced for the convolution at every pixel it passes
+        through.
+
+        Parameters
+        ----------
+        axis : `int`
+            Axis normal to the slice plane, ``0`` for x, ``1`` for y, or ``2`` for z.
+        position : `float`
+            Coordinate of the slice plane along *axis*.
+        shape : tuple[int, int], optional
+            Number of pixels along the two in-plane axes, in increasing axis
+            order. Defaults to the shape of *noise* if given, otherwise to the
+            number of grid points along the in-plane axes.
+        length : `int`, optional
+            Half length of the convolution filter, in pixels. If the pixels
+            have different spacings along the two in-plane axes, this is in
+            units of the smaller spacing.
+        noise : array-like, optional
+            Texture to convolve, with the same shape as the image. Defaults to
+            uniform white noise generated from a fixed seed. The image does
+            not depend on the number of threads used, so with the default
+            noise images are reproducible.
+        min_hits : `int`, optional
+            Number of streamlines that must pass through a pixel before it
+            stops being used to seed new streamlines. Larger values give a
+            smoother image, at the cost of tracing more streamlines.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            The LIC image, with shape *shape*.
+        """
+        if axis not in (0, 1, 2):
+            raise ValueError(f"axis must be 0, 1, or 2 (got {axis})")
+        if not (isinstance(length, int) and length > 0):
+            raise ValueError(f"length must be a positive integer (got {length})")
+        if not (isinstance(min_hits, int) and min_hits > 0):
+            raise ValueError(f"min_hits must be a positive integer (got {min_hits})")
+        plane_axes = [i for i in range(3) if i != axis]
+        coords = self._relative_coords()
+
+        if noise is not None:
+            noise = np.asarray(noise, dtype=np.float64)
+            if shape is None:
+                shape = noise.shape
+        if shape is None:
+            shape = tuple(coords[i].size for i in plane_axes)
+        shape = tuple(shape)
+        if len(shape) != 2 or min(shape) < 2:
+            raise ValueError(
+                f"shape must have two elements that are at least 2, got {shape}"
+            )
+        if noise is None:
+            noise = np.random.default_rng(seed=0).random(shape)
+        if noise.shape != shape:
+            raise ValueError(f"noise must have shape {shape}, got {noise.shape}")
+
+        ucoords, vcoords = (
+            np.linspace(coords[i][0], coords[i][-1], n)
+            for i, n in zip(plane_axes, shape, strict=True)
+        )
+        step_size = min(ucoords[1] - ucoords[0], vcoords[1] - vcoords[0])
+        return line_integral_convolution(
+            *coords,
+            self.vectors,
+            self.cyclic,
+            self._derivatives,
+            axis,
+            float(position - self.origin_coord[axis]),
+            ucoords,
+            vcoords,
+            noise,
+            length,
+            step_size,
+            min_hits,
+        )
+
+    def _interpolation_points(self, points):
+        """
+        Validate points to interpolate at, and shift them relative to the origin.
+        """
+        points = np.atleast_2d(points)
+        if len(points.shape) != 2 or points.shape[1] != 3:
+            raise ValueError(f"points must have shape (n, 3), got {points.shape}")
+        return (points - self.origin_coord).astype(np.float64)
+
+    def _relative_coords(self):
+        """
+        Grid coordinates relative to the origin, as expected by the Rust tracer.
+        """
+        if self._relative_coord_cache is None:
+            self._relative_coord_cache = _read_only(
+                [
+                    (self._get_coords(i) - self.origin_coord[i]).astype(np.float64)
+                    for i in range(3)
+                ]
+            )
+        return self._relative_coord_cache
+
+    def _trace_streamlines(self, seeds, direction, step_size, max_steps):
+        """
+        Trace streamlines in a single direction.
+
+        Returns the (unsliced) streamline coordinates, number of points in each
+        streamline and termination reasons.
+        """
+        seeds = (seeds - self.origin_coord).astype(np.float64)
+        xcoords, ycoords, zcoords = self._relative_coords()
+        xs, ns, ROT = trace_streamlines(
+            seeds,
+            xcoords,
+            ycoords,
+            zcoords,
+            self.vectors,
+            self.cyclic,
+            self._derivatives,
+            direction,
+            step_size,
+            max_steps,
+        )
+        xs += self.origin_coord
+        return xs, ns, ROT
+
+    def _trace_streamlines_recording(self, seeds, direction, step_size, max_steps):
+        """
+        Trace streamlines in a single direction, recording the cells they pass through.
+
+        Returns the same as `VectorGrid._trace_streamlines`, and a list of the
+        sorted flattened indices of the cells each streamline passes through.
+        """
+        seeds = (seeds - self.origin_coord).astype(np.float64)
+        xcoords, ycoords, zcoords = self._relative_coords()
+        xs, ns, ROT, cells, cell_offsets = trace_streamlines_recording(
+            seeds,
+            xcoords,
+            ycoords,
+            zcoords,
+            self.vectors,
+            self.cyclic,
+            self._derivatives,
+            direction,
+            step_size,
+            max_steps,
+        )
+        xs += self.origin_coord
+        cells = [cells[start:end] for start, end in itertools.pairwise(cell_offsets)]
+        return xs, ns, ROT, cells
+
+
+def _read_only(arrays):
+    """
+    Mark a list of arrays as read-only, so they can be safely cached.
+    """
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
+
+
+def _dilate(mask, n, cyclic):
+    """
+    Dilate a 3D boolean mask by n points along each axis.
+    """
+    for axis in range(3):
+        dilated = mask.copy()
+        for shift in range(1, n + 1):
+            for sign in (1, -1):
+                shifted = np.roll(mask, sign * shift, axis=axis)
+                if not cyclic[axis]:
+                    # Don't wrap around the edges of the grid
+                    edge = [slice(None)] * 3
+                    edge[axis] = slice(0, shift) if sign > 0 else slice(-shift, None)
+                    shifted[tuple(edge)] = False
+                dilated |= shifted
+        mask = dilated
+    return mask
+
+
+def _gradient(values, coords, axis, cyclic):
+    """
+    Derivative of values along an axis, using second order finite differences.
+
+    If the axis is cyclic, the derivative at the edges is calculated using the
+    values on the other side of the grid.
+    """
+    if cyclic:
+        # Extend the grid by one point on each side, using the matching faces of the cyclic grid
+        period = coords[-1] - coords[0]
+        coords = np.concatenate([[coords[-2] - period], coords, [coords[1] + period]])
+        values = np.concatenate(
+            [np.take(values, [-2], axis), values, np.take(values, [1], axis)], axis=axis
+        )
+        grad = np.gradient(values, coords, axis=axis)
+        return np.take(grad, np.arange(1, len(coords) - 1), axis=axis)
+    edge_order = 2 if len(coords) > 2 else 1
+    return np.gradient(values, coords, axis=axis, edge_order=edge_order)
+
+
+def _check_out(out, shape):
+    """
+    Check a user supplied output array, or create one if it is `None`.
+    """
+    if out is None:
+        return np.empty(shape, dtype=np.float64)
+    if not isinstance(out, np.ndarray) or out.dtype != np.float64:
+        raise ValueError("out must be a float64 numpy array")
+    if out.shape != shape:
+        raise ValueError(f"out must have shape {shape}, got {out.shape}")
+    return out
+
+
+class NullPoints:
+    """
+    Null points of a vector field, where all three components of the field vanish.
+
+    Nulls are classified using the eigenvalues of the Jacobian of the field
+    at each null. For a divergence-free field two of the eigenvalues (the
+    fan eigenvalues) have real parts with the same sign, and the third (the
+    spine eigenvalue) has the opposite sign. Field lines approach or leave
+    the null along the spine eigenvector, and leave or approach it in the
+    fan plane spanned by the other two eigenvectors.
+
+    Parameters
+    ----------
+    positions : array
+        A (n, 3) shaped array of the positions of the nulls.
+    jacobians : array
+        A (n, 3, 3) shaped array of the Jacobian of the field at each null,
+        where ``jacobians[:, i, j]`` is the derivative of component ``i``
+        with respect to coordinate ``j``.
+    """
+
+    def __init__(self, positions, jacobians):
+        self._positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self._jacobians = np.asarray(jacobians, dtype=np.float64).reshape(-1, 3, 3)
+        if self._jacobians.shape[0] != self._positions.shape[0]:
+            raise ValueError(
+                f"positions and jacobians must have the same number of nulls, "
+                f"got {self._positions.shape[0]} and {self._jacobians.shape[0]}"
+            )
+        eigenvalues, eigenvectors = np.linalg.eig(self._jacobians)
+        self._eigenvalues = eigenvalues.astype(np.complex128)
+        self._eigenvectors = eigenvectors.astype(np.complex128)
+        self._classify()
+
+    def __len__(self):
+        return self._positions.shape[0]
+
+    @property
+    def positions(self):
+        """
+        Positions of the nulls.
+        """
+        return self._positions
+
+    @property
+    def jacobians(self):
+        """
+        Jacobian of the field at each null.
+        """
+        return self._jacobians
+
+    @property
+    def eigenvalues(self):
+        """
+        Eigenvalues of the Jacobian at each null.
+        """
+        return self._eigenvalues
+
+    @property
+    def eigenvectors(self):
+        """
+        Eigenvectors of the Jacobian at each null.
+
+        ``eigenvectors[n, :, i]`` is the eigenvector corresponding to ``eigenvalues[n, i]``.
+        """
+        return self._eigenvectors
+
+    @property
+    def types(self):
+        """
+        Type of each null.
+
+        One of:
+
+        - ``"positive"``: the fan eigenvalues are real and positive, so field
+          lines approach along the spine and leave in the fan plane.
+        - ``"negative"``: the fan eigenvalues are real and negative, so field
+          lines approach in the fan plane and leave along the spine.
+        - ``"positive spiral"`` or ``"negative spiral"``: as above, but the
+          fan eigenvalues are complex so field lines spiral in the fan plane.
+        - ``"source"`` or ``"sink"``: the real parts of all the eigenvalues
+          have the same sign, which is only possible if the field is not
+          divergence-free.
+        - ``"degenerate"``: the real part of an eigenvalue is zero, so the
+          null cannot be classified.
+        """
+        return self._types
+
+    def _classify(self):
+        """
+        Classify each null, and find the directions of its spine and fan plane.
+        """
+        n = len(self)
+        self._types = np.empty(n, dtype=object)
+        self._spines = np.full((n, 3), np.nan)
+        self._fans = np.full((n, 2, 3), np.nan)
+        for i, (eigenvalues, eigenvectors) in enumerate(
+            zip(self.eigenvalues, self.eigenvectors, strict=True)
+        ):
+            signs = np.sign(eigenvalues.real)
+            if np.any(
+                np.abs(eigenvalues.real) <= 1e-10 * np.abs(eigenvalues).max()
+            ) or np.all(signs == 0):
+                self._types[i] = "degenerate"
+                continue
+            if abs(signs.sum()) == 3:
+                self._types[i] = "source" if signs[0] > 0 else "sink"
+                continue
+            # The spine eigenvalue is the one whose real part has the opposite sign to the others
+            spine = np.argmax(signs != np.sign(signs.sum()))
+            fan = [j for j in range(3) if j != spine]
+            spiral = np.any(eigenvalues.imag != 0)
+            self._types[i] = ("positive" if signs[fan[0]] > 0 else "negative") + (
+                " spiral" if spiral else ""
+            )
+
+            self._spines[i] = _normalize(eigenvectors[:, spine].real)
+            if spiral:
+                # The real and imaginary parts of a complex eigenvector span the fan plane
+                fan_vectors = [
+                    eigenvectors[:, fan[0]].real,
+                    eigenvectors[:, fan[0]].imag,
+                ]
+            else:
+                fan_vectors = [
+                    eigenvectors[:, fan[0]].real,
+                    eigenvectors[:, fan[1]].real,
+                ]
+            # Orthonormal basis for the fan plane
+            e1 = _normalize(fan_vectors[0])
+            e2 = _normalize(fan_vectors[1] - np.dot(fan_vectors[1], e1) * e1)
+            self._fans[i] = [e1, e2]
+
+    def spine_seeds(self, distance):
+        """
+        Seed points for tracing the spine field lines of each null.
+
+        Two seeds are placed either side of each null along its spine.
+        Degenerate nulls, sources and sinks do not have a spine and are skipped.
+
+        Parameters
+        ----------
+        distance : `float`
+            Distance of the seeds from each null.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            A (m, 3) shaped array of seeds, which can be passed directly to `StreamTracer.trace`.
+        """
+        valid = ~np.isnan(self._spines[:, 0])
+        offsets = distance * self._spines[valid]
+        positions = self.positions[valid]
+        return np.stack([positions + offsets, positions - offsets], axis=1).reshape(
+            -1, 3
+        )
+
+    def fan_seeds(self, distance, n_seeds=8):
+        """
+        Seed points for tracing the fan field lines of each null.
+
+        Seeds are placed on a circle around each null in its fan plane.
+        Degenerate nulls, sources and sinks do not have a fan and are skipped.
+
+        Parameters
+        ----------
+        distance : `float`
+            Distance of the seeds from each null.
+        n_seeds : `int`, optional
+            Number of seeds around each null.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            A (m, 3) shaped array of seeds, which can be passed directly to `StreamTracer.trace`.
+        """
+        valid = ~np.isnan(self._fans[:, 0, 0])
+        angles = np.linspace(0, 2 * np.pi, n_seeds, endpoint=False)
+        circle = np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+        directions = np.einsum("kj,njd->nkd", circle, self._fans[valid])
+        return (self.positions[valid, np.newaxis] + distance * directions).reshape(
+            -1, 3
+        )
+
+
+def _normalize(vector):
+    """
+    Scale a vector to unit length.
+    """
+    return vector / np.linalg.norm(vector)
+
+
+class MultiBlockGrid:
+    """
+    A grid made up of several rectilinear blocks at different refinement levels.
+
+    This is the structure produced by block-structured adaptive mesh refinement
+    (AMR) codes. Where blocks overlap, the block with the highest refinement
+    level is used, and streamlines move seamlessly from one block to the next.
+    This allows tracing at the native resolution of each block, without
+    resampling the whole field onto a single uniform grid.
+
+    Parameters
+    ----------
+    blocks : list[VectorGrid]
+        The blocks making up the grid. Cyclic boundary conditions and cubic
+        interpolation are not supported on individual blocks.
+    levels : array-like, optional
+        A (nblocks,) shaped array of integer refinement levels, where higher
+        levels are finer. If blocks with equal levels overlap, the first one
+        in ``blocks`` is used. Defaults to ``0`` for every block.
+    """
+
+    def __init__(self, blocks, levels=None):
+        self.set_blocks(blocks, levels)
+
+    @property
+    def blocks(self):
+        """
+        The `VectorGrid` blocks making up the grid.
+
+        The number of blocks must match `MultiBlockGrid.levels`. To change the
+        number of blocks, use `MultiBlockGrid.set_blocks` to set the blocks
+        and their levels together.
+        """
+        return self._blocks
+
+    @blocks.setter
+    def blocks(self, val):
+        val = self._check_blocks(val)
+        if len(val) != len(self.levels):
+            raise ValueError(
+                f"Got {len(val)} blocks, but there are {len(self.levels)} levels. "
+                "Use set_blocks() to change the blocks and levels together."
+            )
+        self._blocks = val
+
+    @property
+    def levels(self):
+        """
+        Refinement level of each block.
+        """
+        return self._levels
+
+    @levels.setter
+    def levels(self, val):
+        self._levels = self._check_levels(val, len(self.blocks))
+
+    def set_blocks(self, blocks, levels=None):
+        """
+        Set the blocks and their refinement levels together.
+
+        Parameters
+        ----------
+        blocks : list[VectorGrid]
+            The blocks making up the grid.
+        levels : array-like, optional
+            A (nblocks,) shaped array of integer refinement levels. Defaults
+            to ``0`` for every block.
+        """
+        blocks = self._check_blocks(blocks)
+        self._levels = self._check_levels(levels, len(blocks))
+        self._blocks = blocks
+
+    @staticmethod
+    def _check_blocks(val):
+        """
+        Check a list of blocks, returning it as a list.
+        """
+        val = list(val)
+        if len(val) == 0:
+            raise ValueError("blocks must contain at least one block")
+        for block in val:
+            if not isinstance(block, VectorGrid):
+                raise ValueError(
+                    f"blocks must be instances of VectorGrid (got {type(block)})"
+                )
+            if np.any(block.cyclic):
+                raise ValueError(
+                    "Cyclic boundary conditions are not supported on blocks"
+                )
+            if block.interpolation != "linear":
+                raise ValueError("Only linear interpolation is supported on blocks")
+        return val
+
+    @staticmethod
+    def _check_levels(val, n_blocks):
+        """
+        Check the refinement levels of *n_blocks* blocks, returning them as an array.
+        """
+        if val is None:
+            val = np.zeros(n_blocks)
+        val = np.array(val, dtype=np.int64)
+        if val.shape != (n_blocks,):
+            raise ValueError(f"levels must have shape ({n_blocks},), got {val.shape}")
+        return val
+
+    def _trace_streamlines(self, seeds, direction, step_size, max_steps):
+        """
+        Trace streamlines in a single direction.
+
+        Returns the (unsliced) streamline coordinates, number of points in each
+        streamline and termination reasons.
+        """
+        origins = np.array(
+            [block.origin_coord for block in self.blocks], dtype=np.float64
+        )
+        coords = [block._relative_coords() for block in self.blocks]
+        return trace_streamlines_multiblock(
+            seeds.astype(np.float64),
+            origins,
+            self.levels,
+            [c[0] for c in coords],
+            [c[1] for c in coords],
+            [c[2] for c in coords],
+            [block.vectors for block in self.blocks],
+            direction,
+            step_size,
+            max_steps,
+        )
+
+
+class CurvilinearGrid:
+    """
+    A grid of vectors on a curvilinear structured mesh.
+
+    Unlike `VectorGrid`, every node of the grid has its own (x, y, z)
+    coordinates, so stretched and sheared meshes can be traced through
+    directly without resampling them onto a rectilinear grid. Each cell is
+    the tri-linear map of a cube onto its eight corner nodes. Cells must not
+    be inverted, and cyclic boundary conditions are not supported.
+
+    Points are located by checking the cell of the previous point and its
+    neighbours, falling back to a bounding volume hierarchy over all the
+    cells. This is built the first time the grid is traced through and
+    reused until `coords` is set again, so `coords` should not be modified
+    in place.
+
+    Parameters
+    ----------
+    vectors : array
+        A (nx, ny, nz, 3) shaped array. The three values at (i, j, k, :)
+        specify the (x, y, z) components of the vector at node (i, j, k).
+    coords : array
+        A (nx, ny, nz, 3) shaped array. The three values at (i, j, k, :)
+        specify the (x, y, z) coordinates of node (i, j, k).
+    """
+
+    def __init__(self, vectors, coords):
+        self.vectors = vectors
+        self.coords = coords
+
+    @property
+    def vectors(self):
+        """
+        Vectors at each node of the grid.
+        """
+        return self._vectors
+
+    @vectors.setter
+    def vectors(self, val):
+        val = np.asarray(val, dtype=np.float64)
+        if len(val.shape) != 4 or val.shape[3] != 3:
+            raise ValueError(
+                f"vectors must have shape (nx, ny, nz, 3), got {val.shape}"
+            )
+        if min(val.shape[:3]) < 2:
+            raise ValueError(
+                f"grid must have at least two nodes along each dimension, got {val.shape[:3]}"
+            )
+        self._vectors = val
+
+    @property
+    def coords(self):
+        """
+        Coordinates of each node of the grid.
+        """
+        return self._coords
+
+    @coords.setter
+    def coords(self, val):
+        val = np.asarray(val, dtype=np.float64)
+        if val.shape != self.vectors.shape:
+            raise ValueError(
+                f"coords must have the same shape as vectors {self.vectors.shape}, got {val.shape}"
+            )
+        self._coords = val
+        self._bvh = None
+
+    def _trace_streamlines(self, seeds, direction, step_size, max_steps):
+        """
+        Trace streamlines in a single direction.
+
+        Returns the (unsliced) streamline coordinates, number of points in each
+        streamline and termination reasons.
+        """
+        if self._bvh is None:
+            self._bvh = CellBvh(self.coords)
+        return trace_streamlines_curvilinear(
+            seeds.astype(np.float64),
+            self.coords,
+            self.vectors,
+            self._bvh,
+            direction,
+            step_size,
+            max_steps,
+        )
+
+
+class TiledVectorGrid:
+    """
+    A grid of vectors stored on disk as compressed tiles.
+
+    This is for fields that are too large to fit in memory. The vectors are
+    split into 3D tiles, each compressed separately and stored in a single
+    file. While tracing, tiles are read and decompressed on demand into a
+    bounded least-recently-used cache that is shared by all the tracing
+    threads. Seeds that start in the same tile are traced one after another
+    on the same thread, so that they reuse the tiles they need.
+
+    A tile store is created from an array (which can be a `numpy.memmap`)
+    with `TiledVectorGrid.write`. The geometry of the grid is then specified
+    in the same way as for `VectorGrid`.
+
+    .. note::
+
+        If any of *cyclic* are ``True``, then the grid values on each side of the
+        cyclic dimension **must** match. This is not checked for tiled grids.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Directory containing a tile store written by `TiledVectorGrid.write`.
+    grid_spacing : array-like, optional
+        A (3,) shaped array, that contains the grid spacings in the (x, y, z)
+        directions. If not specified ``grid_coords`` must be specified.
+    origin_coord : [`float`, `float`, `float`], optional
+        The coordinate of the ``vectors[0, 0, 0, :]`` vector at the corner of
+        the box. Defaults to ``[0, 0, 0]``. This is not used if ``grid_coords``
+        is specified.
+    cyclic : [`bool`, `bool`, `bool`], optional
+        Whether to have cyclic boundary conditions in each of the (x, y, z)
+        directions. Defaults to ``[False, False, False]``.
+    grid_coords : list[array], optional
+        A list of length 3 storing the (x, y, z) coordinates of the grid. If not
+        specified ``grid_spacing`` must be specified.
+    cache_bytes : `int`, optional
+        Maximum size in bytes of the decompressed tiles held in memory.
+        Defaults to 1 GiB. The cache is kept between traces, so tracing in
+        both directions, or tracing again through the same grid, reuses tiles
+        that are already cached. Use `TiledVectorGrid.clear_cache` to free it.
+    """
+
+    def __init__(
+        self,
+        path,
+        grid_spacing=None,
+        origin_coord=None,
+        cyclic=None,
+        *,
+        grid_coords=None,
+        cache_bytes=2**30,
+    ):
+        self._path = Path(path)
+        with (self._path / "tiles.json").open() as f:
+            meta = json.load(f)
+        self._tile_shape = tuple(meta["tile_shape"])
+        self._dtype = meta["dtype"]
+        self._offsets = np.array(meta["offsets"], dtype=np.uint64)
+        shape = tuple(meta["shape"])
+        n_tiles = np.prod([-(-(n - 1) // t) for n, t in zip(shape, self._tile_shape)])
+        if len(self._offsets) != n_tiles + 1:
+            raise ValueError(
+                f"Expected {n_tiles + 1} tile offsets, got {len(self._offsets)}"
+            )
+        size = (self._path / "tiles.bin").stat().st_size
+        if size != self._offsets[-1]:
+            raise ValueError(
+                f"Tile file has size {size} bytes, expected {self._offsets[-1]} bytes"
+            )
+
+        # Use a zero-memory placeholder array to reuse the geometry handling of VectorGrid
+        placeholder = np.broadcast_to(np.zeros(3), (*shape, 3))
+        self._geometry = VectorGrid(
+            placeholder,
+            grid_spacing,
+            origin_coord,
+            cyclic,
+            grid_coords=grid_coords,
+            validate=False,
+        )
+        self._cache = TileCache(
+            self._path / "tiles.bin",
+            self._offsets,
+            shape,
+            self._tile_shape,
+            self._dtype,
+            cache_bytes,
+        )
+        self.cache_bytes = cache_bytes
+
+    @staticmethod
+    def write(
+        path, vectors, tile_shape=(32, 32, 32), dtype=np.float32, compression_level=6
+    ):
+        """
+        Write vectors to a tile store on disk.
+
+        Only one tile is held in memory at a time, so *vectors* can be a
+        `numpy.memmap` that is larger than the available memory.
+
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            Directory to write the tile store to. Created if it does not exist.
+        vectors : array-like
+            A (nx, ny, nz, 3) shaped array. The three values at (i, j, k, :)
+            specify the (x, y, z) components of the vector at index (i, j, k).
+        tile_shape : [`int`, `int`, `int`], optional
+            Number of grid cells along each dimension of a tile.
+        dtype : `numpy.dtype`, optional
+            Data type to store the vectors as, either ``float32`` or ``float64``.
+        compression_level : `int`, optional
+            zlib compression level, from 0 (no compression) to 9 (most compression).
+        """
+        if len(vectors.shape) != 4 or vectors.shape[-1] != 3:
+            raise ValueError(
+                f"vectors must have shape (nx, ny, nz, 3), got {vectors.shape}"
+            )
+        dtype = np.dtype(dtype)
+        if dtype.name not in ("float32", "float64"):
+            raise ValueError(f"dtype must be float32 or float64 (got {dtype})")
+        tile_shape = tuple(int(t) for t in tile_shape)
+        if len(tile_shape) != 3 or min(tile_shape) < 1:
+            raise ValueError(
+                f"tile_shape must be three positive integers (got {tile_shape})"
+            )
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        nx, ny, nz = vectors.shape[:3]
+        tx, ty, tz = tile_shape
+        offsets = [0]
+        with (path / "tiles.bin").open("wb") as f:
+            for i in range(0, nx - 1, tx):
+                for j in range(0, ny - 1, ty):
+                    for k in range(0, nz - 1, tz):
+                        # Neighbouring tiles share a layer of grid points
+                        tile = vectors[i : i + tx + 1, j : j + ty + 1, k : k + tz + 1]
+                        tile = np.ascontiguousarray(tile, dtype=dtype.newbyteorder("<"))
+                        data = zlib.compress(tile.tobytes(), compression_level)
+                        f.write(data)
+                        offsets.append(offsets[-1] + len(data))
+
+        meta = {
+            "shape": [nx, ny, nz],
+            "tile_shape": list(tile_shape),
+            "dtype": dtype.name,
+            "offsets": offsets,
+        }
+        with (path / "tiles.json").open("w") as f:
+            json.dump(meta, f)
+
+    @property
+    def path(self):
+        """
+        Directory containing the tile store.
+        """
+        return self._path
+
+    @property
+    def shape(self):
+        """
+        Number of grid points along each axis.
+        """
+        return self._geometry.vectors.shape[:3]
+
+    @property
+    def tile_shape(self):
+        """
+        Number of grid cells along each axis of a tile.
+        """
+        return self._tile_shape
+
+    @property
+    def grid_spacing(self):
+        """
+        Physical spacing between grid points along each axis.
+        """
+        return self._geometry.grid_spacing
+
+    @property
+    def coords(self):
+        """
+        The physical coordinates along each axis of the grid.
+        """
+        return self._geometry.coords
+
+    @property
+    def cyclic(self):
+        """
+        Boolean describing whether to have cyclic boundary conditions in each of the (x, y, z)
+        directions.
+        """
+        return self._geometry.cyclic
+
+    @property
+    def origin_coord(self):
+        """
+        The physical coordinate corresponding to the index at ``(0,0,0)``.
+        """
+        return self._geometry.origin_coord
+
+    @property
+    def xcoords(self):
+        """
+        Physical coordinates corresponding to grid points in the x-direction.
+        """
+        return self._geometry.xcoords
+
+    @property
+    def ycoords(self):
+        """
+        Physical coordinates corresponding to grid points in the y-direction.
+        """
+        return self._geometry.ycoords
+
+    @property
+    def zcoords(self):
+        """
+        Physical coordinates corresponding to grid points in the z-direction.
+        """
+        return self._geometry.zcoords
+
+    @property
+    def cache_bytes(self):
+        """
+        Maximum size in bytes of the decompressed tiles held in memory.
+        """
+        return self._cache_bytes
+
+    @cache_bytes.setter
+    def cache_bytes(self, val):
+        self._cache.set_capacity_bytes(val)
+        self._cache_bytes = val
+
+    @property
+    def cache_stats(self):
+        """
+        Tile cache counters, summed over all traces since the last call to
+        `reset_cache_stats`.
+
+        A dictionary with the following keys:
+
+        - ``"hits"``: Number of tile lookups that were already in the cache.
+        - ``"misses"``: Number of tile lookups that had to be read from disk.
+        - ``"hit_rate"``: Fraction of lookups that were already in the cache.
+        - ``"bytes_read"``: Number of compressed bytes read from disk.
+        - ``"bytes_decompressed"``: Number of bytes of decompressed tiles.
+        """
+        stats = dict(
+            zip(
+                ["hits", "misses", "bytes_read", "bytes_decompressed"],
+                self._cache.stats(),
+            )
+        )
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else np.nan
+        return stats
+
+    def reset_cache_stats(self):
+        """
+        Reset the tile cache counters to zero.
+        """
+        self._cache.reset_stats()
+
+    def clear_cache(self):
+        """
+        Remove all tiles from the tile cache, freeing their memory.
+        """
+        self._cache.clear()
+
+    def _trace_streamlines(self, seeds, direction, step_size, max_steps):
+        """
+        Trace streamlines in a single direction.
+
+        Returns the (unsliced) streamline coordinates, number of points in each
+        streamline and termination reasons.
+        """
+        seeds = (seeds - self.origin_coord).astype(np.float64)
+        xcoords, ycoords, zcoords = self._geometry._relative_coords()
+        xs, ns, ROT = trace_streamlines_tiled(
+            seeds,
+            self._cache,
+            xcoords,
+            ycoords,
+            zcoords,
+            self.cyclic,
+            direction,
+            step_size,
+            max_steps,
+        )
+        xs += self.origin_coord
+        return xs, ns, ROT
+
 
 class StreamTracer:
     """
@@ -213,6 +1367,7 @@ class StreamTracer:
         self.max_steps = max_steps
         self.ds = step_size
         self.xs = None
+        self._cells_visited = None
 
     @property
     def xs(self):
@@ -229,6 +1384,18 @@ class StreamTracer:
     def xs(self, val):
         self._xs = val
 
+    @property
+    def cells_visited(self):
+        """
+        List of the grid cells each streamline passes through.
+
+        Only recorded when tracing with ``record_cells=True``, otherwise `None`.
+        Each element is a sorted array of flattened cell indices, where the
+        cell with index ``(i, j, k)`` on a grid with ``(nx, ny, nz)`` points
+        has a flattened index of ``(i * (ny - 1) + j) * (nz - 1) + k``.
+        """
+        return self._cells_visited
+
     @property
     def ROT(self):
         """
@@ -241,6 +1408,7 @@ class StreamTracer:
         - -1: Encountered a NaN
         - 1: Reached maximum available steps
         - 2: Out of bounds
+        - 3: Not traced before the deadline (only set by `StreamTracer.trace_async`)
         """
         return self._ROT
 
@@ -267,7 +1435,7 @@ class StreamTracer:
 
         self._max_steps = val
 
-    def trace(self, seeds, grid, direction=0):
+    def trace(self, seeds, grid, direction=0, *, record_cells=False):
         """
         Trace streamlines.
 
@@ -278,21 +1446,278 @@ class StreamTracer:
         ----------
         seeds : array-like with shape ``(n, 3)``
             Seed points.
-        grid : `VectorGrid`
+        grid : `VectorGrid`, `MultiBlockGrid`, `CurvilinearGrid` or `TiledVectorGrid`
             Grid of field vectors.
         direction : `int`, optional
             Integration direction. ``0`` for both directions, ``1`` for
             forward, or ``-1`` for backwards.
+        record_cells : `bool`, optional
+            If `True`, record the grid cells each streamline passes through
+            in `StreamTracer.cells_visited`, which allows the streamlines to
+            be incrementally re-traced with `StreamTracer.retrace`. Only
+            supported on a `VectorGrid`.
+        """
+        x0 = seeds
+        seeds = self._setup_trace(seeds, grid, direction)
+        xs, ns, ROT, cells = self._trace_seeds(seeds, grid, direction, record_cells)
+        self._set_results(x0, grid, xs, ns, ROT, direction, cells)
+
+    def retrace(self, grid, changed=None, *, atol=0):
         """
+        Incrementally re-trace the previous seeds through an updated grid.
+
+        Only streamlines that pass through a cell where the field has changed
+        are re-traced, and the previous results are kept for the others. The
+        previous trace must have been run with ``record_cells=True``. The
+        cells visited by re-traced streamlines are recorded again, so this can
+        be called repeatedly on a sequence of grids.
+
+        Parameters
+        ----------
+        grid : `VectorGrid`
+            The updated grid. Must have the same coordinates and boundary
+            conditions as the grid previously traced through. The step size
+            and maximum number of steps of the tracer must also be unchanged.
+        changed : array-like, optional
+            A ``(nx - 1, ny - 1, nz - 1)`` shaped boolean array, which is
+            `True` for cells where the interpolated field has changed. If not
+            given, changed cells are found by comparing the vectors of *grid*
+            with those of the grid previously traced through.
+        atol : `float`, optional
+            Absolute tolerance on the change in each vector component, at or
+            below which a grid point is treated as unchanged. Only used if
+            *changed* is not given.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            Indices of the streamlines that were re-traced.
+
+        Notes
+        -----
+        When *changed* is not given, a cell has changed if any of the vectors
+        on its corners have changed. With cubic interpolation, changes up to
+        two grid points away from its corners are included too, as they are
+        used to estimate the derivatives. The vectors are compared one slice
+        along x at a time, so no temporary copies of the whole field are made.
+        If the vectors of the previous grid have been modified in place there
+        is nothing to compare against, so *changed* must be given. This is
+        checked for when *grid* shares its vectors with the previous grid.
+        """
+        if self.cells_visited is None:
+            raise ValueError(
+                "Streamlines must be traced with record_cells=True before they can be retraced"
+            )
+        previous = self.grid
         if not isinstance(grid, VectorGrid):
-            raise ValueError("grid must be an instance of StreamTracer")
-        self.grid = grid
-        self.x0 = seeds.copy()
-        self.n_lines = seeds.shape[0]
+            raise ValueError("Retracing is only supported on a VectorGrid")
+        if not (
+            grid.vectors.shape == previous.vectors.shape
+            and all(
+                np.array_equal(grid._get_coords(i), previous._get_coords(i))
+                for i in range(3)
+            )
+            and np.array_equal(grid.origin_coord, previous.origin_coord)
+            and np.array_equal(grid.cyclic, previous.cyclic)
+        ):
+            raise ValueError(
+                "grid must have the same coordinates and cyclic boundaries as the previous grid"
+            )
+        if (self.ds, self.max_steps) != (self._traced_ds, self._traced_max_steps):
+            raise ValueError(
+                "The step size and maximum number of steps must be the same as in the previous trace"
+            )
+
+        cell_shape = tuple(n - 1 for n in grid.vectors.shape[:3])
+        if changed is not None:
+            changed = np.asarray(changed, dtype=bool)
+            if changed.shape != cell_shape:
+                raise ValueError(
+                    f"changed must have shape {cell_shape}, got {changed.shape}"
+                )
+        elif np.shares_memory(grid.vectors, previous.vectors):
+            raise ValueError(
+                "grid shares its vectors with the previous grid, so changed must be given"
+            )
+        elif grid.interpolation != previous.interpolation:
+            changed = np.ones(cell_shape, dtype=bool)
+        else:
+            changed = np.empty(grid.vectors.shape[:3], dtype=bool)
+            for i, (new, old) in enumerate(zip(grid.vectors, previous.vectors)):
+                # NaNs compare as unequal, so vectors becoming or no longer
+                # being NaN are changes, but vectors staying NaN are not
+                unchanged = np.abs(new - old) <= atol
+                unchanged |= np.isnan(new) & np.isnan(old)
+                changed[i] = ~np.all(unchanged, axis=-1)
+            if grid.interpolation == "cubic":
+                changed = _dilate(changed, 2, grid.cyclic)
+            # A cell has changed if any of its corners have changed
+            changed = changed[:-1] | changed[1:]
+            changed = changed[:, :-1] | changed[:, 1:]
+            changed = changed[:, :, :-1] | changed[:, :, 1:]
+
+        # Find streamlines that pass through at least one changed cell
+        lengths = [len(cells) for cells in self.cells_visited]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+        hits = changed.ravel()[
+            np.concatenate([np.empty(0, dtype=np.uintp), *self.cells_visited])
+        ]
+        n_hits = np.concatenate([[0], np.cumsum(hits)])
+        idx = np.flatnonzero(n_hits[offsets[1:]] > n_hits[offsets[:-1]])
 
-        field = grid.vectors
+        direction = self._direction
+        all_xs = list(self.xs)
+        all_cells = list(self.cells_visited)
+        all_ns = np.array(self.n_lines if direction == 0 else self.ns)
+        all_ROT = np.array(self.ROT)
+        if idx.size:
+            xs, ns, ROT, cells = self._trace_seeds(
+                np.atleast_2d(self.x0)[idx], grid, direction, record_cells=True
+            )
+            for i, line in enumerate(idx):
+                all_xs[line] = xs[i]
+                all_cells[line] = cells[i]
+            all_ns[idx] = ns
+            all_ROT[idx] = ROT
+        self._set_results(self.x0, grid, all_xs, all_ns, all_ROT, direction, all_cells)
+        return idx
+
+    async def trace_async(
+        self, seeds, grid, direction=0, *, batch_size=10000, timeout=None, progress=None
+    ):
+        """
+        Trace streamlines without blocking the running `asyncio` event loop.
+
+        Seeds are traced in batches of *batch_size* in a worker thread. Between
+        batches control returns to the event loop, so cancelling the task
+        awaiting this method stops tracing after the current batch. On
+        cancellation `asyncio.CancelledError` is raised and the results of any
+        previous trace are left unchanged.
+
+        Parameters
+        ----------
+        seeds : array-like with shape ``(n, 3)``
+            Seed points.
+        grid : `VectorGrid`, `MultiBlockGrid`, `CurvilinearGrid` or `TiledVectorGrid`
+            Grid of field vectors.
+        direction : `int`, optional
+            Integration direction. ``0`` for both directions, ``1`` for
+            forward, or ``-1`` for backwards.
+        batch_size : `int`, optional
+            Number of seeds to trace between checks for cancellation, the
+            deadline and progress updates.
+        timeout : `float`, optional
+            Time in seconds after which to stop tracing. Streamlines traced
+            before the deadline are kept, and seeds that were not traced are
+            given a termination reason of ``3`` in `StreamTracer.ROT` and an
+            empty streamline in `StreamTracer.xs`. Defaults to no timeout.
+        progress : callable, optional
+            Called as ``progress(n_done, n_seeds)`` on the event loop after
+            each batch of seeds has been traced.
+
+        Returns
+        -------
+        complete : `bool`
+            `True` if all seeds were traced, or `False` if the deadline was reached.
+
+        Notes
+        -----
+        A batch that is running when the task is cancelled or the deadline is
+        reached carries on in the background until it finishes, but its
+        results are discarded.
+        """
+        if not batch_size > 0:
+            raise ValueError(f"batch_size must be greater than zero (got {batch_size})")
+        x0 = seeds
+        seeds = self._setup_trace(seeds, grid, direction)
+
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        n_seeds = seeds.shape[0]
+        n_done = 0
+        xs, ns, ROT = [], [], []
+        while n_done < n_seeds:
+            batch = seeds[n_done : n_done + batch_size]
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                batch_xs, batch_ns, batch_ROT, _ = await asyncio.wait_for(
+                    asyncio.to_thread(self._trace_seeds, batch, grid, direction),
+                    remaining,
+                )
+            except TimeoutError:
+                break
+            xs += batch_xs
+            ns.append(batch_ns)
+            ROT.append(batch_ROT)
+            n_done += batch.shape[0]
+            if progress is not None:
+                progress(n_done, n_seeds)
+
+        # Fill in seeds that were not traced before the deadline
+        n_missing = n_seeds - n_done
+        xs += [np.empty((0, 3)) for _ in range(n_missing)]
+        ns.append(np.zeros(n_missing, dtype=int))
+        ROT.append(np.full((n_missing,) if direction else (n_missing, 2), 3))
+        self._set_results(
+            x0, grid, xs, np.concatenate(ns), np.concatenate(ROT), direction
+        )
+        return n_missing == 0
+
+    def density(self, bins):
+        """
+        Deposit the traced streamlines onto a density grid.
+
+        Each segment between two consecutive points of a streamline adds its
+        length to the bin containing its midpoint, so the result is the total
+        length of streamlines in each bin. Deposition is done in parallel.
+
+        Parameters
+        ----------
+        bins : list[array]
+            A list of length 3 storing the increasing bin edges along the
+            (x, y, z) dimensions. For a 2D density give a single bin along
+            one of the dimensions.
+
+        Returns
+        -------
+        `numpy.ndarray`
+            Total length of streamlines in each bin, with shape
+            ``(nx - 1, ny - 1, nz - 1)`` where ``(nx, ny, nz)`` are the
+            number of bin edges along each dimension.
+        """
+        if self.xs is None:
+            raise ValueError(
+                "Streamlines must be traced before depositing their density"
+            )
+        if len(bins) != 3:
+            raise ValueError(f"bins must have length 3, got {len(bins)}")
+        edges = [np.ascontiguousarray(b, dtype=np.float64) for b in bins]
+        for b in edges:
+            if b.ndim != 1 or b.size < 2 or np.any(np.diff(b) <= 0):
+                raise ValueError(
+                    "Bin edges must be 1D, increasing, and have at least two elements"
+                )
+
+        lengths = [len(x) for x in self.xs]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.uintp)
+        points = np.concatenate([np.empty((0, 3)), *self.xs]).astype(np.float64)
+        return deposit_density(points, offsets, *edges)
+
+    def _setup_trace(self, seeds, grid, direction):
+        """
+        Validate the inputs to a trace.
+
+        This does not modify the tracer, which is only updated with the inputs
+        once the trace has finished.
+        Returns the seeds as a 2D array.
+        """
+        if not isinstance(
+            grid, VectorGrid | MultiBlockGrid | CurvilinearGrid | TiledVectorGrid
+        ):
+            raise ValueError("grid must be an instance of StreamTracer")
+        if direction not in (-1, 0, 1):
+            raise ValueError(f"Direction must be -1, 1 or 0 (got {direction})")
 
-        cyclic = grid.cyclic
         seeds = np.atleast_2d(seeds)
 
         # Validate shapes
@@ -300,69 +1725,77 @@ class StreamTracer:
             raise ValueError("seeds must be a 2D array")
         if seeds.shape[1] != 3:
             raise ValueError(f"seeds must have shape (n, 3), got {seeds.shape}")
+        return seeds
 
-        seeds = (seeds - grid.origin_coord).astype(np.float64)
-        xcoords = (grid.xcoords - grid.origin_coord[0]).astype(np.float64)
-        ycoords = (grid.ycoords - grid.origin_coord[1]).astype(np.float64)
-        zcoords = (grid.zcoords - grid.origin_coord[2]).astype(np.float64)
+    def _trace_seeds(self, seeds, grid, direction, record_cells=False):
+        """
+        Trace streamlines from a (n, 3) array of seeds.
+
+        This does not modify the tracer, so it is safe to run in a worker thread.
+        Returns the list of streamlines, the number of points in each streamline
+        before any NaNs are removed, the termination reasons, and the cells each
+        streamline passes through if *record_cells* is `True` (otherwise `None`).
+        """
+        if record_cells and not isinstance(grid, VectorGrid):
+            raise ValueError("Recording cells is only supported on a VectorGrid")
+
+        def trace(direction):
+            if record_cells:
+                return grid._trace_streamlines_recording(
+                    seeds, direction, self.ds, self.max_steps
+                )
+            return (
+                *grid._trace_streamlines(seeds, direction, self.ds, self.max_steps),
+                None,
+            )
 
         if direction == 1 or direction == -1:
             # Calculate streamlines
-            self.xs, self.ns, self.ROT = trace_streamlines(
-                seeds,
-                xcoords,
-                ycoords,
-                zcoords,
-                field,
-                cyclic,
-                direction,
-                self.ds,
-                self.max_steps,
-            )
+            xs, ns, ROT, cells = trace(direction)
 
-            self.xs += grid.origin_coord
             # Reduce the size of the arrays
-            self.xs = [xi[:ni, :] for xi, ni in zip(self.xs, self.ns)]
+            xs = [xi[:ni, :] for xi, ni in zip(xs, ns)]
 
         elif direction == 0:
             # Calculate forward streamline
-            xs_f, ns_f, ROT_f = trace_streamlines(
-                seeds,
-                xcoords,
-                ycoords,
-                zcoords,
-                field,
-                cyclic,
-                1,
-                self.ds,
-                self.max_steps,
-            )
+            xs_f, ns_f, ROT_f, cells_f = trace(1)
             # Calculate backward streamline
-            xs_r, ns_r, ROT_r = trace_streamlines(
-                seeds,
-                xcoords,
-                ycoords,
-                zcoords,
-                field,
-                cyclic,
-                -1,
-                self.ds,
-                self.max_steps,
-            )
-
-            xs_f += grid.origin_coord
-            xs_r += grid.origin_coord
+            xs_r, ns_r, ROT_r, cells_r = trace(-1)
 
             # Stack the forward and reverse arrays
-            self.xs = [
+            xs = [
                 np.vstack([xri[int(nr) - 1 : 0 : -1, :], xfi[: int(nf)]])
                 for xri, xfi, nr, nf in zip(xs_r, xs_f, ns_r, ns_f)
             ]
-            self.n_lines = np.fromiter([len(xsi) for xsi in self.xs], int)
+            ns = np.fromiter([len(xsi) for xsi in xs], int, count=len(xs))
 
-            self.ROT = np.vstack([ROT_f, ROT_r]).T
+            ROT = np.vstack([ROT_f, ROT_r]).T
+            cells = (
+                None
+                if cells_f is None
+                else [np.union1d(cf, cr) for cf, cr in zip(cells_f, cells_r)]
+            )
         else:
             raise ValueError(f"Direction must be -1, 1 or 0 (got {direction})")
 
         # Filter out nans
-        self.xs = [xi[~np.any(np.isnan(xi), axis=1), :] for xi in self.xs]
+        xs = [xi[~np.any(np.isnan(xi), axis=1), :] for xi in xs]
+        return xs, ns, ROT, cells
+
+    def _set_results(self, seeds, grid, xs, ns, ROT, direction, cells=None):
+        """
+        Store the inputs and results of a trace on the tracer.
+        """
+        self.grid = grid
+        self.x0 = seeds.copy()
+        self.n_lines = seeds.shape[0]
+        self.xs = xs
+        self.ROT = ROT
+        self._cells_visited = cells
+        self._direction = direction
+        self._traced_ds = self.ds
+        self._traced_max_steps = self.max_steps
+        if direction == 0:
+            self.n_lines = ns
+        else:
+            self.ns = ns
@@ -1,7 +1,16 @@
+import asyncio
+
 import numpy as np
 import pytest
 
-from streamtracer import StreamTracer, VectorGrid
+from streamtracer import (
+    CurvilinearGrid,
+    MultiBlockGrid,
+    NullPoints,
+    StreamTracer,
+    TiledVectorGrid,
+    VectorGrid,
+)
 
 
 @pytest.fixture
@@ -158,6 +167,65 @@ def test_cyclic_field():
     VectorGrid(v, spacing, cyclic=cyclic)
 
 
+def test_deferred_validation():
+    v = np.zeros((10, 10, 10, 3))
+    v[:, :, :, 0] = 1
+    v[0, :, :, 0] = -1
+    v[:, :, [0, -1], 1] = np.nan
+
+    grid = VectorGrid(v, [1, 1, 1], cyclic=[True, False, True], validate=False)
+    with pytest.raises(AssertionError, match="grid values in dimension x"):
+        grid.validate()
+    grid.cyclic = [False, True, True]
+    grid.validate()
+    # Validation also runs on float32 vectors
+    with pytest.raises(AssertionError, match="grid values in dimension x"):
+        VectorGrid(v.astype(np.float32), [1, 1, 1], cyclic=[True, False, False])
+    VectorGrid(v.astype(np.float32), [1, 1, 1], cyclic=[False, True, True])
+    # and on vectors with non-native byte order
+    swapped = v.astype(v.dtype.newbyteorder())
+    with pytest.raises(AssertionError, match="grid values in dimension x"):
+        VectorGrid(swapped, [1, 1, 1], cyclic=[True, False, False])
+    VectorGrid(swapped, [1, 1, 1], cyclic=[False, True, True])
+
+    # and on array-likes that are not numpy arrays, such as HDF5 datasets
+    class ArrayLike:
+        def __init__(self, array):
+            self._array = array
+            self.shape = array.shape
+            self.dtype = array.dtype
+
+        def __getitem__(self, key):
+            return self._array[key]
+
+    with pytest.raises(AssertionError, match="grid values in dimension x"):
+        VectorGrid(ArrayLike(v), [1, 1, 1], cyclic=[True, False, False])
+    VectorGrid(ArrayLike(v), [1, 1, 1], cyclic=[False, True, True])
+
+
+def test_cached_coords():
+    grid = VectorGrid(np.zeros((10, 5, 3, 3)), [1, 1, 1])
+    xcoords = grid.xcoords
+    assert grid.xcoords is xcoords
+    with pytest.raises(ValueError, match="read-only"):
+        xcoords[0] = 1
+
+    # Reassigning the grid clears the cache
+    grid.grid_spacing = [2, 1, 1]
+    np.testing.assert_equal(grid.xcoords, np.arange(10) * 2)
+    grid.origin_coord = [1, 0, 0]
+    np.testing.assert_equal(grid.xcoords, np.arange(10) * 2 + 1)
+    grid.vectors = np.zeros((4, 5, 3, 3))
+    np.testing.assert_equal(grid.xcoords, np.arange(4) * 2 + 1)
+
+    coords = [np.arange(4.0) ** 2, np.arange(5.0), np.arange(3.0)]
+    grid.grid_spacing = None
+    grid.coords = coords
+    np.testing.assert_equal(grid.xcoords, coords[0])
+    # The cached coordinates are a copy
+    assert coords[0].flags.writeable
+
+
 def test_grid_points():
     # A uniform field pointing in the x direction
     v = np.zeros((100, 100, 100, 3))
@@ -287,3 +355,558 @@ def test_coords():
     # Check that first/last steps are outside box
     assert np.all(sline[0] < 0 + tracer.ds)
     assert np.all(sline[-1] > 10 - tracer.ds)
+
+
+def test_multiblock():
+    # A coarse block on [0, 10]^3 with a finer block on [4, 6]^3, both
+    # with a uniform field pointing in the x direction
+    v_coarse = np.zeros((11, 11, 11, 3))
+    v_coarse[..., 0] = 1
+    v_fine = np.zeros((9, 9, 9, 3))
+    v_fine[..., 0] = 1
+    coarse = VectorGrid(v_coarse, [1, 1, 1])
+    fine = VectorGrid(v_fine, [0.25, 0.25, 0.25], origin_coord=[4, 4, 4])
+    grid = MultiBlockGrid([coarse, fine], levels=[0, 1])
+
+    tracer = StreamTracer(1000, 0.1)
+    seed = np.array([0.5, 5, 5])
+    tracer.trace(seed, grid, direction=1)
+
+    sline = tracer.xs[0]
+    # Line goes straight through the fine block and out of the far side
+    np.testing.assert_almost_equal(sline[:, 0], np.linspace(0.5, 10, 96))
+    np.testing.assert_equal(sline[:, 1:], 5)
+    np.testing.assert_equal(tracer.ROT, [2])
+
+    # Matches tracing through the coarse block alone
+    tracer.trace(seed, coarse, direction=0)
+    coarse_xs = tracer.xs[0]
+    tracer.trace(seed, grid, direction=0)
+    np.testing.assert_almost_equal(tracer.xs[0], coarse_xs)
+
+
+def test_multiblock_finest_level():
+    # Where blocks overlap the finest block should be used, so a fine
+    # block with a different field direction deflects the line
+    v_coarse = np.zeros((11, 11, 11, 3))
+    v_coarse[..., 0] = 1
+    v_fine = np.zeros((9, 9, 9, 3))
+    v_fine[..., 1] = 1
+    coarse = VectorGrid(v_coarse, [1, 1, 1])
+    fine = VectorGrid(v_fine, [0.25, 0.25, 0.25], origin_coord=[4, 4, 4])
+
+    tracer = StreamTracer(1000, 0.1)
+    seed = np.array([0.5, 5, 5])
+    tracer.trace(seed, MultiBlockGrid([coarse, fine], levels=[0, 1]), direction=1)
+    assert np.max(tracer.xs[0][:, 1]) > 5.5
+
+    # With the levels swapped, the coarse block takes priority everywhere
+    tracer.trace(seed, MultiBlockGrid([coarse, fine], levels=[1, 0]), direction=1)
+    np.testing.assert_equal(tracer.xs[0][:, 1], 5)
+
+
+def test_multiblock_bad_input():
+    v = np.zeros((3, 3, 3, 3))
+    with pytest.raises(ValueError, match="blocks must contain at least one block"):
+        MultiBlockGrid([])
+
+    with pytest.raises(ValueError, match="blocks must be instances of VectorGrid"):
+        MultiBlockGrid([v])
+
+    with pytest.raises(ValueError, match="levels must have shape"):
+        MultiBlockGrid([VectorGrid(v, [1, 1, 1])], levels=[0, 1])
+
+    with pytest.raises(
+        ValueError, match="Cyclic boundary conditions are not supported"
+    ):
+        MultiBlockGrid([VectorGrid(v, [1, 1, 1], cyclic=[True, False, False])])
+
+
+def test_multiblock_reassign_blocks():
+    block = VectorGrid(np.zeros((3, 3, 3, 3)), [1, 1, 1])
+    grid = MultiBlockGrid([block, block], levels=[0, 1])
+    # Levels are kept if the number of blocks is unchanged
+    grid.blocks = [block, block]
+    np.testing.assert_equal(grid.levels, [0, 1])
+    # Changing the number of blocks needs the levels to be set too
+    with pytest.raises(ValueError, match="Use set_blocks"):
+        grid.blocks = [block, block, block]
+    assert len(grid.blocks) == 2
+    np.testing.assert_equal(grid.levels, [0, 1])
+    with pytest.raises(ValueError, match="levels must have shape"):
+        grid.set_blocks([block, block, block], [0, 1])
+    assert len(grid.blocks) == 2
+    grid.set_blocks([block, block, block], [0, 1, 2])
+    assert len(grid.blocks) == 3
+    np.testing.assert_equal(grid.levels, [0, 1, 2])
+
+
+@pytest.mark.parametrize("direction", [-1, 0, 1])
+def test_tiled_grid(tmp_path, direction):
+    # A field that varies in every direction
+    rng = np.random.default_rng(seed=42)
+    v = rng.uniform(0.5, 1, size=(20, 15, 10, 3))
+    spacing = [1, 2, 3]
+    origin_coord = [1, 1, 1]
+    TiledVectorGrid.write(tmp_path, v, tile_shape=(4, 5, 3), dtype=np.float64)
+    tiled = TiledVectorGrid(tmp_path, spacing, origin_coord=origin_coord)
+    grid = VectorGrid(v, spacing, origin_coord=origin_coord)
+    np.testing.assert_equal(tiled.xcoords, grid.xcoords)
+
+    seeds = rng.uniform(2, 10, size=(50, 3))
+    tracer = StreamTracer(1000, 0.1)
+    tracer.trace(seeds, grid, direction=direction)
+    expected_xs = tracer.xs
+    expected_ROT = tracer.ROT
+    tracer.trace(seeds, tiled, direction=direction)
+
+    # Results are identical, and in the same order as the seeds
+    np.testing.assert_equal(tracer.ROT, expected_ROT)
+    for xs, expected in zip(tracer.xs, expected_xs):
+        np.testing.assert_equal(xs, expected)
+
+    stats = tiled.cache_stats
+    assert stats["misses"] > 0
+    assert stats["bytes_read"] > 0
+    assert stats["hit_rate"] > 0.9
+    tiled.reset_cache_stats()
+    assert tiled.cache_stats["hits"] == 0
+
+    # The cache is kept between traces, so tracing again reads nothing from disk
+    tracer.trace(seeds, tiled, direction=direction)
+    assert tiled.cache_stats["misses"] == 0
+    tiled.clear_cache()
+    tracer.trace(seeds, tiled, direction=direction)
+    assert tiled.cache_stats["misses"] > 0
+
+
+def test_tiled_grid_memmap(tmp_path):
+    # Tiles can be written from a memmap, and stored as float32
+    v = np.lib.format.open_memmap(
+        tmp_path / "field.npy", mode="w+", dtype=np.float64, shape=(10, 10, 10, 3)
+    )
+    v[..., 0] = 1
+    TiledVectorGrid.write(tmp_path / "tiles", v, tile_shape=(3, 3, 3))
+    tiled = TiledVectorGrid(tmp_path / "tiles", [1, 1, 1], cache_bytes=0)
+    assert tiled.shape == (10, 10, 10)
+
+    tracer = StreamTracer(1000, 0.1)
+    tracer.trace(np.array([0, 5, 5]), tiled, direction=1)
+    np.testing.assert_almost_equal(tracer.xs[0][:, 0], np.linspace(0, 9, 91))
+    # With no cache budget only the most recent tile is kept
+    assert tiled.cache_stats["misses"] >= 3
+
+
+def test_tiled_grid_bad_input(tmp_path):
+    with pytest.raises(ValueError, match="vectors must have shape"):
+        TiledVectorGrid.write(tmp_path, np.zeros((3, 3, 3, 2)))
+
+    with pytest.raises(ValueError, match="dtype must be float32 or float64"):
+        TiledVectorGrid.write(tmp_path, np.zeros((3, 3, 3, 3)), dtype=int)
+
+    TiledVectorGrid.write(tmp_path, np.zeros((3, 3, 3, 3)))
+    with (tmp_path / "tiles.bin").open("ab") as f:
+        f.write(b"0")
+    with pytest.raises(ValueError, match="Tile file has size"):
+        TiledVectorGrid(tmp_path, [1, 1, 1])
+
+    # Corrupt tiles raise an error instead of crashing
+    TiledVectorGrid.write(tmp_path, np.zeros((3, 3, 3, 3)))
+    size = (tmp_path / "tiles.bin").stat().st_size
+    (tmp_path / "tiles.bin").write_bytes(b"0" * size)
+    tiled = TiledVectorGrid(tmp_path, [1, 1, 1])
+    with pytest.raises(OSError, match="Could not read tile 0"):
+        StreamTracer(1000, 0.1).trace(np.array([0.5, 0.5, 0.5]), tiled, direction=1)
+    # The streamline ends after its first step, instead of re-reading the
+    # tile for every step
+    assert tiled.cache_stats["misses"] <= 4
+
+
+@pytest.mark.parametrize("direction", [-1, 0, 1])
+def test_trace_async(tracer, uniform_x_field, direction):
+    seeds = np.array([[0, 0, 0], [50, 50, 50], [10, 20, 30]] * 5)
+    tracer.trace(seeds, uniform_x_field, direction=direction)
+    expected_xs = tracer.xs
+    expected_ROT = tracer.ROT
+
+    progress = []
+    complete = asyncio.run(
+        tracer.trace_async(
+            seeds,
+            uniform_x_field,
+            direction=direction,
+            batch_size=4,
+            progress=lambda n_done, n_seeds: progress.append((n_done, n_seeds)),
+        )
+    )
+    assert complete
+    assert progress == [(4, 15), (8, 15), (12, 15), (15, 15)]
+    np.testing.assert_equal(tracer.ROT, expected_ROT)
+    assert len(tracer.xs) == len(expected_xs)
+    for xs, expected in zip(tracer.xs, expected_xs):
+        np.testing.assert_equal(xs, expected)
+
+
+@pytest.mark.parametrize(("direction", "ROT_shape"), [(1, (3,)), (0, (3, 2))])
+def test_trace_async_timeout(tracer, uniform_x_field, direction, ROT_shape):
+    seeds = np.array([[0, 0, 0], [50, 50, 50], [10, 20, 30]])
+    complete = asyncio.run(
+        tracer.trace_async(seeds, uniform_x_field, direction=direction, timeout=0)
+    )
+    # Deadline has already passed, so nothing is traced
+    assert not complete
+    np.testing.assert_equal(tracer.ROT, np.full(ROT_shape, 3))
+    assert len(tracer.xs) == 3
+    assert all(xs.shape == (0, 3) for xs in tracer.xs)
+
+
+def test_trace_async_cancel(tracer, uniform_x_field):
+    seeds = np.array([[0, 0, 0], [50, 50, 50], [10, 20, 30]])
+    tracer.trace(seeds[:1], uniform_x_field)
+    progress = []
+
+    async def trace_and_cancel():
+        task = asyncio.current_task()
+
+        def cancel_after_first_batch(n_done, n_seeds):
+            progress.append(n_done)
+            task.cancel()
+
+        await tracer.trace_async(
+            seeds, uniform_x_field, batch_size=1, progress=cancel_after_first_batch
+        )
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(trace_and_cancel())
+    # Tracing stopped after the first batch, and earlier results are unchanged
+    assert progress == [1]
+    assert len(tracer.xs) == 1
+    np.testing.assert_equal(tracer.x0, seeds[:1])
+    assert tracer.n_lines == 1
+    assert tracer.grid is uniform_x_field
+
+    # Invalid arguments also leave the tracer unchanged
+    other_grid = VectorGrid(uniform_x_field.vectors, [1, 1, 1])
+    with pytest.raises(ValueError, match="batch_size must be greater than zero"):
+        asyncio.run(tracer.trace_async(seeds, other_grid, batch_size=0))
+    with pytest.raises(ValueError, match="Direction must be"):
+        asyncio.run(tracer.trace_async(seeds, other_grid, direction=2))
+    np.testing.assert_equal(tracer.x0, seeds[:1])
+    assert tracer.grid is uniform_x_field
+
+
+@pytest.fixture
+def linear_field():
+    # A linear field, which tri-linear interpolation reproduces exactly
+    xcoords = np.array([0, 1, 3, 6, 10])
+    ycoords = np.array([0, 2, 4, 6])
+    zcoords = np.array([0, 0.5, 1, 1.5, 2, 2.5])
+    x, y, z = np.meshgrid(xcoords, ycoords, zcoords, indexing="ij")
+    v = np.stack([x + 2 * y, y - z, 3 * z + x], axis=-1)
+    return VectorGrid(v, grid_coords=[xcoords, ycoords, zcoords])
+
+
+def test_interpolate(linear_field):
+    rng = np.random.default_rng(seed=42)
+    points = rng.uniform([0, 0, 0], [10, 6, 2.5], size=(100, 3))
+    x, y, z = points.T
+    expected = np.stack([x + 2 * y, y - z, 3 * z + x], axis=-1)
+    np.testing.assert_allclose(linear_field.interpolate(points), expected)
+
+    # Write into an existing array
+    out = np.zeros((100, 3))
+    result = linear_field.interpolate(points, out=out)
+    assert result is out
+    np.testing.assert_allclose(out, expected)
+
+    # Scalar interpolation on the same grid
+    xg, yg, zg = np.meshgrid(
+        linear_field.xcoords, linear_field.ycoords, linear_field.zcoords, indexing="ij"
+    )
+    scalars = xg - yg + zg
+    np.testing.assert_allclose(
+        linear_field.interpolate_scalar(scalars, points), x - y + z
+    )
+
+
+def test_interpolate_bounds(uniform_x_field):
+    points = np.array([[50, 50, 50], [101, 50, 50], [50, -1, 50]])
+    result = uniform_x_field.interpolate(points)
+    np.testing.assert_equal(result[0], [1, 0, 0])
+    assert np.all(np.isnan(result[1:]))
+
+    # Cyclic dimensions wrap instead of being out of bounds
+    uniform_x_field.cyclic = [True, False, False]
+    result = uniform_x_field.interpolate(points)
+    np.testing.assert_equal(result[1], [1, 0, 0])
+    assert np.all(np.isnan(result[2]))
+
+
+def test_interpolate_bad_input(linear_field):
+    with pytest.raises(ValueError, match="points must have shape"):
+        linear_field.interpolate(np.zeros((2, 2)))
+
+    with pytest.raises(ValueError, match="out must have shape"):
+        linear_field.interpolate(np.zeros((2, 3)), out=np.zeros((3, 3)))
+
+    with pytest.raises(ValueError, match="out must be a float64 numpy array"):
+        linear_field.interpolate(
+            np.zeros((2, 3)), out=np.zeros((2, 3), dtype=np.float32)
+        )
+
+    with pytest.raises(ValueError, match="values must have shape"):
+        linear_field.interpolate_scalar(np.zeros((2, 2, 2)), np.zeros((2, 3)))
+
+
+def test_cubic_interpolation():
+    # A quadratic field, which tricubic interpolation reproduces exactly
+    # but tri-linear interpolation does not
+    xcoords = np.array([0, 1, 3, 6, 10])
+    ycoords = np.array([0, 2, 4, 6])
+    zcoords = np.array([0, 0.5, 1, 1.5, 2, 2.5])
+    x, y, z = np.meshgrid(xcoords, ycoords, zcoords, indexing="ij")
+    v = np.stack([x**2, y * z, x * y - z**2], axis=-1)
+    grid = VectorGrid(v, grid_coords=[xcoords, ycoords, zcoords], interpolation="cubic")
+
+    rng = np.random.default_rng(seed=42)
+    points = rng.uniform([0, 0, 0], [10, 6, 2.5], size=(100, 3))
+    x, y, z = points.T
+    expected = np.stack([x**2, y * z, x * y - z**2], axis=-1)
+    np.testing.assert_allclose(grid.interpolate(points), expected)
+
+    grid.interpolation = "linear"
+    assert not np.allclose(grid.interpolate(points), expected)
+
+
+def test_cubic_tracing():
+    # A helical field, with field lines x = sin(z), y = 1 - cos(z) through the origin
+    xcoords = np.linspace(-3, 3, 7)
+    zcoords = np.linspace(0, 6, 25)
+    x, y, z = np.meshgrid(xcoords, xcoords, zcoords, indexing="ij")
+    v = np.stack([np.cos(z), np.sin(z), np.ones_like(z)], axis=-1)
+    tracer = StreamTracer(1000, 0.05)
+
+    errors = {}
+    for interpolation in ["linear", "cubic"]:
+        grid = VectorGrid(
+            v, grid_coords=[xcoords, xcoords, zcoords], interpolation=interpolation
+        )
+        tracer.trace(np.array([[0, 0, 0]]), grid, direction=1)
+        x, y, z = tracer.xs[0].T
+        assert z[-1] > 5.9
+        errors[interpolation] = np.max(np.hypot(x - np.sin(z), y - (1 - np.cos(z))))
+
+    assert errors["cubic"] < errors["linear"] / 10
+
+
+def test_bad_interpolation(uniform_x_field):
+    with pytest.raises(ValueError, match='interpolation must be "linear" or "cubic"'):
+        uniform_x_field.interpolation = "quadratic"
+
+    uniform_x_field.interpolation = "cubic"
+    with pytest.raises(
+        ValueError, match="Only linear interpolation is supported on blocks"
+    ):
+        MultiBlockGrid([uniform_x_field])
+
+
+def test_density(tracer, uniform_x_field):
+    seeds = np.array([[0, 10.5, 20.5], [0, 60.5, 20.5], [0, 70.5, 20.5]])
+    tracer.trace(seeds, uniform_x_field, direction=1)
+    density = tracer.density([[0, 50, 100], [0, 50, 101], [0, 101]])
+    assert density.shape == (2, 2, 1)
+    np.testing.assert_allclose(density[:, :, 0], [[50, 100], [50, 100]], atol=0.2)
+
+    with pytest.raises(ValueError, match="bins must have length 3"):
+        tracer.density([[0, 1], [0, 1]])
+    with pytest.raises(ValueError, match="Bin edges must be 1D, increasing"):
+        tracer.density([[0, 1], [1, 0], [0, 1]])
+    with pytest.raises(ValueError, match="Streamlines must be traced"):
+        StreamTracer(10, 0.1).density([[0, 1], [0, 1], [0, 1]])
+
+
+def test_lic(uniform_x_field):
+    # Noise that is constant along the field lines is unchanged
+    noise = np.tile(np.arange(101.0), (101, 1))
+    image = uniform_x_field.lic(2, 50.3, noise=noise)
+    np.testing.assert_allclose(image, noise)
+
+    # Noise that varies along the field lines is smoothed out
+    image = uniform_x_field.lic(2, 50.3, shape=(201, 51))
+    assert image.shape == (201, 51)
+    assert np.std(image) < np.std(np.random.default_rng(seed=0).random((201, 51))) / 2
+
+    with pytest.raises(ValueError, match="axis must be 0, 1, or 2"):
+        uniform_x_field.lic(3, 0)
+    with pytest.raises(ValueError, match="noise must have shape"):
+        uniform_x_field.lic(2, 0, shape=(10, 10), noise=np.zeros((5, 5)))
+
+
+def test_curvilinear():
+    # A quarter of a cylindrical shell, with a field circling the z axis
+    r, theta, z = np.meshgrid(
+        np.linspace(1, 2, 5), np.linspace(0, np.pi / 2, 33), [0, 1], indexing="ij"
+    )
+    x, y = r * np.cos(theta), r * np.sin(theta)
+    coords = np.stack([x, y, z], axis=-1)
+    vectors = np.stack([-y, x, np.zeros_like(z)], axis=-1)
+    grid = CurvilinearGrid(vectors, coords)
+
+    tracer = StreamTracer(1000, 0.01)
+    tracer.trace(np.array([[1.5, 0.001, 0.5], [1.2, 0.001, 0.5]]), grid, direction=1)
+    np.testing.assert_equal(tracer.ROT, [2, 2])
+    for xs, radius in zip(tracer.xs, [1.5, 1.2], strict=True):
+        # Field lines are circles, which end after a quarter turn
+        np.testing.assert_allclose(np.hypot(xs[:, 0], xs[:, 1]), radius, atol=1e-6)
+        assert xs[-1, 0] < 0.01
+
+    # Seeds outside the mesh are immediately out of bounds
+    tracer.trace(np.array([[0.5, 0.5, 0.5]]), grid, direction=1)
+    np.testing.assert_equal(tracer.ROT, [2])
+    assert len(tracer.xs[0]) == 1
+
+    # The cell BVH is built once and kept until the coordinates change
+    bvh = grid._bvh
+    tracer.trace(np.array([[1.5, 0.5, 0.5]]), grid, direction=0)
+    assert grid._bvh is bvh
+    grid.coords = coords + 10
+    assert grid._bvh is None
+    tracer.trace(np.array([[11.5, 10.5, 10.5]]), grid, direction=1)
+    assert grid._bvh is not bvh
+    assert tracer.ns[0] > 1
+
+
+def test_curvilinear_bad_input():
+    with pytest.raises(ValueError, match="vectors must have shape"):
+        CurvilinearGrid(np.zeros((2, 2, 2)), np.zeros((2, 2, 2, 3)))
+    with pytest.raises(ValueError, match="at least two nodes"):
+        CurvilinearGrid(np.zeros((1, 2, 2, 3)), np.zeros((1, 2, 2, 3)))
+    with pytest.raises(ValueError, match="coords must have the same shape"):
+        CurvilinearGrid(np.zeros((2, 2, 2, 3)), np.zeros((2, 2, 3, 3)))
+
+
+def test_find_nulls():
+    # A positive null, with its fan in the x-y plane and spine along z
+    coords = np.linspace(0, 9, 10)
+    x, y, z = np.meshgrid(coords, coords, coords, indexing="ij")
+    v = np.stack([x - 3.3, y - 4.1, -2 * (z - 5.7)], axis=-1)
+    grid = VectorGrid(v, grid_coords=[coords, coords, coords], origin_coord=[-1, 0, 0])
+
+    nulls = grid.find_nulls()
+    assert isinstance(nulls, NullPoints)
+    assert len(nulls) == 1
+    np.testing.assert_allclose(nulls.positions, [[2.3, 4.1, 5.7]])
+    np.testing.assert_allclose(nulls.jacobians, [np.diag([1, 1, -2])], atol=1e-10)
+    np.testing.assert_equal(nulls.types, ["positive"])
+
+    spine_seeds = nulls.spine_seeds(0.1)
+    assert spine_seeds.shape == (2, 3)
+    np.testing.assert_allclose(np.sort(spine_seeds[:, 2]), [5.6, 5.8])
+    fan_seeds = nulls.fan_seeds(0.1, n_seeds=6)
+    assert fan_seeds.shape == (6, 3)
+    np.testing.assert_allclose(np.linalg.norm(fan_seeds - nulls.positions, axis=1), 0.1)
+    np.testing.assert_allclose(fan_seeds[:, 2], 5.7)
+
+    # Spine field lines approach the null along the z axis
+    tracer = StreamTracer(1000, 0.05)
+    tracer.trace(spine_seeds, grid, direction=-1)
+    for xs in tracer.xs:
+        np.testing.assert_allclose(xs[:, :2], [[2.3, 4.1]], atol=1e-10)
+
+    # A null on a cyclic boundary is only found once
+    v = np.stack([x * (x - 9), y - 4.1, z - 5.7], axis=-1)
+    nulls = VectorGrid(v, grid_coords=[coords, coords, coords]).find_nulls()
+    np.testing.assert_allclose(nulls.positions[:, 0], [0, 9], atol=1e-10)
+    grid = VectorGrid(
+        v, grid_coords=[coords, coords, coords], cyclic=[True, False, False]
+    )
+    nulls = grid.find_nulls()
+    np.testing.assert_allclose(nulls.positions, [[0, 4.1, 5.7]], atol=1e-10)
+
+    # Uniform fields have no nulls
+    nulls = VectorGrid(np.ones((5, 5, 5, 3)), [1, 1, 1]).find_nulls()
+    assert len(nulls) == 0
+    assert nulls.spine_seeds(0.1).shape == (0, 3)
+
+
+@pytest.mark.parametrize("direction", [1, 0])
+def test_retrace(tracer, direction):
+    v = np.zeros((21, 21, 21, 3))
+    v[..., 0] = 1
+    grid = VectorGrid(v, [1, 1, 1])
+    seeds = np.array([[1, 2.5, 2.5], [1, 10.5, 10.5], [1, 15.5, 15.5]])
+    tracer.trace(seeds, grid, direction=direction, record_cells=True)
+    # The first streamline passes through every cell along x
+    np.testing.assert_equal(
+        tracer.cells_visited[0],
+        (np.arange(0 if direction == 0 else 1, 20) * 20 + 2) * 20 + 2,
+    )
+
+    # Perturb the field around the third streamline only
+    v_new = v.copy()
+    v_new[:, 15:17, 15:17, 1] = 0.1
+    new_grid = VectorGrid(v_new, [1, 1, 1])
+    xs = list(tracer.xs)
+    np.testing.assert_equal(tracer.retrace(new_grid), [2])
+    assert tracer.grid is new_grid
+    assert tracer.xs[0] is xs[0]
+    assert tracer.xs[1] is xs[1]
+
+    # Results match a full trace through the new grid
+    full = StreamTracer(tracer.max_steps, tracer.ds)
+    full.trace(seeds, new_grid, direction=direction, record_cells=True)
+    for actual, expected in zip(tracer.xs, full.xs, strict=True):
+        np.testing.assert_equal(actual, expected)
+    for actual, expected in zip(tracer.cells_visited, full.cells_visited, strict=True):
+        np.testing.assert_equal(actual, expected)
+    np.testing.assert_equal(tracer.ROT, full.ROT)
+
+    # Changes within the tolerance are ignored
+    v_small = v_new.copy()
+    v_small[:, 9:12, 9:12, 1] += 1e-12
+    assert len(tracer.retrace(VectorGrid(v_small, [1, 1, 1]), atol=1e-10)) == 0
+    # Vectors that become NaN are a change, but NaNs that stay NaN are not
+    v_nan = v_new.copy()
+    v_nan[5, 10, 10] = np.nan
+    np.testing.assert_equal(tracer.retrace(VectorGrid(v_nan, [1, 1, 1])), [1])
+    assert len(tracer.retrace(VectorGrid(v_nan.copy(), [1, 1, 1]))) == 0
+    np.testing.assert_equal(tracer.retrace(VectorGrid(v_new.copy(), [1, 1, 1])), [1])
+    # An explicit changed mask
+    changed = np.zeros((20, 20, 20), dtype=bool)
+    changed[5, 10, 10] = True
+    np.testing.assert_equal(tracer.retrace(new_grid, changed), [1])
+
+
+def test_retrace_bad_input(tracer, uniform_x_field):
+    seeds = np.array([[1, 2.5, 2.5]])
+    tracer.trace(seeds, uniform_x_field)
+    with pytest.raises(ValueError, match="must be traced with record_cells=True"):
+        tracer.retrace(uniform_x_field)
+
+    tracer.trace(seeds, uniform_x_field, record_cells=True)
+    assert tracer.cells_visited is not None
+    with pytest.raises(ValueError, match="Retracing is only supported on a VectorGrid"):
+        tracer.retrace(MultiBlockGrid([uniform_x_field]))
+    with pytest.raises(ValueError, match="same coordinates and cyclic boundaries"):
+        tracer.retrace(VectorGrid(uniform_x_field.vectors, [2, 1, 1]))
+    with pytest.raises(ValueError, match="changed must have shape"):
+        tracer.retrace(uniform_x_field, np.zeros((3, 3, 3), dtype=bool))
+    # Vectors modified in place can't be compared against
+    with pytest.raises(ValueError, match="shares its vectors with the previous grid"):
+        tracer.retrace(uniform_x_field)
+    with pytest.raises(ValueError, match="shares its vectors with the previous grid"):
+        tracer.retrace(
+            VectorGrid(uniform_x_field.vectors, uniform_x_field.grid_spacing)
+        )
+    # Tracing parameters must be unchanged
+    tracer.ds *= 2
+    with pytest.raises(ValueError, match="step size and maximum number of steps"):
+        tracer.retrace(uniform_x_field, np.zeros((100, 100, 100), dtype=bool))
+    tracer.ds /= 2
+    tracer.max_steps += 1
+    with pytest.raises(ValueError, match="step size and maximum number of steps"):
+        tracer.retrace(uniform_x_field, np.zeros((100, 100, 100), dtype=bool))
+    with pytest.raises(
+        ValueError, match="Recording cells is only supported on a VectorGrid"
+    ):
+        tracer.trace(seeds, MultiBlockGrid([uniform_x_field]), record_cells=True)
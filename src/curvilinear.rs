@@ -0,0 +1,428 @@
+//! Structure for representing a 3D vector field defined on the nodes of a
+//! curvilinear structured grid, where every node has its own coordinates.
+use std::cell::Cell;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::Arc;
+
+use numpy::ndarray::{array, Array1, ArrayView1, ArrayView4};
+
+use crate::field::{interp_cell, Bounds, Field};
+use crate::interp::solve3;
+
+/// Maximum number of cells stored in a BVH leaf before it is split.
+const MAX_LEAF_CELLS: usize = 8;
+/// Maximum number of Newton iterations used to invert the trilinear map of a cell.
+const MAX_NEWTON_ITERATIONS: usize = 20;
+/// Tolerance on the local cell coordinates when inverting the trilinear map,
+/// and when checking whether a point is inside a cell.
+const LOCAL_TOLERANCE: f64 = 1e-10;
+/// Maximum number of cells to walk through from the hint cell before
+/// falling back to searching the BVH.
+const MAX_WALK_STEPS: usize = 4;
+
+/// Identifier given to the next BVH that is built.
+static NEXT_BVH_ID: AtomicU64 = AtomicU64::new(0);
+
+thread_local! {
+    /// Identifier of the BVH and cell the last point was found in on this
+    /// thread. Consecutive calls while tracing a streamline are almost always
+    /// in the same or a neighbouring cell, so this is checked before
+    /// searching the BVH. The hint is only used for the grid that left it.
+    static LAST_CELL: Cell<Option<(u64, [usize; 3])>> = const { Cell::new(None) };
+}
+
+/// A node of the cell bounding volume hierarchy (BVH).
+struct BvhNode {
+    /// Lower corner of the bounding box of all cells in the node.
+    lower: [f64; 3],
+    /// Upper corner of the bounding box of all cells in the node.
+    upper: [f64; 3],
+    /// Indices of the two children in the node list, or `None` if this
+    /// node is a leaf.
+    children: Option<(usize, usize)>,
+    /// Range of the cells in this node in the BVH cell list.
+    cells: (usize, usize),
+}
+
+impl BvhNode {
+    /// Check whether the bounding box of the node contains `x`.
+    fn contains(&self, x: ArrayView1<f64>) -> bool {
+        return box_contains(&self.lower, &self.upper, x);
+    }
+}
+
+/// Check whether the box `[lower, upper]` contains `x`.
+fn box_contains(lower: &[f64; 3], upper: &[f64; 3], x: ArrayView1<f64>) -> bool {
+    for i in 0..3 {
+        if x[i] < lower[i] || x[i] > upper[i] {
+            return false;
+        }
+    }
+    return true;
+}
+
+/// A bounding volume hierarchy (BVH) over the cells of a curvilinear grid.
+///
+/// This only depends on the node coordinates, so it can be built once and
+/// shared between every trace through the same grid.
+pub struct CellBvh {
+    /// Unique identifier of this BVH, used to key the per-thread cell hint.
+    id: u64,
+    /// Number of cells along each dimension.
+    ncells: [usize; 3],
+    /// Bounding box of each cell, stored as (lower, upper) and indexed by
+    /// flattened cell index.
+    cell_boxes: Vec<([f64; 3], [f64; 3])>,
+    /// Nodes of the BVH. The first node is the root.
+    nodes: Vec<BvhNode>,
+    /// Flattened cell indices, ordered so that the cells in each BVH node
+    /// are contiguous.
+    cells: Vec<usize>,
+}
+
+impl CellBvh {
+    /// Build the BVH over the cells of a grid with node coordinates `coords`,
+    /// which must be shape (nx, ny, nz, 3).
+    pub fn new(coords: ArrayView4<f64>) -> CellBvh {
+        assert_eq!(coords.shape()[3], 3);
+        let shape = coords.shape();
+        assert!(shape[0] > 1 && shape[1] > 1 && shape[2] > 1);
+        let ncells = [shape[0] - 1, shape[1] - 1, shape[2] - 1];
+
+        let mut bvh = CellBvh {
+            id: NEXT_BVH_ID.fetch_add(1, Ordering::Relaxed),
+            ncells,
+            cell_boxes: Vec::new(),
+            nodes: Vec::new(),
+            cells: (0..ncells[0] * ncells[1] * ncells[2]).collect(),
+        };
+        let cell_boxes: Vec<([f64; 3], [f64; 3])> = bvh
+            .cells
+            .iter()
+            .map(|cell| return cell_box(coords, bvh.unflatten(*cell)))
+            .collect();
+        bvh.cell_boxes = cell_boxes;
+        let n = bvh.cells.len();
+        bvh.build_node(0, n);
+        return bvh;
+    }
+
+    /// Number of cells along each dimension.
+    pub fn ncells(&self) -> [usize; 3] {
+        return self.ncells;
+    }
+
+    /// Convert a flattened cell index to a cell index.
+    fn unflatten(&self, cell: usize) -> [usize; 3] {
+        let k = cell % self.ncells[2];
+        let j = (cell / self.ncells[2]) % self.ncells[1];
+        let i = cell / (self.ncells[2] * self.ncells[1]);
+        return [i, j, k];
+    }
+
+    /// Add a BVH node containing the cells `self.cells[start..end]`, splitting it
+    /// recursively at the median cell centre along its longest axis.
+    /// Returns the index of the new node.
+    fn build_node(&mut self, start: usize, end: usize) -> usize {
+        let mut lower = [f64::INFINITY; 3];
+        let mut upper = [f64::NEG_INFINITY; 3];
+        for cell in &self.cells[start..end] {
+            let (cell_lower, cell_upper) = self.cell_boxes[*cell];
+            for d in 0..3 {
+                lower[d] = lower[d].min(cell_lower[d]);
+                upper[d] = upper[d].max(cell_upper[d]);
+            }
+        }
+        let node_idx = self.nodes.len();
+        self.nodes.push(BvhNode {
+            lower,
+            upper,
+            children: None,
+            cells: (start, end),
+        });
+        if end - start <= MAX_LEAF_CELLS {
+            return node_idx;
+        }
+
+        let extent = [
+            upper[0] - lower[0],
+            upper[1] - lower[1],
+            upper[2] - lower[2],
+        ];
+        let axis = (0..3)
+            .max_by(|a, b| return extent[*a].total_cmp(&extent[*b]))
+            .unwrap();
+        let mid = (start + end) / 2;
+        let cell_boxes = &self.cell_boxes;
+        let centre = |cell: &usize| {
+            let (cell_lower, cell_upper) = cell_boxes[*cell];
+            return cell_lower[axis] + cell_upper[axis];
+        };
+        self.cells[start..end]
+            .select_nth_unstable_by(mid - start, |a, b| return centre(a).total_cmp(&centre(b)));
+
+        let left = self.build_node(start, mid);
+        let right = self.build_node(mid, end);
+        self.nodes[node_idx].children = Some((left, right));
+        return node_idx;
+    }
+}
+
+/// Bounding box of the cell with index `cell_idx` in a grid with node
+/// coordinates `coords`.
+fn cell_box(coords: ArrayView4<f64>, cell_idx: [usize; 3]) -> ([f64; 3], [f64; 3]) {
+    let mut lower = [f64::INFINITY; 3];
+    let mut upper = [f64::NEG_INFINITY; 3];
+    for corner in 0..8 {
+        let node = [
+            cell_idx[0] + (corner & 1),
+            cell_idx[1] + ((corner >> 1) & 1),
+            cell_idx[2] + ((corner >> 2) & 1),
+        ];
+        for d in 0..3 {
+            let x = coords[[node[0], node[1], node[2], d]];
+            lower[d] = lower[d].min(x);
+            upper[d] = upper[d].max(x);
+        }
+    }
+    return (lower, upper);
+}
+
+/// A vector field defined on a curvilinear structured grid.
+///
+/// Each cell is the trilinear map of the unit cube onto its eight corner
+/// nodes. Points are located by first checking the cell the last point on
+/// the same thread was found in and walking to its neighbours, and otherwise
+/// searching a bounding volume hierarchy (BVH) over the cells. Within a cell
+/// the trilinear map is inverted with Newton iterations.
+///
+/// Cyclic boundaries are not supported.
+pub struct CurvilinearField<'a> {
+    /// Coordinates of each grid node. Must be shape (nx, ny, nz, 3).
+    pub coords: ArrayView4<'a, f64>,
+    /// Vector values at each grid node. Must be shape (nx, ny, nz, 3).
+    pub values: ArrayView4<'a, f64>,
+    /// BVH over the cells of the grid.
+    bvh: Arc<CellBvh>,
+}
+
+impl CurvilinearField<'_> {
+    /// Create a new CurvilinearField, building the BVH used to locate points.
+    pub fn new<'a>(
+        coords: ArrayView4<'a, f64>,
+        values: ArrayView4<'a, f64>,
+    ) -> CurvilinearField<'a> {
+        let bvh = Arc::new(CellBvh::new(coords));
+        return CurvilinearField::with_bvh(coords, values, bvh);
+    }
+
+    /// Create a new CurvilinearField using a BVH that has already been built
+    /// from `coords`.
+    pub fn with_bvh<'a>(
+        coords: ArrayView4<'a, f64>,
+        values: ArrayView4<'a, f64>,
+        bvh: Arc<CellBvh>,
+    ) -> CurvilinearField<'a> {
+        assert_eq!(coords.shape(), values.shape());
+        assert_eq!(coords.shape()[3], 3);
+        let shape = coords.shape();
+        assert_eq!(bvh.ncells, [shape[0] - 1, shape[1] - 1, shape[2] - 1]);
+        return CurvilinearField {
+            coords,
+            values,
+            bvh,
+        };
+    }
+
+    /// Position of the point with local coordinates `xi` in the cell `cell_idx`,
+    /// and the Jacobian of the trilinear map at that point.
+    fn cell_map(&self, cell_idx: [usize; 3], xi: &[f64; 3]) -> ([f64; 3], [[f64; 3]; 3]) {
+        let mut x = [0.; 3];
+        // jacobian[i][j] = dx_i / dxi_j
+        let mut jacobian = [[0.; 3]; 3];
+        for corner in 0..8 {
+            let offset = [corner & 1, (corner >> 1) & 1, (corner >> 2) & 1];
+            // Weight of this corner along each axis, and its derivative
+            let mut w = [0.; 3];
+            let mut dw = [0.; 3];
+            for d in 0..3 {
+                if offset[d] == 1 {
+                    w[d] = xi[d];
+                    dw[d] = 1.;
+                } else {
+                    w[d] = 1. - xi[d];
+                    dw[d] = -1.;
+                }
+            }
+            let weight = w[0] * w[1] * w[2];
+            let dweight = [
+                dw[0] * w[1] * w[2],
+                w[0] * dw[1] * w[2],
+                w[0] * w[1] * dw[2],
+            ];
+            for i in 0..3 {
+                let node = self.coords[[
+                    cell_idx[0] + offset[0],
+                    cell_idx[1] + offset[1],
+                    cell_idx[2] + offset[2],
+                    i,
+                ]];
+                x[i] += weight * node;
+                for j in 0..3 {
+                    jacobian[i][j] += dweight[j] * node;
+                }
+            }
+        }
+        return (x, jacobian);
+    }
+
+    /// Find the local coordinates of `x` within the cell `cell_idx` by
+    /// inverting the trilinear map with Newton iterations.
+    ///
+    /// Returns `None` if the iterations do not converge. The returned
+    /// coordinates may be outside the unit cube if `x` is outside the cell.
+    pub fn local_coords(&self, cell_idx: [usize; 3], x: ArrayView1<f64>) -> Option<[f64; 3]> {
+        let mut xi = [0.5; 3];
+        for _ in 0..MAX_NEWTON_ITERATIONS {
+            let (mapped, jacobian) = self.cell_map(cell_idx, &xi);
+            let residual = [mapped[0] - x[0], mapped[1] - x[1], mapped[2] - x[2]];
+            let step = solve3(&jacobian, &residual)?;
+            for d in 0..3 {
+                xi[d] -= step[d];
+            }
+            if step.iter().all(|s| return s.abs() < LOCAL_TOLERANCE) {
+                return Some(xi);
+            }
+            // Points far outside the cell will not be in it
+            if xi.iter().any(|v| return v.abs() > 10.) {
+                return None;
+            }
+        }
+        return None;
+    }
+
+    /// Check whether `x` is in the cell `cell_idx`, returning its local
+    /// coordinates if it is. Otherwise returns the local coordinates to
+    /// allow walking towards the cell containing `x`, or `None` if they
+    /// could not be found.
+    fn try_cell(
+        &self,
+        cell_idx: [usize; 3],
+        x: ArrayView1<f64>,
+    ) -> Result<[f64; 3], Option<[f64; 3]>> {
+        let xi = self.local_coords(cell_idx, x);
+        return match xi {
+            Some(xi)
+                if xi
+                    .iter()
+                    .all(|v| return *v >= -LOCAL_TOLERANCE && *v <= 1. + LOCAL_TOLERANCE) =>
+            {
+                Ok(xi)
+            }
+            _ => Err(xi),
+        };
+    }
+
+    /// Find the cell containing `x` and the local coordinates of `x` within it,
+    /// or `None` if `x` is outside the grid.
+    pub fn locate(&self, x: ArrayView1<f64>) -> Option<([usize; 3], [f64; 3])> {
+        if x.iter().any(|v| return !v.is_finite()) {
+            return None;
+        }
+        let found = self.walk_from_hint(x).or_else(|| return self.search_bvh(x));
+        let id = self.bvh.id;
+        LAST_CELL.with(|last| return last.set(found.map(|(cell_idx, _)| return (id, cell_idx))));
+        return found;
+    }
+
+    /// Starting from the cell the last point was found in, walk through
+    /// neighbouring cells in the direction of `x`.
+    fn walk_from_hint(&self, x: ArrayView1<f64>) -> Option<([usize; 3], [f64; 3])> {
+        let (id, mut cell_idx) = LAST_CELL.with(|last| return last.get())?;
+        if id != self.bvh.id {
+            // Hint was left by a different grid
+            return None;
+        }
+        for _ in 0..MAX_WALK_STEPS {
+            let xi = match self.try_cell(cell_idx, x) {
+                Ok(xi) => return Some((cell_idx, xi)),
+                Err(Some(xi)) => xi,
+                Err(None) => return None,
+            };
+            let mut moved = false;
+            for d in 0..3 {
+                if xi[d] < 0. && cell_idx[d] > 0 {
+                    cell_idx[d] -= 1;
+                    moved = true;
+                } else if xi[d] > 1. && cell_idx[d] + 1 < self.bvh.ncells[d] {
+                    cell_idx[d] += 1;
+                    moved = true;
+                }
+            }
+            if !moved {
+                // Heading out of the grid
+                return None;
+            }
+        }
+        return None;
+    }
+
+    /// Search the BVH for the cell containing `x`.
+    fn search_bvh(&self, x: ArrayView1<f64>) -> Option<([usize; 3], [f64; 3])> {
+        let bvh = &self.bvh;
+        let mut stack = vec![0];
+        while let Some(node_idx) = stack.pop() {
+            let node = &bvh.nodes[node_idx];
+            if !node.contains(x) {
+                continue;
+            }
+            match node.children {
+                Some((left, right)) => {
+                    stack.push(left);
+                    stack.push(right);
+                }
+                None => {
+                    for cell in &bvh.cells[node.cells.0..node.cells.1] {
+                        let (lower, upper) = &bvh.cell_boxes[*cell];
+                        if !box_contains(lower, upper, x) {
+                            continue;
+                        }
+                        let cell_idx = bvh.unflatten(*cell);
+                        if let Ok(xi) = self.try_cell(cell_idx, x) {
+                            return Some((cell_idx, xi));
+                        }
+                    }
+                }
+            }
+        }
+        return None;
+    }
+}
+
+impl Field for CurvilinearField<'_> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        return match self.locate(x) {
+            Some((cell_idx, xi)) => {
+                let cell_idx = array![cell_idx[0], cell_idx[1], cell_idx[2]];
+                let cell_dist = array![
+                    xi[0].clamp(0., 1.),
+                    xi[1].clamp(0., 1.),
+                    xi[2].clamp(0., 1.)
+                ];
+                interp_cell(&self.values, &cell_idx, &cell_dist)
+            }
+            None => Array1::from_elem(3, f64::NAN),
+        };
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return x;
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        return match self.locate(x) {
+            Some(_) => Bounds::In,
+            None => Bounds::Out,
+        };
+    }
+}
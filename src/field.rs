@@ -1,8 +1,9 @@
 //! Structure for representing a 3D vector field defined on the corners
 //! of a rectilinear grid.
-use numpy::ndarray::{array, s, Array1, ArrayView1, ArrayView4};
+use num_traits::Float;
+use numpy::ndarray::{array, s, Array1, ArrayView1, ArrayView4, ArrayView5, Axis, Zip};
 
-use crate::interp::interp_trilinear;
+use crate::interp::{interp_tricubic_hermite, interp_trilinear};
 
 /// Enum denoting whether a point is in or out of the bounds
 /// of a VectorField grid.
@@ -13,18 +14,28 @@ pub enum Bounds {
     Out,
 }
 
-/// A 3D vector field defined at grid corners.
-pub struct VectorField<'a> {
+/// Interface the streamline tracer uses to sample a vector field.
+///
+/// Implemented by every field layout that can be traced through, so
+/// that the RK4 integrator in `trace` does not need to know how the
+/// field is stored or how cells are located.
+pub trait Field {
+    /// Get the field vector at position `x`.
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64>;
+    /// Wrap a coordinate across any cyclic boundaries.
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64>;
+    /// Check whether a coordinate is in bounds of the field.
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds;
+}
+
+/// Coordinates of a rectilinear grid, and the boundary conditions on it.
+pub struct RectilinearGrid<'a> {
     /// Grid points along x dimension. Must start at 0.
     pub xgrid: ArrayView1<'a, f64>,
     /// Grid points along y dimension. Must start at 0.
     pub ygrid: ArrayView1<'a, f64>,
     /// Grid points along z dimension. Must start at 0.
     pub zgrid: ArrayView1<'a, f64>,
-    /// Vector values at each grid point. Must be shape
-    /// (nx, ny, ny, 3), where (nx, ny, nz) are the number
-    /// of coordinates along dimension.
-    pub values: ArrayView4<'a, f64>,
     /// Whether each dimension should be treated as cyclic
     /// or not. Must be shape (3,).
     cyclic: ArrayView1<'a, bool>,
@@ -39,25 +50,17 @@ pub struct VectorField<'a> {
     upper_bounds: Array1<f64>,
 }
 
-impl VectorField<'_> {
-    /// Create a new VectorField, checking for appropriate array shapes.
+impl RectilinearGrid<'_> {
+    /// Create a new RectilinearGrid, checking for appropriate array shapes.
     pub fn new<'a>(
         xgrid: ArrayView1<'a, f64>,
         ygrid: ArrayView1<'a, f64>,
         zgrid: ArrayView1<'a, f64>,
-        values: ArrayView4<'a, f64>,
         cyclic: ArrayView1<'a, bool>,
-    ) -> VectorField<'a> {
-        // Do some shape checking
+    ) -> RectilinearGrid<'a> {
         let nx = xgrid.len();
         let ny = ygrid.len();
         let nz = zgrid.len();
-        let field_shape = values.shape();
-
-        assert_eq!(field_shape[0], nx);
-        assert_eq!(field_shape[1], ny);
-        assert_eq!(field_shape[2], nz);
-        assert_eq!(field_shape[3], 3);
 
         assert_eq!(cyclic.shape()[0], 3);
 
@@ -68,11 +71,10 @@ impl VectorField<'_> {
 
         let upper_bounds = array![xgrid[nx - 1], ygrid[ny - 1], zgrid[nz - 1]];
 
-        return VectorField {
+        return RectilinearGrid {
             xgrid,
             ygrid,
             zgrid,
-            values,
             cyclic,
             nx,
             ny,
@@ -81,6 +83,16 @@ impl VectorField<'_> {
         };
     }
 
+    /// Whether the dimension `axis` is treated as cyclic.
+    pub fn is_cyclic(&self, axis: usize) -> bool {
+        return self.cyclic[axis];
+    }
+
+    /// Number of grid points along each dimension.
+    pub fn shape(&self) -> [usize; 3] {
+        return [self.nx, self.ny, self.nz];
+    }
+
     /// Return grid index of the cell containing `x`.
     pub fn grid_idx(&self, x: ArrayView1<f64>) -> Array1<usize> {
         // Output array
@@ -111,38 +123,29 @@ impl VectorField<'_> {
         return grid_idx;
     }
 
-    /// Get vector at position `x` using tri-linear interpolation.
-    pub fn vector_at_position(&self, x0: ArrayView1<f64>) -> Array1<f64> {
-        let cell_idx = self.grid_idx(x0);
+    /// Return grid index of the cell containing `x`, and the distance
+    /// of `x` along each cell edge in normalised units.
+    pub fn cell_position(&self, x: ArrayView1<f64>) -> (Array1<usize>, Array1<f64>) {
+        let cell_idx = self.grid_idx(x);
         let cell_origin = array![
             self.xgrid[cell_idx[0]],
             self.ygrid[cell_idx[1]],
             self.zgrid[cell_idx[2]]
         ];
-        let cell_size = array![
-            self.xgrid[cell_idx[0] + 1] - cell_origin[0],
-            self.ygrid[cell_idx[1] + 1] - cell_origin[1],
-            self.zgrid[cell_idx[2] + 1] - cell_origin[2]
-        ];
+        let cell_size = self.cell_size(&cell_idx);
 
         // Distance along each cell edge in normalised units
-        let cell_dist: Array1<f64> = (x0.to_owned() - cell_origin) / cell_size;
-
-        // Eight corners of the cube that the position vector is
-        // currently in
-        let vec_cube = self.values.slice(s![
-            cell_idx[0]..(cell_idx[0] + 2),
-            cell_idx[1]..(cell_idx[1] + 2),
-            cell_idx[2]..(cell_idx[2] + 2),
-            ..
-        ]);
-
-        let mut vector_at_pos = array![0., 0., 0.];
-        // Loop over vector components
-        for i in 0..3 {
-            vector_at_pos[[i]] = interp_trilinear(&vec_cube.slice(s![.., .., .., i]), &cell_dist);
-        }
-        return vector_at_pos;
+        let cell_dist: Array1<f64> = (x.to_owned() - cell_origin) / cell_size;
+        return (cell_idx, cell_dist);
+    }
+
+    /// Return the physical size of the cell with index `cell_idx`.
+    pub fn cell_size(&self, cell_idx: &Array1<usize>) -> Array1<f64> {
+        return array![
+            self.xgrid[cell_idx[0] + 1] - self.xgrid[cell_idx[0]],
+            self.ygrid[cell_idx[1] + 1] - self.ygrid[cell_idx[1]],
+            self.zgrid[cell_idx[2] + 1] - self.zgrid[cell_idx[2]]
+        ];
     }
 
     /// If any of the dimensions of the grid are cyclic, wrap a coordinate.
@@ -174,3 +177,203 @@ impl VectorField<'_> {
         return Bounds::In;
     }
 }
+
+/// Tri-linearly interpolate the vector within a single grid cell.
+///
+/// # Arguments
+///
+/// * `values` - Vector values at grid points. Must be shape (nx, ny, nz, 3).
+/// * `cell_idx` - Index of the lower corner of the cell.
+/// * `cell_dist` - Distance along each cell edge in normalised units.
+pub fn interp_cell(
+    values: &ArrayView4<f64>,
+    cell_idx: &Array1<usize>,
+    cell_dist: &Array1<f64>,
+) -> Array1<f64> {
+    // Eight corners of the cube that the position vector is
+    // currently in
+    let vec_cube = values.slice(s![
+        cell_idx[0]..(cell_idx[0] + 2),
+        cell_idx[1]..(cell_idx[1] + 2),
+        cell_idx[2]..(cell_idx[2] + 2),
+        ..
+    ]);
+
+    let mut vector_at_pos = array![0., 0., 0.];
+    // Loop over vector components
+    for i in 0..3 {
+        vector_at_pos[[i]] = interp_trilinear(&vec_cube.slice(s![.., .., .., i]), cell_dist);
+    }
+    return vector_at_pos;
+}
+
+/// Tricubic Hermite interpolation of the vector within a single grid cell.
+///
+/// # Arguments
+///
+/// * `values` - Vector values at grid points. Must be shape (nx, ny, nz, 3).
+/// * `derivatives` - Derivatives of the vectors at grid points. Must be shape
+///   (7, nx, ny, nz, 3), see [`VectorField::with_derivatives`].
+/// * `cell_idx` - Index of the lower corner of the cell.
+/// * `cell_dist` - Distance along each cell edge in normalised units.
+/// * `cell_size` - Physical size of the cell.
+pub fn interp_cell_hermite(
+    values: &ArrayView4<f64>,
+    derivatives: &ArrayView5<f64>,
+    cell_idx: &Array1<usize>,
+    cell_dist: &Array1<f64>,
+    cell_size: &Array1<f64>,
+) -> Array1<f64> {
+    // Eight corners of the cube that the position vector is
+    // currently in
+    let vec_cube = values.slice(s![
+        cell_idx[0]..(cell_idx[0] + 2),
+        cell_idx[1]..(cell_idx[1] + 2),
+        cell_idx[2]..(cell_idx[2] + 2),
+        ..
+    ]);
+    let deriv_cube = derivatives.slice(s![
+        ..,
+        cell_idx[0]..(cell_idx[0] + 2),
+        cell_idx[1]..(cell_idx[1] + 2),
+        cell_idx[2]..(cell_idx[2] + 2),
+        ..
+    ]);
+
+    let mut vector_at_pos = array![0., 0., 0.];
+    // Loop over vector components
+    for i in 0..3 {
+        vector_at_pos[[i]] = interp_tricubic_hermite(
+            &vec_cube.slice(s![.., .., .., i]),
+            &deriv_cube.slice(s![.., .., .., .., i]),
+            cell_dist,
+            cell_size,
+        );
+    }
+    return vector_at_pos;
+}
+
+/// A 3D vector field defined at grid corners.
+pub struct VectorField<'a> {
+    /// Grid that the vectors are defined on.
+    pub grid: RectilinearGrid<'a>,
+    /// Vector values at each grid point. Must be shape
+    /// (nx, ny, ny, 3), where (nx, ny, nz) are the number
+    /// of coordinates along dimension.
+    pub values: ArrayView4<'a, f64>,
+    /// Optional derivatives of the vectors at each grid point. If present,
+    /// tricubic Hermite interpolation is used instead of tri-linear
+    /// interpolation.
+    pub derivatives: Option<ArrayView5<'a, f64>>,
+}
+
+impl<'a> VectorField<'a> {
+    /// Use tricubic Hermite interpolation with the given derivatives.
+    ///
+    /// `derivatives` must be shape (7, nx, ny, nz, 3), and store the
+    /// derivatives of the vectors with respect to (x, y, z, xy, xz, yz, xyz)
+    /// at each grid point.
+    pub fn with_derivatives(mut self, derivatives: ArrayView5<'a, f64>) -> VectorField<'a> {
+        assert_eq!(derivatives.shape()[0], 7);
+        assert_eq!(&derivatives.shape()[1..], self.values.shape());
+        self.derivatives = Some(derivatives);
+        return self;
+    }
+}
+
+impl VectorField<'_> {
+    /// Create a new VectorField, checking for appropriate array shapes.
+    pub fn new<'a>(
+        xgrid: ArrayView1<'a, f64>,
+        ygrid: ArrayView1<'a, f64>,
+        zgrid: ArrayView1<'a, f64>,
+        values: ArrayView4<'a, f64>,
+        cyclic: ArrayView1<'a, bool>,
+    ) -> VectorField<'a> {
+        let grid = RectilinearGrid::new(xgrid, ygrid, zgrid, cyclic);
+
+        // Do some shape checking
+        let [nx, ny, nz] = grid.shape();
+        let field_shape = values.shape();
+
+        assert_eq!(field_shape[0], nx);
+        assert_eq!(field_shape[1], ny);
+        assert_eq!(field_shape[2], nz);
+        assert_eq!(field_shape[3], 3);
+
+        return VectorField {
+            grid,
+            values,
+            derivatives: None,
+        };
+    }
+
+    /// Return grid index of the cell containing `x`.
+    pub fn grid_idx(&self, x: ArrayView1<f64>) -> Array1<usize> {
+        return self.grid.grid_idx(x);
+    }
+
+    /// Get vector at position `x` using tri-linear interpolation, or
+    /// tricubic Hermite interpolation if derivatives are present.
+    pub fn vector_at_position(&self, x0: ArrayView1<f64>) -> Array1<f64> {
+        let (cell_idx, cell_dist) = self.grid.cell_position(x0);
+        match &self.derivatives {
+            None => return interp_cell(&self.values, &cell_idx, &cell_dist),
+            Some(derivatives) => {
+                let cell_size = self.grid.cell_size(&cell_idx);
+                return interp_cell_hermite(
+                    &self.values,
+                    derivatives,
+                    &cell_idx,
+                    &cell_dist,
+                    &cell_size,
+                );
+            }
+        }
+    }
+
+    /// If any of the dimensions of the grid are cyclic, wrap a coordinate.
+    pub fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return self.grid.wrap_cyclic(x);
+    }
+
+    /// Check whether a coordinate is in bounds of the grid.
+    pub fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        return self.grid.check_bounds(x);
+    }
+}
+
+impl Field for VectorField<'_> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        return VectorField::vector_at_position(self, x);
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return VectorField::wrap_cyclic(self, x);
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        return VectorField::check_bounds(self, x);
+    }
+}
+
+/// Check whether the vectors on the two faces of the grid perpendicular to
+/// `axis` are equal, as is required for a cyclic boundary.
+///
+/// NaNs are treated as equal to each other. Faces are compared in parallel
+/// without copying them, and the comparison stops at the first mismatch.
+/// This is generic over the float type so that single precision fields can
+/// be checked without converting them.
+///
+/// # Arguments
+///
+/// * `values` - Vector values at grid points. Must be shape (nx, ny, nz, 3).
+/// * `axis` - Axis perpendicular to the faces, `0`, `1`, or `2`.
+pub fn cyclic_faces_match<T: Float + Sync>(values: ArrayView4<T>, axis: usize) -> bool {
+    let n = values.shape()[axis];
+    let first = values.index_axis(Axis(axis), 0);
+    let last = values.index_axis(Axis(axis), n - 1);
+    return Zip::from(&first).and(&last).par_all(|a, b| {
+        return a == b || (a.is_nan() && b.is_nan());
+    });
+}
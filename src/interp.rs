@@ -1,6 +1,6 @@
 //! Helper functions for interpolation.
 
-use numpy::ndarray::{Array1, ArrayBase, Data, Ix3};
+use numpy::ndarray::{Array1, ArrayBase, Data, Ix3, Ix4};
 
 /// Trilinear-interpolation of a scalar defined on
 /// the eight corners of a cuboid.
@@ -36,3 +36,135 @@ where
     // Interpolate over z
     return c1[0] * m_x[[2]] + c1[1] * x[[2]];
 }
+
+/// Gradient of the tri-linear interpolation of a scalar defined on the
+/// eight corners of a cuboid, with respect to the normalised coordinates
+/// within the cuboid.
+///
+/// # Arguments
+///
+/// * `values` - Values on the eight cube corners. Must be shape `(2, 2, 2)`.
+/// * `x` - Coordinate to evaluate the gradient at. Must be shape `(3,)`.
+pub fn interp_trilinear_gradient<S>(values: &ArrayBase<S, Ix3>, x: &Array1<f64>) -> [f64; 3]
+where
+    S: Data<Elem = f64>,
+{
+    if values.dim() != (2, 2, 2) {
+        panic!("Interp values are not the right shape {:?}", values.shape());
+    }
+    let mut gradient = [0.; 3];
+    for ((ix, iy, iz), value) in values.indexed_iter() {
+        let corner = [ix, iy, iz];
+        // Weight of this corner along each axis, and its derivative
+        let w: [f64; 3] =
+            std::array::from_fn(|d| return if corner[d] == 1 { x[[d]] } else { 1. - x[[d]] });
+        let dw: [f64; 3] = std::array::from_fn(|d| return if corner[d] == 1 { 1. } else { -1. });
+        gradient[0] += value * dw[0] * w[1] * w[2];
+        gradient[1] += value * w[0] * dw[1] * w[2];
+        gradient[2] += value * w[0] * w[1] * dw[2];
+    }
+    return gradient;
+}
+
+/// Cubic Hermite basis functions on a unit interval.
+///
+/// Returns the weights of the value and derivative at each end of the
+/// interval, indexed as `[end][derivative order]`. The derivative weights
+/// are scaled by `width`, so that derivatives can be given in physical units.
+fn hermite_basis(t: f64, width: f64) -> [[f64; 2]; 2] {
+    let t2 = t * t;
+    let t3 = t2 * t;
+    return [
+        [2. * t3 - 3. * t2 + 1., (t3 - 2. * t2 + t) * width],
+        [-2. * t3 + 3. * t2, (t3 - t2) * width],
+    ];
+}
+
+/// Tricubic Hermite interpolation of a scalar defined on
+/// the eight corners of a cuboid.
+///
+/// Unlike tri-linear interpolation, the interpolated value and its first
+/// derivatives are continuous across cell faces.
+///
+/// # Arguments
+///
+/// * `values` - Values on the eight cube corners. Must be shape `(2, 2, 2)`.
+/// * `derivatives` - Derivatives on the eight cube corners. Must be shape
+///   `(7, 2, 2, 2)`, storing the derivatives with respect to (x, y, z, xy,
+///   xz, yz, xyz) in physical units.
+/// * `x` - Coordinate to interpolate at. Components must be `>= 0` and `<=1`. Must be shape `(3,)`.
+/// * `cell_size` - Physical size of the cuboid along each dimension. Must be shape `(3,)`.
+pub fn interp_tricubic_hermite<S, T>(
+    values: &ArrayBase<S, Ix3>,
+    derivatives: &ArrayBase<T, Ix4>,
+    x: &Array1<f64>,
+    cell_size: &Array1<f64>,
+) -> f64
+where
+    S: Data<Elem = f64>,
+    T: Data<Elem = f64>,
+{
+    if values.dim() != (2, 2, 2) {
+        panic!("Interp values are not the right shape {:?}", values.shape());
+    }
+    if derivatives.dim() != (7, 2, 2, 2) {
+        panic!(
+            "Interp derivatives are not the right shape {:?}",
+            derivatives.shape()
+        );
+    }
+    let bx = hermite_basis(x[[0]], cell_size[[0]]);
+    let by = hermite_basis(x[[1]], cell_size[[1]]);
+    let bz = hermite_basis(x[[2]], cell_size[[2]]);
+
+    let mut result = 0.;
+    for ix in 0..2 {
+        for iy in 0..2 {
+            for iz in 0..2 {
+                // Loop over derivative order in each direction
+                for dx in 0..2 {
+                    for dy in 0..2 {
+                        for dz in 0..2 {
+                            let value = match (dx, dy, dz) {
+                                (0, 0, 0) => values[[ix, iy, iz]],
+                                (1, 0, 0) => derivatives[[0, ix, iy, iz]],
+                                (0, 1, 0) => derivatives[[1, ix, iy, iz]],
+                                (0, 0, 1) => derivatives[[2, ix, iy, iz]],
+                                (1, 1, 0) => derivatives[[3, ix, iy, iz]],
+                                (1, 0, 1) => derivatives[[4, ix, iy, iz]],
+                                (0, 1, 1) => derivatives[[5, ix, iy, iz]],
+                                _ => derivatives[[6, ix, iy, iz]],
+                            };
+                            result += value * bx[ix][dx] * by[iy][dy] * bz[iz][dz];
+                        }
+                    }
+                }
+            }
+        }
+    }
+    return result;
+}
+
+/// Solve the 3x3 linear system `a x = b` using Cramer's rule.
+///
+/// Returns `None` if `a` is singular.
+pub fn solve3(a: &[[f64; 3]; 3], b: &[f64; 3]) -> Option<[f64; 3]> {
+    let det = |m: &[[f64; 3]; 3]| {
+        return m[0][0] * (m[1][1] * m[2][2] - m[1][2] * m[2][1])
+            - m[0][1] * (m[1][0] * m[2][2] - m[1][2] * m[2][0])
+            + m[0][2] * (m[1][0] * m[2][1] - m[1][1] * m[2][0]);
+    };
+    let det_a = det(a);
+    if det_a == 0. || !det_a.is_finite() {
+        return None;
+    }
+    let mut x = [0.; 3];
+    for (col, x_col) in x.iter_mut().enumerate() {
+        let mut m = *a;
+        for row in 0..3 {
+            m[row][col] = b[row];
+        }
+        *x_col = det(&m) / det_a;
+    }
+    return Some(x);
+}
@@ -0,0 +1,75 @@
+//! Interpolation of fields at many points at once.
+use numpy::ndarray::{s, ArrayView2, ArrayView3, ArrayViewMut1, ArrayViewMut2, Zip};
+
+use crate::field::{Bounds, Field, RectilinearGrid};
+use crate::interp::interp_trilinear;
+
+/// Interpolate a field at a set of points, in parallel.
+///
+/// Points are first wrapped across any cyclic boundaries. Points that are
+/// then out of bounds are given a value of NaN.
+///
+/// # Parameters
+///
+/// * `field` - Field to interpolate.
+/// * `points` - Points to interpolate at. Must be shape (npoints, 3).
+/// * `out` - Array to write the interpolated vectors to. Must be shape (npoints, 3).
+pub fn interpolate_field<F: Field + Sync>(
+    field: &F,
+    points: ArrayView2<f64>,
+    mut out: ArrayViewMut2<f64>,
+) {
+    assert_eq!(points.ncols(), 3);
+    assert_eq!(out.dim(), (points.nrows(), 3));
+
+    Zip::from(out.rows_mut())
+        .and(points.rows())
+        .par_for_each(|mut out_row, point| {
+            let x = field.wrap_cyclic(point.to_owned());
+            match field.check_bounds(x.view()) {
+                Bounds::In => out_row.assign(&field.vector_at_position(x.view())),
+                Bounds::Out => out_row.fill(f64::NAN),
+            }
+        });
+}
+
+/// Tri-linearly interpolate a scalar defined on a grid at a set of points,
+/// in parallel.
+///
+/// Points are first wrapped across any cyclic boundaries. Points that are
+/// then out of bounds are given a value of NaN.
+///
+/// # Parameters
+///
+/// * `grid` - Grid the scalar is defined on.
+/// * `values` - Scalar values at each grid point. Must be shape (nx, ny, nz).
+/// * `points` - Points to interpolate at. Must be shape (npoints, 3).
+/// * `out` - Array to write the interpolated values to. Must be shape (npoints,).
+pub fn interpolate_scalars(
+    grid: &RectilinearGrid,
+    values: ArrayView3<f64>,
+    points: ArrayView2<f64>,
+    mut out: ArrayViewMut1<f64>,
+) {
+    assert_eq!(values.shape(), &grid.shape()[..]);
+    assert_eq!(points.ncols(), 3);
+    assert_eq!(out.len(), points.nrows());
+
+    Zip::from(&mut out)
+        .and(points.rows())
+        .par_for_each(|out_value, point| {
+            let x = grid.wrap_cyclic(point.to_owned());
+            *out_value = match grid.check_bounds(x.view()) {
+                Bounds::In => {
+                    let (cell_idx, cell_dist) = grid.cell_position(x.view());
+                    let cube = values.slice(s![
+                        cell_idx[0]..(cell_idx[0] + 2),
+                        cell_idx[1]..(cell_idx[1] + 2),
+                        cell_idx[2]..(cell_idx[2] + 2)
+                    ]);
+                    interp_trilinear(&cube, &cell_dist)
+                }
+                Bounds::Out => f64::NAN,
+            };
+        });
+}
@@ -1,24 +1,154 @@
 //! This crate contains code for tracing streamlines through a 3D vector field defined
 //! on rectilinear grids.
 #![warn(missing_docs)]
+pub mod curvilinear;
 pub mod field;
 pub mod interp;
+pub mod interpolate;
+pub mod multiblock;
+pub mod nulls;
+pub mod render;
+pub mod tiled;
 pub mod trace;
+pub mod visited;
 
 #[cfg(test)]
+mod test_curvilinear;
 mod test_field;
 mod test_interp;
+mod test_interpolate;
+mod test_multiblock;
+mod test_nulls;
+mod test_render;
+mod test_tiled;
 mod test_tracer;
+mod test_visited;
 
 use numpy::{
-    ndarray::Array, IntoPyArray, PyArray1, PyArray3, PyReadonlyArray1, PyReadonlyArray2,
-    PyReadonlyArray4,
+    ndarray::{array, Array, Array1},
+    IntoPyArray, PyArray1, PyArray2, PyArray3, PyReadonlyArray1, PyReadonlyArray2,
+    PyReadonlyArray3, PyReadonlyArray4, PyReadonlyArray5, PyReadwriteArray1, PyReadwriteArray2,
 };
-use pyo3::prelude::{pymodule, Bound, PyModule, PyResult, Python};
+use pyo3::exceptions::{PyOSError, PyValueError};
+use pyo3::prelude::{
+    pyclass, pymethods, pymodule, Bound, FromPyObject, PyModule, PyModuleMethods, PyRef, PyResult,
+    Python,
+};
+use std::path::PathBuf;
+use std::sync::Arc;
+
+use crate::curvilinear::{CellBvh, CurvilinearField};
+use crate::field::{RectilinearGrid, VectorField};
+use crate::multiblock::{Block, MultiBlockField};
+use crate::tiled::{TileCache, TileDtype, TileStore, TiledField};
+use crate::trace::StreamlineStatus;
+
+/// Split streamline statuses into arrays of the number of points
+/// and the termination reason of each streamline.
+fn status_arrays(statuses: &[StreamlineStatus]) -> (Array1<i64>, Array1<i64>) {
+    let mut termination_reasons = Array::zeros(statuses.len());
+    let mut n_points = Array::zeros(statuses.len());
+    for (i, status) in statuses.iter().enumerate() {
+        termination_reasons[[i]] = status.rot as i64;
+        n_points[[i]] = status.n_points as i64;
+    }
+    return (n_points, termination_reasons);
+}
+
+/// A 4D array of either double or single precision floats.
+#[derive(FromPyObject)]
+enum FloatArray4<'py> {
+    /// Double precision values.
+    F64(PyReadonlyArray4<'py, f64>),
+    /// Single precision values.
+    F32(PyReadonlyArray4<'py, f32>),
+}
+
+/// A bounding volume hierarchy over the cells of a curvilinear grid, which is
+/// kept between traces so that it is only built once per grid.
+#[pyclass(name = "CellBvh", frozen)]
+struct PyCellBvh {
+    bvh: Arc<CellBvh>,
+}
+
+#[pymethods]
+impl PyCellBvh {
+    #[new]
+    fn new(py: Python<'_>, coords: PyReadonlyArray4<f64>) -> PyResult<Self> {
+        let coords = coords.as_array();
+        let shape = coords.shape();
+        if shape[3] != 3 || shape[..3].iter().any(|n| return *n < 2) {
+            return Err(PyValueError::new_err(format!(
+                "coords must have shape (nx, ny, nz, 3) with at least two nodes along each dimension, got {shape:?}"
+            )));
+        }
+        let bvh = py.detach(|| return CellBvh::new(coords));
+        return Ok(PyCellBvh { bvh: Arc::new(bvh) });
+    }
+}
+
+/// A cache of decompressed tiles read from a tile file, which is kept
+/// between traces so that they can reuse tiles that are already cached.
+#[pyclass(name = "TileCache", frozen)]
+struct PyTileCache {
+    cache: TileCache,
+}
+
+#[pymethods]
+impl PyTileCache {
+    #[new]
+    fn new(
+        path: PathBuf,
+        offsets: PyReadonlyArray1<u64>,
+        shape: [usize; 3],
+        tile_shape: [usize; 3],
+        dtype: String,
+        cache_bytes: usize,
+    ) -> PyResult<Self> {
+        let dtype = match dtype.as_str() {
+            "float32" => TileDtype::Float32,
+            "float64" => TileDtype::Float64,
+            _ => {
+                return Err(PyValueError::new_err(format!(
+                    "Unsupported tile dtype: {dtype}"
+                )))
+            }
+        };
+        let store = TileStore::new(path, offsets.as_array().to_vec(), shape, tile_shape, dtype)?;
+        return Ok(PyTileCache {
+            cache: TileCache::new(store, cache_bytes),
+        });
+    }
+
+    fn set_capacity_bytes(&self, capacity_bytes: usize) {
+        self.cache.set_capacity_bytes(capacity_bytes);
+    }
+
+    fn clear(&self) {
+        self.cache.clear();
+    }
+
+    fn stats(&self) -> (u64, u64, u64, u64) {
+        let stats = self.cache.stats();
+        return (
+            stats.hits,
+            stats.misses,
+            stats.bytes_read,
+            stats.bytes_decompressed,
+        );
+    }
+
+    fn reset_stats(&self) {
+        self.cache.reset_stats();
+    }
+}
 
 #[pymodule]
 #[pyo3(name = "_streamtracer_rust")]
 fn streamtracer(_py: Python<'_>, m: &Bound<'_, PyModule>) -> PyResult<()> {
+    m.add_class::<PyCellBvh>()?;
+    m.add_class::<PyTileCache>()?;
+
     #[pyfn(m)]
     #[allow(clippy::too_many_arguments)]
     #[allow(clippy::type_complexity)]
@@ -30,6 +160,111 @@ fn streamtracer(_py: Python<'_>, m: &Bound<'_, PyModule>) -> PyResult<()> {
         zgrid: PyReadonlyArray1<f64>,
         values: PyReadonlyArray4<f64>,
         cyclic: PyReadonlyArray1<bool>,
+        derivatives: Option<PyReadonlyArray5<f64>>,
+        direction: i32,
+        step_size: f64,
+        max_steps: usize,
+    ) -> (
+        Bound<'py, PyArray3<f64>>,
+        Bound<'py, PyArray1<i64>>,
+        Bound<'py, PyArray1<i64>>,
+    ) {
+        let seeds = seeds.as_array();
+        let xgrid = xgrid.as_array();
+        let ygrid = ygrid.as_array();
+        let zgrid = zgrid.as_array();
+        let values = values.as_array();
+        let cyclic = cyclic.as_array();
+        let derivatives = derivatives.as_ref().map(|d| return d.as_array());
+        // Release the GIL while tracing so other Python threads can run
+        let (statuses, xs) = py.detach(|| {
+            return trace::trace_streamlines(
+                seeds,
+                xgrid,
+                ygrid,
+                zgrid,
+                values,
+                cyclic,
+                derivatives,
+                direction,
+                step_size,
+                max_steps,
+            );
+        });
+
+        let (n_points, termination_reasons) = status_arrays(&statuses);
+
+        return (
+            xs.into_pyarray(py),
+            n_points.into_pyarray(py),
+            termination_reasons.into_pyarray(py),
+        );
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::too_many_arguments)]
+    #[allow(clippy::type_complexity)]
+    fn trace_streamlines_multiblock<'py>(
+        py: Python<'py>,
+        seeds: PyReadonlyArray2<f64>,
+        origins: PyReadonlyArray2<f64>,
+        levels: PyReadonlyArray1<i64>,
+        xgrids: Vec<PyReadonlyArray1<f64>>,
+        ygrids: Vec<PyReadonlyArray1<f64>>,
+        zgrids: Vec<PyReadonlyArray1<f64>>,
+        values: Vec<PyReadonlyArray4<f64>>,
+        direction: i32,
+        step_size: f64,
+        max_steps: usize,
+    ) -> (
+        Bound<'py, PyArray3<f64>>,
+        Bound<'py, PyArray1<i64>>,
+        Bound<'py, PyArray1<i64>>,
+    ) {
+        let origins = origins.as_array();
+        let levels = levels.as_array();
+        // Cyclic boundaries are not supported on individual blocks
+        let cyclic = array![false, false, false];
+        let blocks: Vec<Block> = (0..values.len())
+            .map(|i| {
+                let field = VectorField::new(
+                    xgrids[i].as_array(),
+                    ygrids[i].as_array(),
+                    zgrids[i].as_array(),
+                    values[i].as_array(),
+                    cyclic.view(),
+                );
+                let origin = [origins[[i, 0]], origins[[i, 1]], origins[[i, 2]]];
+                return Block::new(origin, levels[[i]], field);
+            })
+            .collect();
+        let field = MultiBlockField::new(blocks);
+
+        let seeds = seeds.as_array();
+        let (statuses, xs) = py.detach(|| {
+            return trace::trace_field_streamlines(seeds, &field, direction, step_size, max_steps);
+        });
+        let (n_points, termination_reasons) = status_arrays(&statuses);
+
+        return (
+            xs.into_pyarray(py),
+            n_points.into_pyarray(py),
+            termination_reasons.into_pyarray(py),
+        );
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::too_many_arguments)]
+    #[allow(clippy::type_complexity)]
+    fn trace_streamlines_recording<'py>(
+        py: Python<'py>,
+        seeds: PyReadonlyArray2<f64>,
+        xgrid: PyReadonlyArray1<f64>,
+        ygrid: PyReadonlyArray1<f64>,
+        zgrid: PyReadonlyArray1<f64>,
+        values: PyReadonlyArray4<f64>,
+        cyclic: PyReadonlyArray1<bool>,
+        derivatives: Option<PyReadonlyArray5<f64>>,
         direction: i32,
         step_size: f64,
         max_steps: usize,
@@ -37,32 +272,302 @@ fn streamtracer(_py: Python<'_>, m: &Bound<'_, PyModule>) -> PyResult<()> {
         Bound<'py, PyArray3<f64>>,
         Bound<'py, PyArray1<i64>>,
         Bound<'py, PyArray1<i64>>,
+        Bound<'py, PyArray1<usize>>,
+        Bound<'py, PyArray1<usize>>,
     ) {
-        let (statuses, xs) = trace::trace_streamlines(
-            seeds.as_array(),
+        let mut field = VectorField::new(
             xgrid.as_array(),
             ygrid.as_array(),
             zgrid.as_array(),
             values.as_array(),
             cyclic.as_array(),
-            direction,
-            step_size,
-            max_steps,
         );
+        if let Some(derivatives) = &derivatives {
+            field = field.with_derivatives(derivatives.as_array());
+        }
+        let seeds = seeds.as_array();
+        let (statuses, xs, cells) = py.detach(|| {
+            return visited::trace_streamlines_recording(
+                seeds, &field, direction, step_size, max_steps,
+            );
+        });
+        let (n_points, termination_reasons) = status_arrays(&statuses);
 
-        let mut termination_reasons = Array::zeros(statuses.len());
-        let mut n_points = Array::zeros(statuses.len());
-        for (i, status) in statuses.iter().enumerate() {
-            termination_reasons[[i]] = status.rot as i64;
-            n_points[[i]] = status.n_points as i64;
+        // Flatten the cells of each streamline into a single array
+        let mut cell_offsets = Vec::with_capacity(cells.len() + 1);
+        cell_offsets.push(0);
+        for line_cells in &cells {
+            cell_offsets.push(cell_offsets[cell_offsets.len() - 1] + line_cells.len());
         }
+        let cells: Array1<usize> = cells.into_iter().flatten().collect();
 
         return (
             xs.into_pyarray(py),
             n_points.into_pyarray(py),
             termination_reasons.into_pyarray(py),
+            cells.into_pyarray(py),
+            Array1::from_vec(cell_offsets).into_pyarray(py),
         );
     }
 
+    #[pyfn(m)]
+    #[allow(clippy::type_complexity)]
+    fn trace_streamlines_curvilinear<'py>(
+        py: Python<'py>,
+        seeds: PyReadonlyArray2<f64>,
+        coords: PyReadonlyArray4<f64>,
+        values: PyReadonlyArray4<f64>,
+        bvh: PyRef<'_, PyCellBvh>,
+        direction: i32,
+        step_size: f64,
+        max_steps: usize,
+    ) -> PyResult<(
+        Bound<'py, PyArray3<f64>>,
+        Bound<'py, PyArray1<i64>>,
+        Bound<'py, PyArray1<i64>>,
+    )> {
+        let seeds = seeds.as_array();
+        let coords = coords.as_array();
+        let values = values.as_array();
+        if coords.shape() != values.shape()
+            || coords.shape()[..3] != bvh.bvh.ncells().map(|n| return n + 1)
+        {
+            return Err(PyValueError::new_err(
+                "coords, values and the cell BVH must be for the same grid",
+            ));
+        }
+        let bvh = Arc::clone(&bvh.bvh);
+        let (statuses, xs) = py.detach(|| {
+            let field = CurvilinearField::with_bvh(coords, values, bvh);
+            return trace::trace_field_streamlines(seeds, &field, direction, step_size, max_steps);
+        });
+        let (n_points, termination_reasons) = status_arrays(&statuses);
+
+        return Ok((
+            xs.into_pyarray(py),
+            n_points.into_pyarray(py),
+            termination_reasons.into_pyarray(py),
+        ));
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::too_many_arguments)]
+    #[allow(clippy::type_complexity)]
+    fn trace_streamlines_tiled<'py>(
+        py: Python<'py>,
+        seeds: PyReadonlyArray2<f64>,
+        cache: PyRef<'_, PyTileCache>,
+        xgrid: PyReadonlyArray1<f64>,
+        ygrid: PyReadonlyArray1<f64>,
+        zgrid: PyReadonlyArray1<f64>,
+        cyclic: PyReadonlyArray1<bool>,
+        direction: i32,
+        step_size: f64,
+        max_steps: usize,
+    ) -> PyResult<(
+        Bound<'py, PyArray3<f64>>,
+        Bound<'py, PyArray1<i64>>,
+        Bound<'py, PyArray1<i64>>,
+    )> {
+        let grid = RectilinearGrid::new(
+            xgrid.as_array(),
+            ygrid.as_array(),
+            zgrid.as_array(),
+            cyclic.as_array(),
+        );
+        let cache: &TileCache = &cache.cache;
+        let field = TiledField::new(grid, cache);
+
+        let seeds = seeds.as_array();
+        let (statuses, xs) = py.detach(|| {
+            return tiled::trace_tiled_streamlines(seeds, &field, direction, step_size, max_steps);
+        });
+        if let Some(err) = cache.take_error() {
+            return Err(PyOSError::new_err(err));
+        }
+        let (n_points, termination_reasons) = status_arrays(&statuses);
+
+        return Ok((
+            xs.into_pyarray(py),
+            n_points.into_pyarray(py),
+            termination_reasons.into_pyarray(py),
+        ));
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::too_many_arguments)]
+    fn interpolate_vectors(
+        py: Python<'_>,
+        points: PyReadonlyArray2<f64>,
+        xgrid: PyReadonlyArray1<f64>,
+        ygrid: PyReadonlyArray1<f64>,
+        zgrid: PyReadonlyArray1<f64>,
+        values: PyReadonlyArray4<f64>,
+        cyclic: PyReadonlyArray1<bool>,
+        derivatives: Option<PyReadonlyArray5<f64>>,
+        mut out: PyReadwriteArray2<f64>,
+    ) {
+        let mut field = VectorField::new(
+            xgrid.as_array(),
+            ygrid.as_array(),
+            zgrid.as_array(),
+            values.as_array(),
+            cyclic.as_array(),
+        );
+        if let Some(derivatives) = &derivatives {
+            field = field.with_derivatives(derivatives.as_array());
+        }
+        let points = points.as_array();
+        let out = out.as_array_mut();
+        py.detach(|| {
+            interpolate::interpolate_field(&field, points, out);
+        });
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::too_many_arguments)]
+    fn interpolate_scalars(
+        py: Python<'_>,
+        points: PyReadonlyArray2<f64>,
+        xgrid: PyReadonlyArray1<f64>,
+        ygrid: PyReadonlyArray1<f64>,
+        zgrid: PyReadonlyArray1<f64>,
+        values: PyReadonlyArray3<f64>,
+        cyclic: PyReadonlyArray1<bool>,
+        mut out: PyReadwriteArray1<f64>,
+    ) {
+        let grid = RectilinearGrid::new(
+            xgrid.as_array(),
+            ygrid.as_array(),
+            zgrid.as_array(),
+            cyclic.as_array(),
+        );
+        let values = values.as_array();
+        let points = points.as_array();
+        let out = out.as_array_mut();
+        py.detach(|| {
+            interpolate::interpolate_scalars(&grid, values, points, out);
+        });
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::type_complexity)]
+    fn find_nulls<'py>(
+        py: Python<'py>,
+        xgrid: PyReadonlyArray1<f64>,
+        ygrid: PyReadonlyArray1<f64>,
+        zgrid: PyReadonlyArray1<f64>,
+        values: PyReadonlyArray4<f64>,
+        cyclic: PyReadonlyArray1<bool>,
+    ) -> (Bound<'py, PyArray2<f64>>, Bound<'py, PyArray3<f64>>) {
+        let grid = RectilinearGrid::new(
+            xgrid.as_array(),
+            ygrid.as_array(),
+            zgrid.as_array(),
+            cyclic.as_array(),
+        );
+        let values = values.as_array();
+        let nulls = py.detach(|| {
+            return nulls::find_nulls(&grid, values);
+        });
+
+        let mut positions = Array::zeros((nulls.len(), 3));
+        let mut jacobians = Array::zeros((nulls.len(), 3, 3));
+        for (n, null) in nulls.iter().enumerate() {
+            for i in 0..3 {
+                positions[[n, i]] = null.position[i];
+                for j in 0..3 {
+                    jacobians[[n, i, j]] = null.jacobian[i][j];
+                }
+            }
+        }
+        return (positions.into_pyarray(py), jacobians.into_pyarray(py));
+    }
+
+    #[pyfn(m)]
+    fn cyclic_faces_match(py: Python<'_>, values: FloatArray4<'_>, axis: usize) -> PyResult<bool> {
+        if axis > 2 {
+            return Err(PyValueError::new_err(format!(
+                "axis must be 0, 1, or 2 (got {axis})"
+            )));
+        }
+        return Ok(match values {
+            FloatArray4::F64(values) => {
+                let values = values.as_array();
+                py.detach(|| return field::cyclic_faces_match(values, axis))
+            }
+            FloatArray4::F32(values) => {
+                let values = values.as_array();
+                py.detach(|| return field::cyclic_faces_match(values, axis))
+            }
+        });
+    }
+
+    #[pyfn(m)]
+    fn deposit_density<'py>(
+        py: Python<'py>,
+        points: PyReadonlyArray2<f64>,
+        offsets: PyReadonlyArray1<usize>,
+        xedges: PyReadonlyArray1<f64>,
+        yedges: PyReadonlyArray1<f64>,
+        zedges: PyReadonlyArray1<f64>,
+    ) -> Bound<'py, PyArray3<f64>> {
+        let points = points.as_array();
+        let offsets = offsets.as_array();
+        let edges = [xedges.as_array(), yedges.as_array(), zedges.as_array()];
+        let density = py.detach(|| {
+            return render::deposit_density(points, offsets, edges);
+        });
+        return density.into_pyarray(py);
+    }
+
+    #[pyfn(m)]
+    #[allow(clippy::too_many_arguments)]
+    fn line_integral_convolution<'py>(
+        py: Python<'py>,
+        xgrid: PyReadonlyArray1<f64>,
+        ygrid: PyReadonlyArray1<f64>,
+        zgrid: PyReadonlyArray1<f64>,
+        values: PyReadonlyArray4<f64>,
+        cyclic: PyReadonlyArray1<bool>,
+        derivatives: Option<PyReadonlyArray5<f64>>,
+        axis: usize,
+        position: f64,
+        ucoords: PyReadonlyArray1<f64>,
+        vcoords: PyReadonlyArray1<f64>,
+        noise: PyReadonlyArray2<f64>,
+        half_length: usize,
+        step_size: f64,
+        min_hits: usize,
+    ) -> Bound<'py, PyArray2<f64>> {
+        let mut field = VectorField::new(
+            xgrid.as_array(),
+            ygrid.as_array(),
+            zgrid.as_array(),
+            values.as_array(),
+            cyclic.as_array(),
+        );
+        if let Some(derivatives) = &derivatives {
+            field = field.with_derivatives(derivatives.as_array());
+        }
+        let ucoords = ucoords.as_array();
+        let vcoords = vcoords.as_array();
+        let noise = noise.as_array();
+        let image = py.detach(|| {
+            return render::line_integral_convolution(
+                &field,
+                axis,
+                position,
+                ucoords,
+                vcoords,
+                noise,
+                half_length,
+                step_size,
+                min_hits,
+            );
+        });
+        return image.into_pyarray(py);
+    }
+
     return Ok(());
 }
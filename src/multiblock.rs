@@ -0,0 +1,233 @@
+//! Structure for representing a 3D vector field defined on a collection
+//! of rectilinear blocks at different refinement levels, as produced by
+//! block-structured adaptive mesh refinement (AMR) codes.
+use numpy::ndarray::{Array1, ArrayView1};
+
+use crate::field::{Bounds, Field, VectorField};
+
+/// Maximum number of blocks stored in an octree leaf before it is split.
+const MAX_LEAF_BLOCKS: usize = 8;
+/// Maximum depth of the block lookup octree.
+const MAX_DEPTH: usize = 16;
+
+/// A single rectilinear block of a multi-block field.
+pub struct Block<'a> {
+    /// Physical coordinate of the lower corner of the block.
+    pub origin: [f64; 3],
+    /// Refinement level of the block. Higher levels are finer.
+    pub level: i64,
+    /// Vector field on the block, in coordinates relative to `origin`.
+    pub field: VectorField<'a>,
+    /// Physical coordinate of the upper corner of the block.
+    upper: [f64; 3],
+}
+
+impl Block<'_> {
+    /// Create a new block from a field defined relative to `origin`.
+    pub fn new<'a>(origin: [f64; 3], level: i64, field: VectorField<'a>) -> Block<'a> {
+        let upper = [
+            origin[0] + field.grid.xgrid[field.grid.xgrid.len() - 1],
+            origin[1] + field.grid.ygrid[field.grid.ygrid.len() - 1],
+            origin[2] + field.grid.zgrid[field.grid.zgrid.len() - 1],
+        ];
+        return Block {
+            origin,
+            level,
+            field,
+            upper,
+        };
+    }
+
+    /// Check whether the block contains the physical coordinate `x`.
+    fn contains(&self, x: ArrayView1<f64>) -> bool {
+        for i in 0..3 {
+            if x[i] < self.origin[i] || x[i] > self.upper[i] {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    /// Check whether the block overlaps the box `[lower, upper]`.
+    fn overlaps(&self, lower: &[f64; 3], upper: &[f64; 3]) -> bool {
+        for i in 0..3 {
+            if self.upper[i] < lower[i] || self.origin[i] > upper[i] {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    /// Convert a physical coordinate to coordinates relative to the block.
+    fn to_local(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        let mut local = x.to_owned();
+        for i in 0..3 {
+            local[i] -= self.origin[i];
+        }
+        return local;
+    }
+}
+
+/// A node of the block lookup octree.
+struct OctreeNode {
+    /// Lower corner of the node.
+    lower: [f64; 3],
+    /// Upper corner of the node.
+    upper: [f64; 3],
+    /// Index of the first of the eight children in the node list,
+    /// or `None` if this node is a leaf.
+    children: Option<usize>,
+    /// Indices of the blocks overlapping this node, finest first.
+    /// Only populated for leaf nodes.
+    blocks: Vec<usize>,
+}
+
+/// A 3D vector field defined on a collection of rectilinear blocks.
+///
+/// Where blocks overlap, the block with the highest refinement level is
+/// used, so that tracing always takes place at the finest available
+/// resolution.
+pub struct MultiBlockField<'a> {
+    /// Blocks making up the field.
+    pub blocks: Vec<Block<'a>>,
+    /// Flattened octree used to look up the block containing a point.
+    /// The first node is the root.
+    nodes: Vec<OctreeNode>,
+}
+
+impl MultiBlockField<'_> {
+    /// Create a new MultiBlockField, building the block lookup index.
+    pub fn new<'a>(blocks: Vec<Block<'a>>) -> MultiBlockField<'a> {
+        assert!(!blocks.is_empty(), "At least one block must be given");
+
+        let mut lower = blocks[0].origin;
+        let mut upper = blocks[0].upper;
+        for block in blocks.iter() {
+            for i in 0..3 {
+                lower[i] = lower[i].min(block.origin[i]);
+                upper[i] = upper[i].max(block.upper[i]);
+            }
+        }
+
+        // Sort candidates finest first, so that the first block found
+        // to contain a point during lookup is the finest one.
+        let mut all_blocks: Vec<usize> = (0..blocks.len()).collect();
+        all_blocks.sort_by(|&a, &b| return blocks[b].level.cmp(&blocks[a].level).then(a.cmp(&b)));
+
+        let mut field = MultiBlockField {
+            blocks,
+            nodes: Vec::new(),
+        };
+        field.nodes.push(OctreeNode {
+            lower,
+            upper,
+            children: None,
+            blocks: all_blocks,
+        });
+        field.split_node(0, 0);
+        return field;
+    }
+
+    /// Recursively split an octree node until it contains few enough blocks.
+    fn split_node(&mut self, node_idx: usize, depth: usize) {
+        if self.nodes[node_idx].blocks.len() <= MAX_LEAF_BLOCKS || depth >= MAX_DEPTH {
+            return;
+        }
+        let lower = self.nodes[node_idx].lower;
+        let upper = self.nodes[node_idx].upper;
+        let centre = [
+            0.5 * (lower[0] + upper[0]),
+            0.5 * (lower[1] + upper[1]),
+            0.5 * (lower[2] + upper[2]),
+        ];
+        let parent_blocks = std::mem::take(&mut self.nodes[node_idx].blocks);
+
+        let first_child = self.nodes.len();
+        for child in 0..8 {
+            let mut child_lower = lower;
+            let mut child_upper = centre;
+            for i in 0..3 {
+                if (child >> (2 - i)) & 1 == 1 {
+                    child_lower[i] = centre[i];
+                    child_upper[i] = upper[i];
+                }
+            }
+            let child_blocks: Vec<usize> = parent_blocks
+                .iter()
+                .copied()
+                .filter(|&b| return self.blocks[b].overlaps(&child_lower, &child_upper))
+                .collect();
+            self.nodes.push(OctreeNode {
+                lower: child_lower,
+                upper: child_upper,
+                children: None,
+                blocks: child_blocks,
+            });
+        }
+        self.nodes[node_idx].children = Some(first_child);
+
+        // Stop splitting if it did not separate any blocks, to avoid
+        // recursing on e.g. many blocks sharing a single corner.
+        let n_parent = parent_blocks.len();
+        for child in first_child..first_child + 8 {
+            if self.nodes[child].blocks.len() < n_parent {
+                self.split_node(child, depth + 1);
+            }
+        }
+    }
+
+    /// Return the index of the finest block containing `x`, if any.
+    pub fn block_idx(&self, x: ArrayView1<f64>) -> Option<usize> {
+        let mut node = &self.nodes[0];
+        for i in 0..3 {
+            if x[i] < node.lower[i] || x[i] > node.upper[i] {
+                return None;
+            }
+        }
+        while let Some(first_child) = node.children {
+            let mut child = 0;
+            for i in 0..3 {
+                if x[i] >= 0.5 * (node.lower[i] + node.upper[i]) {
+                    child |= 1 << (2 - i);
+                }
+            }
+            node = &self.nodes[first_child + child];
+        }
+        return node
+            .blocks
+            .iter()
+            .copied()
+            .find(|&b| return self.blocks[b].contains(x));
+    }
+}
+
+impl Field for MultiBlockField<'_> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        // RK4 sub-steps can fall just outside the domain, so look up the
+        // block at the closest point inside it. The block field then
+        // extrapolates in the same way as a single VectorField.
+        let root = &self.nodes[0];
+        let mut x_clamped = x.to_owned();
+        for i in 0..3 {
+            x_clamped[i] = x_clamped[i].clamp(root.lower[i], root.upper[i]);
+        }
+        match self.block_idx(x_clamped.view()) {
+            Some(idx) => {
+                let block = &self.blocks[idx];
+                return block.field.vector_at_position(block.to_local(x).view());
+            }
+            None => return Array1::from_elem(3, f64::NAN),
+        }
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return x;
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        match self.block_idx(x) {
+            Some(_) => return Bounds::In,
+            None => return Bounds::Out,
+        }
+    }
+}
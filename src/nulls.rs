@@ -0,0 +1,220 @@
+//! Finding null points, where all three components of a vector field vanish.
+use std::collections::HashMap;
+
+use ndarray::parallel::prelude::*;
+use numpy::ndarray::{array, s, Array1, ArrayView4};
+
+use crate::field::RectilinearGrid;
+use crate::interp::{interp_trilinear, interp_trilinear_gradient, solve3};
+
+/// Maximum number of Newton iterations used to find a null in a cell.
+const MAX_NEWTON_ITERATIONS: usize = 50;
+/// Tolerance on the normalised cell coordinates of a null.
+const LOCAL_TOLERANCE: f64 = 1e-10;
+
+/// A null point of a vector field.
+#[derive(Debug)]
+pub struct Null {
+    /// Index of the cell the null was found in.
+    pub cell: [usize; 3],
+    /// Position of the null.
+    pub position: [f64; 3],
+    /// Jacobian of the field at the null, where `jacobian[i][j]` is the
+    /// derivative of component `i` with respect to coordinate `j`.
+    pub jacobian: [[f64; 3]; 3],
+}
+
+/// Find the null points of a vector field, in parallel.
+///
+/// Cells are first filtered by checking that every component of the field
+/// changes sign (or is zero) on the corners of the cell, as otherwise the
+/// tri-linearly interpolated field cannot vanish inside it. Nulls are then
+/// found in each remaining cell in parallel, by solving for the zero of the
+/// tri-linear interpolant with Newton iterations. At most one null is
+/// found in each cell, and nulls on faces, edges or corners shared by
+/// several cells are only returned once. This includes cells on opposite
+/// sides of a cyclic boundary, where the null is returned at the lower end
+/// of the cyclic axis.
+///
+/// # Parameters
+///
+/// * `grid` - Grid the field is defined on.
+/// * `values` - Vector values at each grid point. Must be shape (nx, ny, nz, 3).
+///
+/// Returns the nulls ordered by the index of the cell they are in.
+pub fn find_nulls(grid: &RectilinearGrid, values: ArrayView4<f64>) -> Vec<Null> {
+    let shape = grid.shape();
+    assert_eq!(values.shape(), &[shape[0], shape[1], shape[2], 3]);
+    let ncells = [shape[0] - 1, shape[1] - 1, shape[2] - 1];
+
+    let nulls: Vec<Null> = (0..ncells[0] * ncells[1] * ncells[2])
+        .into_par_iter()
+        .filter_map(|cell| {
+            let cell = [
+                cell / (ncells[1] * ncells[2]),
+                (cell / ncells[2]) % ncells[1],
+                cell % ncells[2],
+            ];
+            if !changes_sign(&values, cell) {
+                return None;
+            }
+            return cell_null(grid, &values, cell);
+        })
+        .collect();
+
+    // Period of each cyclic axis, as the grids start at zero
+    let periods = [
+        grid.xgrid[shape[0] - 1],
+        grid.ygrid[shape[1] - 1],
+        grid.zgrid[shape[2] - 1],
+    ];
+    let cyclic = [grid.is_cyclic(0), grid.is_cyclic(1), grid.is_cyclic(2)];
+
+    // Remove duplicate nulls found in neighbouring cells
+    let mut unique: Vec<Null> = Vec::new();
+    let mut by_cell: HashMap<[usize; 3], Vec<usize>> = HashMap::new();
+    for null in nulls {
+        let cell_size = grid.cell_size(&array![null.cell[0], null.cell[1], null.cell[2]]);
+        let duplicate = neighbours(null.cell, ncells, cyclic)
+            .iter()
+            .any(|neighbour| {
+                return by_cell.get(neighbour).is_some_and(|idxs| {
+                    return idxs.iter().any(|idx| {
+                        let other = &unique[*idx];
+                        return (0..3).all(|d| {
+                            let mut distance = other.position[d] - null.position[d];
+                            if cyclic[d] {
+                                distance -= periods[d] * (distance / periods[d]).round();
+                            }
+                            return distance.abs() <= 1e3 * LOCAL_TOLERANCE * cell_size[d];
+                        });
+                    });
+                });
+            });
+        if !duplicate {
+            by_cell.entry(null.cell).or_default().push(unique.len());
+            unique.push(null);
+        }
+    }
+    return unique;
+}
+
+/// Check whether every component of the field is zero or changes sign on
+/// the corners of a cell.
+fn changes_sign(values: &ArrayView4<f64>, cell: [usize; 3]) -> bool {
+    let cube = values.slice(s![
+        cell[0]..(cell[0] + 2),
+        cell[1]..(cell[1] + 2),
+        cell[2]..(cell[2] + 2),
+        ..
+    ]);
+    for c in 0..3 {
+        let component = cube.slice(s![.., .., .., c]);
+        let min = component.fold(f64::INFINITY, |a, b| return a.min(*b));
+        let max = component.fold(f64::NEG_INFINITY, |a, b| return a.max(*b));
+        if min > 0. || max < 0. {
+            return false;
+        }
+    }
+    return true;
+}
+
+/// Find the null of the tri-linearly interpolated field in a cell using
+/// Newton iterations, starting from the centre of the cell and then from
+/// each of its corners.
+fn cell_null(grid: &RectilinearGrid, values: &ArrayView4<f64>, cell: [usize; 3]) -> Option<Null> {
+    let cube = values.slice(s![
+        cell[0]..(cell[0] + 2),
+        cell[1]..(cell[1] + 2),
+        cell[2]..(cell[2] + 2),
+        ..
+    ]);
+    // Value and Jacobian of the field with respect to normalised cell coordinates
+    let evaluate = |x: &Array1<f64>| {
+        let mut value = [0.; 3];
+        let mut jacobian = [[0.; 3]; 3];
+        for c in 0..3 {
+            let component = cube.slice(s![.., .., .., c]);
+            value[c] = interp_trilinear(&component, x);
+            jacobian[c] = interp_trilinear_gradient(&component, x);
+        }
+        return (value, jacobian);
+    };
+
+    let mut starts = vec![array![0.5, 0.5, 0.5]];
+    for corner in 0..8 {
+        starts.push(array![
+            (corner & 1) as f64,
+            ((corner >> 1) & 1) as f64,
+            ((corner >> 2) & 1) as f64
+        ]);
+    }
+    for mut x in starts {
+        for _ in 0..MAX_NEWTON_ITERATIONS {
+            let (value, jacobian) = evaluate(&x);
+            let step = match solve3(&jacobian, &value) {
+                Some(step) => step,
+                None => break,
+            };
+            for d in 0..3 {
+                x[d] -= step[d];
+            }
+            if x.iter().any(|v| return v.abs() > 10.) {
+                break;
+            }
+            if step.iter().all(|v| return v.abs() < LOCAL_TOLERANCE) {
+                if x.iter()
+                    .any(|v| return *v < -LOCAL_TOLERANCE || *v > 1. + LOCAL_TOLERANCE)
+                {
+                    break;
+                }
+                let cell_idx = array![cell[0], cell[1], cell[2]];
+                let cell_size = grid.cell_size(&cell_idx);
+                let (_, local_jacobian) = evaluate(&x);
+                let mut jacobian = [[0.; 3]; 3];
+                for i in 0..3 {
+                    for j in 0..3 {
+                        jacobian[i][j] = local_jacobian[i][j] / cell_size[j];
+                    }
+                }
+                return Some(Null {
+                    cell,
+                    position: [
+                        grid.xgrid[cell[0]] + x[0] * cell_size[0],
+                        grid.ygrid[cell[1]] + x[1] * cell_size[1],
+                        grid.zgrid[cell[2]] + x[2] * cell_size[2],
+                    ],
+                    jacobian,
+                });
+            }
+        }
+    }
+    return None;
+}
+
+/// Indices of a cell and all the cells that share a corner with it, on a
+/// grid with `ncells` cells along each axis. Indices are wrapped around
+/// the axes that are cyclic.
+fn neighbours(cell: [usize; 3], ncells: [usize; 3], cyclic: [bool; 3]) -> Vec<[usize; 3]> {
+    // Indices of the neighbouring cells along each axis
+    let axis_neighbours = |d: usize| {
+        let mut idxs = Vec::with_capacity(3);
+        for i in cell[d] as i64 - 1..=cell[d] as i64 + 1 {
+            if cyclic[d] {
+                idxs.push(i.rem_euclid(ncells[d] as i64) as usize);
+            } else if i >= 0 && i < ncells[d] as i64 {
+                idxs.push(i as usize);
+            }
+        }
+        return idxs;
+    };
+    let mut neighbours = Vec::with_capacity(27);
+    for i in axis_neighbours(0) {
+        for j in axis_neighbours(1) {
+            for k in axis_neighbours(2) {
+                neighbours.push([i, j, k]);
+            }
+        }
+    }
+    return neighbours;
+}
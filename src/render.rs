@@ -0,0 +1,313 @@
+//! Rendering of streamlines and vector fields into images.
+//!
+//! This contains deposition of traced streamlines onto a density grid, and
+//! line integral convolution (LIC) of a vector field on a slice plane.
+use std::collections::HashMap;
+
+use ndarray::parallel::prelude::*;
+use numpy::ndarray::{array, s, Array, Array1, Array2, Array3, ArrayView1, ArrayView2};
+
+use crate::field::{Bounds, Field};
+use crate::trace::trace_streamline;
+
+/// Number of rows of seed pixels in each block of a LIC image. This is fixed,
+/// rather than depending on the number of threads, so images are reproducible.
+const LIC_BLOCK_ROWS: usize = 16;
+
+/// Index of the bin that `x` falls in, given monotonically increasing bin
+/// edges. Returns `None` if `x` is outside the edges.
+///
+/// Bins include their lower edge, apart from the last bin which also
+/// includes its upper edge (matching `numpy.histogramdd`).
+fn bin_idx(edges: &ArrayView1<f64>, x: f64) -> Option<usize> {
+    let n = edges.len();
+    if !(x >= edges[0] && x <= edges[n - 1]) {
+        return None;
+    }
+    let idx = edges
+        .as_slice()
+        .unwrap()
+        .partition_point(|edge| return *edge <= x);
+    return Some(idx.clamp(1, n - 1) - 1);
+}
+
+/// Deposit the length of streamlines onto a density grid, in parallel.
+///
+/// Each segment between two consecutive points of a streamline deposits its
+/// length into the bin containing its midpoint. Streamlines are split between
+/// threads, each of which accumulates into its own grid before the grids are
+/// summed, so no synchronisation is needed while depositing.
+///
+/// # Parameters
+///
+/// * `points` - Points of all the streamlines, concatenated. Must be shape (npoints, 3).
+/// * `offsets` - Index of the first point of each streamline in `points`, followed by `npoints`.
+/// * `edges` - Bin edges along each dimension. Each must be monotonically
+///   increasing and contiguous.
+///
+/// Returns the total streamline length in each bin, with shape
+/// (nx - 1, ny - 1, nz - 1) where (nx, ny, nz) are the number of edges.
+pub fn deposit_density(
+    points: ArrayView2<f64>,
+    offsets: ArrayView1<usize>,
+    edges: [ArrayView1<f64>; 3],
+) -> Array3<f64> {
+    assert_eq!(points.ncols(), 3);
+    assert_eq!(offsets[offsets.len() - 1], points.nrows());
+    let shape = (edges[0].len() - 1, edges[1].len() - 1, edges[2].len() - 1);
+
+    return (0..offsets.len() - 1)
+        .into_par_iter()
+        .fold(
+            || return Array3::zeros(shape),
+            |mut density, line| {
+                let line = points.slice(s![offsets[line]..offsets[line + 1], ..]);
+                for segment in line.windows((2, 3)) {
+                    let start = segment.row(0);
+                    let end = segment.row(1);
+                    let length = (&end - &start).mapv(|d| return d * d).sum().sqrt();
+                    let idx = (
+                        bin_idx(&edges[0], 0.5 * (start[0] + end[0])),
+                        bin_idx(&edges[1], 0.5 * (start[1] + end[1])),
+                        bin_idx(&edges[2], 0.5 * (start[2] + end[2])),
+                    );
+                    if let (Some(i), Some(j), Some(k)) = idx {
+                        density[[i, j, k]] += length;
+                    }
+                }
+                return density;
+            },
+        )
+        .reduce(|| return Array3::zeros(shape), |a, b| return a + b);
+}
+
+/// A field projected onto planes perpendicular to one of the coordinate axes.
+///
+/// Streamlines traced through a `SliceField` stay in the plane they are seeded
+/// in. Where the in-plane component of the field vanishes streamlines are
+/// given non-finite positions, which are treated as out of bounds.
+pub struct SliceField<'a, F: Field> {
+    /// Field to project.
+    pub field: &'a F,
+    /// Axis normal to the planes. Must be 0, 1, or 2.
+    pub axis: usize,
+}
+
+impl<F: Field> Field for SliceField<'_, F> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        let mut vector = self.field.vector_at_position(x);
+        vector[self.axis] = 0.;
+        return vector;
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return self.field.wrap_cyclic(x);
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        if x.iter().any(|v| return !v.is_finite()) {
+            return Bounds::Out;
+        }
+        return self.field.check_bounds(x);
+    }
+}
+
+/// Uniformly spaced pixels on a plane perpendicular to one of the coordinate axes.
+struct Pixels<'a> {
+    /// Axis normal to the plane.
+    axis: usize,
+    /// Position of the plane along `axis`.
+    position: f64,
+    /// Coordinates of the pixel centres along the first in-plane axis.
+    ucoords: ArrayView1<'a, f64>,
+    /// Coordinates of the pixel centres along the second in-plane axis.
+    vcoords: ArrayView1<'a, f64>,
+}
+
+impl Pixels<'_> {
+    /// In-plane axes, in increasing order.
+    fn plane_axes(&self) -> (usize, usize) {
+        return match self.axis {
+            0 => (1, 2),
+            1 => (0, 2),
+            _ => (0, 1),
+        };
+    }
+
+    /// Position of the centre of pixel `(i, j)`.
+    fn centre(&self, i: usize, j: usize) -> Array1<f64> {
+        let (u, v) = self.plane_axes();
+        let mut x = array![0., 0., 0.];
+        x[self.axis] = self.position;
+        x[u] = self.ucoords[i];
+        x[v] = self.vcoords[j];
+        return x;
+    }
+
+    /// Index of the pixel containing `x`, or `None` if `x` is outside the image.
+    fn idx(&self, x: ArrayView1<f64>) -> Option<(usize, usize)> {
+        let (u, v) = self.plane_axes();
+        let i = nearest(&self.ucoords, x[u])?;
+        let j = nearest(&self.vcoords, x[v])?;
+        return Some((i, j));
+    }
+}
+
+/// Index of the nearest of a set of uniformly spaced coordinates to `x`, or
+/// `None` if `x` is more than half a spacing outside the coordinates.
+fn nearest(coords: &ArrayView1<f64>, x: f64) -> Option<usize> {
+    let n = coords.len();
+    let spacing = if n > 1 {
+        (coords[n - 1] - coords[0]) / (n - 1) as f64
+    } else {
+        1.
+    };
+    let idx = ((x - coords[0]) / spacing).round();
+    if !(idx >= 0. && idx < n as f64) {
+        return None;
+    }
+    return Some(idx as usize);
+}
+
+/// Compute a line integral convolution (LIC) image of a field on a slice
+/// plane, in parallel.
+///
+/// The image is computed with the FastLIC method. Instead of tracing a
+/// separate streamline for every pixel, a long streamline is traced from a
+/// pixel and a box filter is slid along it, giving the convolved value at
+/// every pixel the streamline passes through. Pixels that have already been
+/// hit by `min_hits` streamlines are not used as seeds, so only a fraction of
+/// pixels need tracing.
+///
+/// Seed pixels are split into fixed blocks of rows, which are traced in
+/// parallel. Each block keeps its own sparse hit counts, so some pixels are
+/// seeded once per block that reaches them, and the contributions of the
+/// blocks are summed in order at the end. The image is therefore the same
+/// regardless of the number of threads, and only the pixels actually hit
+/// are stored for each block.
+///
+/// # Parameters
+///
+/// * `field` - Field to render. Only the in-plane components are used.
+/// * `axis` - Axis normal to the slice plane. Must be 0, 1, or 2.
+/// * `position` - Position of the plane along `axis`.
+/// * `ucoords`, `vcoords` - Uniformly spaced coordinates of the pixel centres
+///   along the in-plane axes, in increasing axis order.
+/// * `noise` - Texture to convolve. Must be shape (nu, nv).
+/// * `half_length` - Half length of the convolution filter, in steps.
+/// * `step_size` - Size of each step along the streamlines.
+/// * `min_hits` - Number of streamlines that must have passed through a pixel
+///   before it stops being used as a seed.
+///
+/// Returns the convolved image, with shape (nu, nv).
+#[allow(clippy::too_many_arguments)]
+pub fn line_integral_convolution<F: Field + Sync>(
+    field: &F,
+    axis: usize,
+    position: f64,
+    ucoords: ArrayView1<f64>,
+    vcoords: ArrayView1<f64>,
+    noise: ArrayView2<f64>,
+    half_length: usize,
+    step_size: f64,
+    min_hits: usize,
+) -> Array2<f64> {
+    assert!(axis < 3);
+    assert_eq!(noise.dim(), (ucoords.len(), vcoords.len()));
+    let shape = noise.dim();
+    let pixels = Pixels {
+        axis,
+        position,
+        ucoords,
+        vcoords,
+    };
+    let slice_field = SliceField { field, axis };
+    // Trace lines longer than the filter so each one is reused for many pixels
+    let max_steps = 4 * half_length + 1;
+
+    let blocks: Vec<Vec<(usize, f64)>> = (0..shape.0.div_ceil(LIC_BLOCK_ROWS))
+        .into_par_iter()
+        .map(|block| {
+            let rows = (block * LIC_BLOCK_ROWS)..((block + 1) * LIC_BLOCK_ROWS).min(shape.0);
+            // Contributions of each streamline to the pixels it passes through
+            let mut contributions = Vec::new();
+            let mut hits: HashMap<(usize, usize), usize> = HashMap::new();
+            for seed_idx in rows.flat_map(|i| return (0..shape.1).map(move |j| return (i, j))) {
+                if hits.get(&seed_idx).is_some_and(|n| return *n >= min_hits) {
+                    continue;
+                }
+                let seed = pixels.centre(seed_idx.0, seed_idx.1);
+                let line = pixel_line(&slice_field, &pixels, seed.view(), step_size, max_steps);
+                let samples: Array1<f64> = line.iter().map(|idx| return noise[*idx]).collect();
+
+                // Running box filter along the line
+                let n = line.len();
+                let mut window_sum: f64 = samples.slice(s![..(half_length + 1).min(n)]).sum();
+                for (i, idx) in line.iter().enumerate() {
+                    let lower = i.saturating_sub(half_length);
+                    let upper = (i + half_length + 1).min(n);
+                    contributions
+                        .push((idx.0 * shape.1 + idx.1, window_sum / (upper - lower) as f64));
+                    *hits.entry(*idx).or_insert(0) += 1;
+                    // Slide the window along by one
+                    if i + half_length + 1 < n {
+                        window_sum += samples[i + half_length + 1];
+                    }
+                    if i >= half_length {
+                        window_sum -= samples[i - half_length];
+                    }
+                }
+            }
+            return contributions;
+        })
+        .collect();
+
+    // Combine the blocks in order, so the result doesn't depend on threading
+    let mut sums = vec![0.; shape.0 * shape.1];
+    let mut hits = vec![0_usize; shape.0 * shape.1];
+    for (pixel, value) in blocks.into_iter().flatten() {
+        sums[pixel] += value;
+        hits[pixel] += 1;
+    }
+    let image: Vec<f64> = sums
+        .iter()
+        .zip(hits.iter())
+        .map(|(sum, hits)| {
+            if *hits == 0 {
+                return f64::NAN;
+            }
+            return sum / *hits as f64;
+        })
+        .collect();
+    return Array::from_shape_vec(shape, image).unwrap();
+}
+
+/// Trace a streamline forwards and backwards from `seed`, returning the
+/// indices of the pixels it passes through from its backwards end to its
+/// forwards end. The streamline is cut where it leaves the image.
+fn pixel_line<F: Field>(
+    field: &F,
+    pixels: &Pixels,
+    seed: ArrayView1<f64>,
+    step_size: f64,
+    max_steps: usize,
+) -> Vec<(usize, usize)> {
+    let mut line = Vec::new();
+    for direction in [-1, 1] {
+        let result = trace_streamline(seed, field, &direction, &step_size, max_steps);
+        let mut idxs: Vec<(usize, usize)> = result
+            .line
+            .slice(s![..result.status.n_points, ..])
+            .rows()
+            .into_iter()
+            .map_while(|x| return pixels.idx(x))
+            .collect();
+        if direction == -1 {
+            // Reverse, dropping the seed which is added by the forward line
+            idxs.reverse();
+            idxs.pop();
+        }
+        line.extend(idxs);
+    }
+    return line;
+}
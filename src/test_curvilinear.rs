@@ -0,0 +1,128 @@
+#[cfg(test)]
+mod curvilinear_tests {
+    use std::f64::consts::PI;
+    use std::sync::Arc;
+
+    use numpy::ndarray::{array, Array, Array1, Array4};
+
+    use super::super::curvilinear::{CellBvh, CurvilinearField};
+    use super::super::field::Field;
+    use super::super::trace::{trace_streamline, TracerStatus};
+
+    /// Nodes of a quarter of a cylindrical shell with radii between 1 and 2,
+    /// and a field that circles the z axis.
+    fn cylinder(nr: usize, ntheta: usize, nz: usize) -> (Array4<f64>, Array4<f64>) {
+        let mut coords: Array4<f64> = Array::zeros((nr, ntheta, nz, 3));
+        let mut values: Array4<f64> = Array::zeros((nr, ntheta, nz, 3));
+        for i in 0..nr {
+            for j in 0..ntheta {
+                for k in 0..nz {
+                    let r = 1. + i as f64 / (nr - 1) as f64;
+                    let theta = 0.5 * PI * j as f64 / (ntheta - 1) as f64;
+                    let x = r * theta.cos();
+                    let y = r * theta.sin();
+                    let z = k as f64 / (nz - 1) as f64;
+                    coords[[i, j, k, 0]] = x;
+                    coords[[i, j, k, 1]] = y;
+                    coords[[i, j, k, 2]] = z;
+                    values[[i, j, k, 0]] = -y;
+                    values[[i, j, k, 1]] = x;
+                }
+            }
+        }
+        return (coords, values);
+    }
+
+    #[test]
+    fn test_sheared_grid() {
+        // An affine, sheared grid, on which a linear field is reproduced exactly
+        let mut coords: Array4<f64> = Array::zeros((4, 5, 3, 3));
+        let mut values: Array4<f64> = Array::zeros((4, 5, 3, 3));
+        for ((i, j, k, c), value) in coords.indexed_iter_mut() {
+            *value = [i as f64 + 0.5 * j as f64, j as f64, 2. * k as f64][c];
+        }
+        for ((i, j, k, c), value) in values.indexed_iter_mut() {
+            let x = [
+                coords[[i, j, k, 0]],
+                coords[[i, j, k, 1]],
+                coords[[i, j, k, 2]],
+            ];
+            *value = [x[0] + x[1], x[1] - x[2], 2. * x[2]][c];
+        }
+        let f = CurvilinearField::new(coords.view(), values.view());
+
+        let (cell_idx, xi) = f.locate(array![2.2, 1.5, 3.].view()).unwrap();
+        assert_eq!(cell_idx, [1, 1, 1]);
+        for (actual, expected) in xi.iter().zip([0.45, 0.5, 0.5]) {
+            assert!((actual - expected).abs() < 1e-10);
+        }
+
+        for x in [
+            array![0.1, 0.1, 0.1],
+            array![2.2, 1.5, 3.],
+            array![4.9, 3.9, 3.9],
+        ] {
+            let expected: Array1<f64> = array![x[0] + x[1], x[1] - x[2], 2. * x[2]];
+            let actual = f.vector_at_position(x.view());
+            assert!((actual - expected).iter().all(|d| return d.abs() < 1e-10));
+        }
+        // Outside the sheared edge of the grid, but inside its bounding box
+        assert!(f.locate(array![0.1, 3.9, 1.].view()).is_none());
+        assert!(f.vector_at_position(array![0.1, 3.9, 1.].view())[0].is_nan());
+    }
+
+    #[test]
+    fn test_cylinder_locate() {
+        let (coords, values) = cylinder(5, 17, 3);
+        let f = CurvilinearField::new(coords.view(), values.view());
+
+        for (r, theta, z, expected) in [
+            (1.1, 0.01, 0.1, [0, 0, 0]),
+            (1.9, 1.5, 0.9, [3, 15, 1]),
+            (1.4, 0.8, 0.6, [1, 8, 1]),
+        ] {
+            let x = array![r * f64::cos(theta), r * f64::sin(theta), z];
+            let (cell_idx, _) = f.locate(x.view()).unwrap();
+            assert_eq!(cell_idx, expected);
+        }
+        // Inside the hole in the middle of the shell
+        assert!(f.locate(array![0.5, 0.5, 0.5].view()).is_none());
+    }
+
+    #[test]
+    fn test_cylinder_trace() {
+        // The field is interpolated exactly, so field lines are circles
+        let (coords, values) = cylinder(5, 33, 3);
+        let f = CurvilinearField::new(coords.view(), values.view());
+
+        let seed = array![1.5, 0.001, 0.5];
+        let result = trace_streamline(seed.view(), &f, &1, &0.01, 1000);
+        assert_eq!(result.status.rot, TracerStatus::OutOfBounds);
+        // Quarter of a circle of radius 1.5
+        assert!((result.status.n_points as f64 - 0.75 * PI / 0.01).abs() < 2.);
+        for i in 0..result.status.n_points {
+            let x = result.line.row(i);
+            assert!(((x[0] * x[0] + x[1] * x[1]).sqrt() - 1.5).abs() < 1e-6);
+            assert_eq!(x[2], 0.5);
+        }
+    }
+
+    #[test]
+    fn test_shared_bvh() {
+        // Two fields on the same grid sharing one BVH, and a field on a
+        // different grid whose cell indices overlap with it
+        let (coords, values) = cylinder(5, 17, 3);
+        let bvh = Arc::new(CellBvh::new(coords.view()));
+        let f = CurvilinearField::with_bvh(coords.view(), values.view(), Arc::clone(&bvh));
+        let g = CurvilinearField::with_bvh(coords.view(), values.view(), bvh);
+        let shifted = coords.mapv(|x| return x + 10.);
+        let h = CurvilinearField::new(shifted.view(), values.view());
+
+        let x = array![1.4 * f64::cos(0.8), 1.4 * f64::sin(0.8), 0.6];
+        assert_eq!(f.locate(x.view()).unwrap().0, [1, 8, 1]);
+        // The hint left by f is not used for h
+        assert!(h.locate(x.view()).is_none());
+        assert_eq!(h.locate((&x + 10.).view()).unwrap().0, [1, 8, 1]);
+        assert_eq!(g.locate(x.view()).unwrap().0, [1, 8, 1]);
+    }
+}
@@ -3,7 +3,7 @@ mod field_tests {
     use float_eq::assert_float_eq;
     use numpy::ndarray::{array, s, Array, Array4};
 
-    use super::super::field::VectorField;
+    use super::super::field::{cyclic_faces_match, VectorField};
 
     #[test]
     fn test_grid_idx() {
@@ -63,4 +63,34 @@ mod field_tests {
             assert_float_eq!(vec[i], expected[i], abs <= 0.000_000_1);
         }
     }
+
+    #[test]
+    fn test_cyclic_faces_match() {
+        let mut values: Array4<f64> = Array::zeros((3, 4, 5, 3));
+        values.slice_mut(s![.., 1, .., 0]).fill(1.);
+        values.slice_mut(s![.., .., 0, 1]).fill(f64::NAN);
+        values.slice_mut(s![.., .., 4, 1]).fill(f64::NAN);
+        assert!(cyclic_faces_match(values.view(), 0));
+        assert!(cyclic_faces_match(values.view(), 1));
+        assert!(cyclic_faces_match(values.view(), 2));
+
+        values[[2, 1, 3, 2]] = 1.;
+        assert!(!cyclic_faces_match(values.view(), 0));
+        assert!(cyclic_faces_match(values.view(), 1));
+        values[[1, 3, 4, 0]] = 1.;
+        assert!(!cyclic_faces_match(values.view(), 2));
+    }
+
+    #[test]
+    fn test_cyclic_faces_match_f32() {
+        let mut values: Array4<f32> = Array::zeros((3, 4, 5, 3));
+        values.slice_mut(s![.., .., 0, 1]).fill(f32::NAN);
+        values.slice_mut(s![.., .., 4, 1]).fill(f32::NAN);
+        assert!(cyclic_faces_match(values.view(), 0));
+        assert!(cyclic_faces_match(values.view(), 2));
+
+        values[[2, 1, 3, 2]] = 1.;
+        assert!(!cyclic_faces_match(values.view(), 0));
+        assert!(cyclic_faces_match(values.view(), 1));
+    }
 }
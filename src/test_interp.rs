@@ -1,7 +1,7 @@
 #[cfg(test)]
 mod interp_tests {
     use super::super::interp;
-    use numpy::ndarray::array;
+    use numpy::ndarray::{array, Array, Array3, Array4};
 
     #[test]
     fn test_interp_trilin() {
@@ -10,4 +10,35 @@ mod interp_tests {
         let b = interp::interp_trilinear(&values, &a);
         assert_eq!(b, 0.4);
     }
+
+    #[test]
+    fn test_interp_tricubic_hermite() {
+        // f = x^3 + xyz is cubic along each axis, so is reproduced exactly
+        // given exact derivatives
+        let f = |x: f64, y: f64, z: f64| return x * x * x + x * y * z;
+        let origin = [1., 2., -1.];
+        let size = array![2., 0.5, 1.5];
+
+        let mut values: Array3<f64> = Array::zeros((2, 2, 2));
+        let mut derivatives: Array4<f64> = Array::zeros((7, 2, 2, 2));
+        for ((i, j, k), value) in values.indexed_iter_mut() {
+            let x = origin[0] + i as f64 * size[0];
+            let y = origin[1] + j as f64 * size[1];
+            let z = origin[2] + k as f64 * size[2];
+            *value = f(x, y, z);
+            let d = [3. * x * x + y * z, x * z, x * y, z, y, x, 1.];
+            for n in 0..7 {
+                derivatives[[n, i, j, k]] = d[n];
+            }
+        }
+
+        let a = array![0.3, 0.8, 0.45];
+        let b = interp::interp_tricubic_hermite(&values, &derivatives, &a, &size);
+        let expected = f(
+            origin[0] + a[0] * size[0],
+            origin[1] + a[1] * size[1],
+            origin[2] + a[2] * size[2],
+        );
+        assert!((b - expected).abs() < 1e-12);
+    }
 }
@@ -0,0 +1,76 @@
+#[cfg(test)]
+mod interpolate_tests {
+    use numpy::ndarray::{array, Array, Array1, Array2, Array3, Array4};
+
+    use super::super::field::{RectilinearGrid, VectorField};
+    use super::super::interpolate::{interpolate_field, interpolate_scalars};
+
+    #[test]
+    fn test_interpolate_field() {
+        let xgrid = array![0., 0.2, 0.3];
+        let ygrid = array![0., 1.1, 1.2, 1.3];
+        let zgrid = array![0.0, 1.0, 50.0, 56.0, 100.0];
+        // A linear field, which tri-linear interpolation reproduces exactly
+        let mut field: Array4<f64> = Array::zeros((3, 4, 5, 3));
+        for ((i, j, k, c), value) in field.indexed_iter_mut() {
+            let x = [xgrid[i], ygrid[j], zgrid[k]];
+            *value = x[c] + 2. * x[(c + 1) % 3];
+        }
+        let cyclic = array![true, false, false];
+        let f = VectorField::new(
+            xgrid.view(),
+            ygrid.view(),
+            zgrid.view(),
+            field.view(),
+            cyclic.view(),
+        );
+
+        let points = array![
+            [0.15, 1.05, 0.05],
+            [0.25, 1.2, 50.0],
+            // Out of bounds in y
+            [0.25, 1.4, 50.0],
+            // Wraps around to x = 0.1
+            [0.4, 1.2, 50.0]
+        ];
+        let mut out: Array2<f64> = Array::zeros((4, 3));
+        interpolate_field(&f, points.view(), out.view_mut());
+
+        for i in [0, 1] {
+            for c in 0..3 {
+                let expected = points[[i, c]] + 2. * points[[i, (c + 1) % 3]];
+                assert!((out[[i, c]] - expected).abs() < 1e-10);
+            }
+        }
+        assert!(out.row(2).iter().all(|v| return v.is_nan()));
+        assert!((out[[3, 0]] - (0.1 + 2. * 1.2)).abs() < 1e-10);
+    }
+
+    #[test]
+    fn test_interpolate_scalars() {
+        let xgrid = Array::range(0., 4.1, 1.);
+        let ygrid = Array::range(0., 4.1, 2.);
+        let zgrid = Array::range(0., 4.1, 0.5);
+        let mut values: Array3<f64> = Array::zeros((5, 3, 9));
+        for ((i, j, k), value) in values.indexed_iter_mut() {
+            *value = xgrid[i] - ygrid[j] + 3. * zgrid[k];
+        }
+        let cyclic = array![false, false, false];
+        let grid = RectilinearGrid::new(xgrid.view(), ygrid.view(), zgrid.view(), cyclic.view());
+
+        let points = array![
+            [0.5, 0.5, 0.5],
+            [3.9, 1.2, 2.2],
+            [4., 4., 4.],
+            [-1., 0., 0.]
+        ];
+        let mut out: Array1<f64> = Array::zeros(4);
+        interpolate_scalars(&grid, values.view(), points.view(), out.view_mut());
+
+        for i in 0..3 {
+            let expected = points[[i, 0]] - points[[i, 1]] + 3. * points[[i, 2]];
+            assert!((out[i] - expected).abs() < 1e-10);
+        }
+        assert!(out[3].is_nan());
+    }
+}
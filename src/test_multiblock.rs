@@ -0,0 +1,134 @@
+#[cfg(test)]
+mod multiblock_tests {
+    use numpy::ndarray::{array, s, Array, Array1, Array4};
+
+    use super::super::field::{Field, VectorField};
+    use super::super::multiblock::{Block, MultiBlockField};
+    use super::super::trace::{trace_streamline, TracerStatus};
+
+    #[test]
+    fn test_block_idx() {
+        // A coarse block covering [0, 10]^3, and a fine block
+        // covering [4, 6]^3
+        let coarse_grid = Array::range(0., 10.1, 1.);
+        let fine_grid = Array::range(0., 2.01, 0.25);
+        let coarse_field: Array4<f64> = Array::zeros((11, 11, 11, 3));
+        let fine_field: Array4<f64> = Array::zeros((9, 9, 9, 3));
+        let cyclic = array![false, false, false];
+
+        let blocks = vec![
+            Block::new(
+                [0., 0., 0.],
+                0,
+                VectorField::new(
+                    coarse_grid.view(),
+                    coarse_grid.view(),
+                    coarse_grid.view(),
+                    coarse_field.view(),
+                    cyclic.view(),
+                ),
+            ),
+            Block::new(
+                [4., 4., 4.],
+                1,
+                VectorField::new(
+                    fine_grid.view(),
+                    fine_grid.view(),
+                    fine_grid.view(),
+                    fine_field.view(),
+                    cyclic.view(),
+                ),
+            ),
+        ];
+        let f = MultiBlockField::new(blocks);
+
+        assert_eq!(f.block_idx(array![1., 1., 1.].view()), Some(0));
+        assert_eq!(f.block_idx(array![5., 5., 5.].view()), Some(1));
+        assert_eq!(f.block_idx(array![6., 5., 4.].view()), Some(1));
+        assert_eq!(f.block_idx(array![6.5, 5., 5.].view()), Some(0));
+        assert_eq!(f.block_idx(array![11., 5., 5.].view()), None);
+    }
+
+    #[test]
+    fn test_many_blocks() {
+        // Split [0, 4]^3 into 64 unit blocks, enough to force the
+        // lookup octree to be subdivided
+        let grid = Array::range(0., 1.01, 0.5);
+        let field: Array4<f64> = Array::zeros((3, 3, 3, 3));
+        let cyclic = array![false, false, false];
+
+        let mut blocks = Vec::new();
+        for i in 0..4 {
+            for j in 0..4 {
+                for k in 0..4 {
+                    blocks.push(Block::new(
+                        [i as f64, j as f64, k as f64],
+                        0,
+                        VectorField::new(
+                            grid.view(),
+                            grid.view(),
+                            grid.view(),
+                            field.view(),
+                            cyclic.view(),
+                        ),
+                    ));
+                }
+            }
+        }
+        let f = MultiBlockField::new(blocks);
+
+        assert_eq!(f.block_idx(array![0.5, 0.5, 0.5].view()), Some(0));
+        assert_eq!(f.block_idx(array![3.5, 0.5, 0.5].view()), Some(48));
+        assert_eq!(f.block_idx(array![1.5, 2.5, 3.5].view()), Some(27));
+        assert_eq!(f.block_idx(array![3.5, 3.5, 3.5].view()), Some(63));
+    }
+
+    #[test]
+    fn test_trace_across_blocks() {
+        // Two blocks at different resolutions next to each other along x,
+        // with a uniform field pointing in the x direction
+        let coarse_grid = Array::range(0., 5.01, 1.);
+        let fine_grid = Array::range(0., 5.01, 0.5);
+        let mut coarse_field: Array4<f64> = Array::zeros((6, 6, 6, 3));
+        coarse_field.slice_mut(s![.., .., .., 0]).fill(1.);
+        let mut fine_field: Array4<f64> = Array::zeros((11, 11, 11, 3));
+        fine_field.slice_mut(s![.., .., .., 0]).fill(1.);
+        let cyclic = array![false, false, false];
+
+        let blocks = vec![
+            Block::new(
+                [0., 0., 0.],
+                0,
+                VectorField::new(
+                    coarse_grid.view(),
+                    coarse_grid.view(),
+                    coarse_grid.view(),
+                    coarse_field.view(),
+                    cyclic.view(),
+                ),
+            ),
+            Block::new(
+                [5., 0., 0.],
+                1,
+                VectorField::new(
+                    fine_grid.view(),
+                    fine_grid.view(),
+                    fine_grid.view(),
+                    fine_field.view(),
+                    cyclic.view(),
+                ),
+            ),
+        ];
+        let f = MultiBlockField::new(blocks);
+        assert_eq!(
+            f.vector_at_position(array![7., 2., 2.].view()),
+            array![1., 0., 0.]
+        );
+
+        let seed: Array1<f64> = array![0.5, 2.5, 2.5];
+        let result = trace_streamline(seed.view(), &f, &1, &0.1, 200);
+        // Should cross both blocks before leaving the domain at x = 10
+        assert_eq![result.status.rot, TracerStatus::OutOfBounds];
+        assert_eq![result.status.n_points, 96];
+    }
+}
@@ -0,0 +1,85 @@
+#[cfg(test)]
+mod nulls_tests {
+    use numpy::ndarray::{array, Array, Array4};
+
+    use super::super::field::RectilinearGrid;
+    use super::super::nulls::find_nulls;
+
+    /// Evaluate `f` at every point of a grid.
+    fn field_values<F: Fn(f64, f64, f64) -> [f64; 3]>(
+        xgrid: &[f64],
+        ygrid: &[f64],
+        zgrid: &[f64],
+        f: F,
+    ) -> Array4<f64> {
+        let mut values: Array4<f64> = Array::zeros((xgrid.len(), ygrid.len(), zgrid.len(), 3));
+        for ((i, j, k, c), value) in values.indexed_iter_mut() {
+            *value = f(xgrid[i], ygrid[j], zgrid[k])[c];
+        }
+        return values;
+    }
+
+    #[test]
+    fn test_find_nulls() {
+        let xgrid = Array::range(0., 4.1, 1.);
+        let ygrid = Array::range(0., 4.1, 1.);
+        let zgrid = Array::range(0., 2.1, 0.5);
+        let cyclic = array![false, false, false];
+        let grid = RectilinearGrid::new(xgrid.view(), ygrid.view(), zgrid.view(), cyclic.view());
+        let (x, y, z) = (
+            xgrid.as_slice().unwrap(),
+            ygrid.as_slice().unwrap(),
+            zgrid.as_slice().unwrap(),
+        );
+
+        // A single null inside a cell
+        let values = field_values(x, y, z, |x, y, z| {
+            return [x - 1.3, y - 2.1, -2. * (z - 0.7)];
+        });
+        let nulls = find_nulls(&grid, values.view());
+        assert_eq!(nulls.len(), 1);
+        assert_eq!(nulls[0].cell, [1, 2, 1]);
+        for (actual, expected) in nulls[0].position.iter().zip([1.3, 2.1, 0.7]) {
+            assert!((actual - expected).abs() < 1e-10);
+        }
+        let expected_jacobian = [[1., 0., 0.], [0., 1., 0.], [0., 0., -2.]];
+        for i in 0..3 {
+            for j in 0..3 {
+                assert!((nulls[0].jacobian[i][j] - expected_jacobian[i][j]).abs() < 1e-10);
+            }
+        }
+
+        // A null on a grid point shared by eight cells is only found once
+        let values = field_values(x, y, z, |x, y, z| {
+            return [x - 2., y - 2., -2. * (z - 1.)];
+        });
+        let nulls = find_nulls(&grid, values.view());
+        assert_eq!(nulls.len(), 1);
+        assert_eq!(nulls[0].position, [2., 2., 1.]);
+
+        // Two nulls on cell faces
+        let values = field_values(x, y, z, |x, y, z| {
+            return [(x - 1.) * (x - 3.), y - 2.5, z - 1.2];
+        });
+        let nulls = find_nulls(&grid, values.view());
+        assert_eq!(nulls.len(), 2);
+        assert!((nulls[0].position[0] - 1.).abs() < 1e-10);
+        assert!((nulls[1].position[0] - 3.).abs() < 1e-10);
+
+        // Nulls on the two x faces are the same null if x is cyclic
+        let values = field_values(x, y, z, |x, y, z| {
+            return [x * (x - 4.), y - 2.5, z - 1.2];
+        });
+        assert_eq!(find_nulls(&grid, values.view()).len(), 2);
+        let cyclic_x = array![true, false, false];
+        let cyclic_grid =
+            RectilinearGrid::new(xgrid.view(), ygrid.view(), zgrid.view(), cyclic_x.view());
+        let nulls = find_nulls(&cyclic_grid, values.view());
+        assert_eq!(nulls.len(), 1);
+        assert!(nulls[0].position[0].abs() < 1e-10);
+
+        // No nulls
+        let values = field_values(x, y, z, |x, _, _| return [x + 1., 0., 0.]);
+        assert!(find_nulls(&grid, values.view()).is_empty());
+    }
+}
@@ -0,0 +1,139 @@
+#[cfg(test)]
+mod render_tests {
+    use numpy::ndarray::{array, s, Array, Array2, Array4};
+
+    use super::super::field::VectorField;
+    use super::super::render::{deposit_density, line_integral_convolution};
+
+    #[test]
+    fn test_deposit_density() {
+        // A line along x from 0.5 to 3.5 in steps of 0.5, and a line outside the grid
+        let mut points: Array2<f64> = Array::zeros((9, 3));
+        for i in 0..7 {
+            points[[i, 0]] = 0.5 + 0.5 * i as f64;
+            points[[i, 1]] = 0.5;
+            points[[i, 2]] = 0.5;
+        }
+        points[[7, 0]] = 5.;
+        points[[8, 0]] = 6.;
+        let offsets = array![0, 7, 9];
+
+        let xedges = array![0., 1., 2., 3., 4.];
+        let yedges = array![0., 1.];
+        let zedges = array![0., 0.2, 1.];
+        let density = deposit_density(
+            points.view(),
+            offsets.view(),
+            [xedges.view(), yedges.view(), zedges.view()],
+        );
+
+        assert_eq!(density.shape(), &[4, 1, 2]);
+        assert_eq!(
+            density.slice(s![.., 0, 1]).to_vec(),
+            [0.5, 1., 1., 0.5].to_vec()
+        );
+        assert_eq!(density.slice(s![.., 0, 0]).sum(), 0.);
+    }
+
+    #[test]
+    fn test_line_integral_convolution() {
+        // A uniform field along x
+        let xgrid = Array::range(0., 10.1, 1.);
+        let ygrid = Array::range(0., 4.1, 1.);
+        let zgrid = array![0., 1.];
+        let mut values: Array4<f64> = Array::zeros((11, 5, 2, 3));
+        values.slice_mut(s![.., .., .., 0]).fill(1.);
+        let cyclic = array![false, false, false];
+        let field = VectorField::new(
+            xgrid.view(),
+            ygrid.view(),
+            zgrid.view(),
+            values.view(),
+            cyclic.view(),
+        );
+
+        // Noise that is constant along the field is unchanged
+        let noise = Array2::from_shape_fn((11, 5), |(_, j)| return j as f64);
+        let image = line_integral_convolution(
+            &field,
+            2,
+            0.5,
+            xgrid.view(),
+            ygrid.view(),
+            noise.view(),
+            3,
+            1.,
+            1,
+        );
+        assert_eq!(image, noise);
+
+        // Noise that alternates along the field is smoothed out
+        let noise = Array2::from_shape_fn((11, 5), |(i, _)| return (i % 2) as f64);
+        let image = line_integral_convolution(
+            &field,
+            2,
+            0.5,
+            xgrid.view(),
+            ygrid.view(),
+            noise.view(),
+            3,
+            1.,
+            2,
+        );
+        for value in image.iter() {
+            assert!((value - 0.5).abs() <= 0.25);
+        }
+    }
+
+    #[test]
+    fn test_line_integral_convolution_reproducible() {
+        // A field circling the z axis, and noise that varies between pixels
+        let xgrid = Array::range(0., 40.1, 1.);
+        let zgrid = array![0., 1.];
+        let mut values: Array4<f64> = Array::zeros((41, 41, 2, 3));
+        for ((i, j, _, c), value) in values.indexed_iter_mut() {
+            *value = [20. - j as f64, i as f64 - 20., 0.][c];
+        }
+        let cyclic = array![false, false, false];
+        let field = VectorField::new(
+            xgrid.view(),
+            xgrid.view(),
+            zgrid.view(),
+            values.view(),
+            cyclic.view(),
+        );
+        let noise = Array2::from_shape_fn((41, 41), |(i, j)| {
+            return ((i * 7919 + j * 104729) % 101) as f64;
+        });
+
+        // The image doesn't depend on the number of threads
+        let images: Vec<Array2<f64>> = [1, 3, 8]
+            .iter()
+            .map(|n_threads| {
+                let pool = rayon::ThreadPoolBuilder::new()
+                    .num_threads(*n_threads)
+                    .build()
+                    .unwrap();
+                return pool.install(|| {
+                    return line_integral_convolution(
+                        &field,
+                        2,
+                        0.5,
+                        xgrid.view(),
+                        xgrid.view(),
+                        noise.view(),
+                        5,
+                        1.,
+                        2,
+                    );
+                });
+            })
+            .collect();
+        for image in &images[1..] {
+            assert!(image
+                .iter()
+                .zip(images[0].iter())
+                .all(|(a, b)| return a == b || (a.is_nan() && b.is_nan())));
+        }
+    }
+}
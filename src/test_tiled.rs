@@ -0,0 +1,171 @@
+#[cfg(test)]
+mod tiled_tests {
+    use std::fs::File;
+    use std::io::Write;
+    use std::path::PathBuf;
+
+    use flate2::write::ZlibEncoder;
+    use flate2::Compression;
+    use numpy::ndarray::{array, s, Array, Array4};
+
+    use super::super::field::{Field, RectilinearGrid, VectorField};
+    use super::super::tiled::{
+        trace_tiled_streamlines, TileCache, TileDtype, TileStore, TiledField,
+    };
+    use super::super::trace::{trace_field_streamlines, TracerStatus};
+
+    /// Write `values` to a tile file with the given number of cells per tile,
+    /// returning the tile offsets.
+    fn write_tiles(path: &PathBuf, values: &Array4<f64>, tile_shape: [usize; 3]) -> Vec<u64> {
+        let shape = values.shape();
+        let mut file = File::create(path).unwrap();
+        let mut offsets = vec![0];
+        for i in (0..shape[0] - 1).step_by(tile_shape[0]) {
+            for j in (0..shape[1] - 1).step_by(tile_shape[1]) {
+                for k in (0..shape[2] - 1).step_by(tile_shape[2]) {
+                    let tile = values.slice(s![
+                        i..(i + tile_shape[0] + 1).min(shape[0]),
+                        j..(j + tile_shape[1] + 1).min(shape[1]),
+                        k..(k + tile_shape[2] + 1).min(shape[2]),
+                        ..
+                    ]);
+                    let mut encoder = ZlibEncoder::new(Vec::new(), Compression::default());
+                    for value in tile.iter() {
+                        encoder.write_all(&(*value as f32).to_le_bytes()).unwrap();
+                    }
+                    let compressed = encoder.finish().unwrap();
+                    file.write_all(&compressed).unwrap();
+                    offsets.push(offsets[offsets.len() - 1] + compressed.len() as u64);
+                }
+            }
+        }
+        return offsets;
+    }
+
+    #[test]
+    fn test_tiled_field() {
+        let xgrid = Array::range(0., 6.1, 1.);
+        let ygrid = Array::range(0., 4.1, 1.);
+        let zgrid = Array::range(0., 5.1, 1.);
+        // A field that varies in every direction
+        let mut field: Array4<f64> = Array::zeros((7, 5, 6, 3));
+        for ((i, j, k, c), value) in field.indexed_iter_mut() {
+            *value = (i + 2 * j + 3 * k + c) as f64;
+        }
+        let cyclic = array![false, false, false];
+
+        let path = std::env::temp_dir().join("streamtracer_test_tiled_field.bin");
+        let tile_shape = [2, 3, 2];
+        let offsets = write_tiles(&path, &field, tile_shape);
+        // 3 x 2 x 3 tiles
+        assert_eq!(offsets.len(), 19);
+
+        let store = TileStore::new(
+            path.clone(),
+            offsets,
+            [7, 5, 6],
+            tile_shape,
+            TileDtype::Float32,
+        )
+        .unwrap();
+        let grid = RectilinearGrid::new(xgrid.view(), ygrid.view(), zgrid.view(), cyclic.view());
+        // Budget for a single tile, so every tile change is a miss
+        let cache = TileCache::new(store, 1);
+        let tiled = TiledField::new(grid, &cache);
+        let f = VectorField::new(
+            xgrid.view(),
+            ygrid.view(),
+            zgrid.view(),
+            field.view(),
+            cyclic.view(),
+        );
+
+        for x in [
+            array![0.5, 0.5, 0.5],
+            array![2.5, 3.5, 1.0],
+            array![5.9, 3.9, 4.9],
+            array![6., 4., 5.],
+        ] {
+            assert_eq!(
+                tiled.vector_at_position(x.view()),
+                f.vector_at_position(x.view())
+            );
+        }
+        let stats = tiled.cache.stats();
+        assert_eq!(stats.hits, 1);
+        assert_eq!(stats.misses, 3);
+
+        let seeds = array![[0.5, 0.5, 0.5], [5.5, 3.5, 4.5], [0.5, 0.6, 0.5]];
+        let (statuses, xs) = trace_tiled_streamlines(seeds.view(), &tiled, 1, 0.1, 100);
+        // Streamlines are returned in the same order as the seeds
+        for i in 0..3 {
+            assert!(statuses[i].n_points > 1);
+            assert_eq!(xs.slice(s![i, 0, ..]), seeds.row(i));
+        }
+        // Samples in the last tile a streamline used are counted as hits
+        let stats = tiled.cache.stats();
+        assert!(stats.hits > 5 * stats.misses);
+        assert!(cache.take_error().is_none());
+
+        // Many seeds in a single tile, which are split between threads
+        let seeds = Array::from_shape_fn((64, 3), |(i, c)| {
+            return [0.1 + 0.02 * i as f64, 0.5, 0.5][c];
+        });
+        let pool = rayon::ThreadPoolBuilder::new()
+            .num_threads(4)
+            .build()
+            .unwrap();
+        let (statuses, xs) =
+            pool.install(|| return trace_tiled_streamlines(seeds.view(), &tiled, 1, 0.1, 100));
+        let (expected_statuses, expected_xs) =
+            trace_field_streamlines(seeds.view(), &f, 1, 0.1, 100);
+        assert_eq!(xs, expected_xs);
+        for (status, expected) in statuses.iter().zip(expected_statuses.iter()) {
+            assert_eq!(status.n_points, expected.n_points);
+        }
+
+        std::fs::remove_file(path).unwrap();
+    }
+
+    #[test]
+    fn test_corrupt_tile() {
+        let xgrid = array![0., 1., 2.];
+        let ygrid = array![0., 1.];
+        let zgrid = array![0., 1.];
+        let field: Array4<f64> = Array::ones((3, 2, 2, 3));
+        let cyclic = array![false, false, false];
+
+        let path = std::env::temp_dir().join("streamtracer_test_corrupt_tile.bin");
+        let tile_shape = [1, 1, 1];
+        let mut offsets = write_tiles(&path, &field, tile_shape);
+        // Truncate the first tile to its two byte zlib header
+        offsets[1] = 2;
+
+        let store = TileStore::new(
+            path.clone(),
+            offsets,
+            [3, 2, 2],
+            tile_shape,
+            TileDtype::Float32,
+        )
+        .unwrap();
+        let grid = RectilinearGrid::new(xgrid.view(), ygrid.view(), zgrid.view(), cyclic.view());
+        let cache = TileCache::new(store, 1000);
+        let tiled = TiledField::new(grid, &cache);
+
+        // Reading the truncated tile stores an error instead of panicking
+        assert!(tiled.vector_at_position(array![0.5, 0.5, 0.5].view())[0].is_nan());
+        let error = cache.take_error().unwrap();
+        assert!(error.to_lowercase().contains("tile 0"));
+        assert!(cache.take_error().is_none());
+
+        // Streamlines that need the tile stop after the first step
+        let seeds = array![[0.5, 0.5, 0.5]];
+        let (statuses, _) = trace_tiled_streamlines(seeds.view(), &tiled, 1, 0.1, 100);
+        assert_eq!(statuses[0].rot, TracerStatus::OutOfBounds);
+        assert_eq!(statuses[0].n_points, 1);
+        assert!(cache.take_error().is_some());
+
+        std::fs::remove_file(path).unwrap();
+    }
+}
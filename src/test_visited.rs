@@ -0,0 +1,36 @@
+#[cfg(test)]
+mod visited_tests {
+    use numpy::ndarray::{array, s, Array};
+
+    use super::super::field::VectorField;
+    use super::super::trace::TracerStatus;
+    use super::super::visited::trace_streamlines_recording;
+
+    #[test]
+    fn test_trace_streamlines_recording() {
+        let xgrid = Array::range(0., 4.1, 1.);
+        let ygrid = Array::range(0., 2.1, 1.);
+        let zgrid = Array::range(0., 3.1, 1.);
+        // A uniform field pointing in the x direction
+        let mut values = Array::zeros((5, 3, 4, 3));
+        values.slice_mut(s![.., .., .., 0]).fill(1.);
+        let cyclic = array![false, false, false];
+        let f = VectorField::new(
+            xgrid.view(),
+            ygrid.view(),
+            zgrid.view(),
+            values.view(),
+            cyclic.view(),
+        );
+
+        let seeds = array![[0.5, 1.5, 0.5], [2.5, 0.5, 2.5]];
+        let (statuses, _, cells) = trace_streamlines_recording(seeds.view(), &f, 1, 0.1, 100);
+        for status in statuses {
+            assert_eq!(status.rot, TracerStatus::OutOfBounds);
+        }
+        // Cells (0..4, 1, 0), flattened with 2 cells along y and 3 along z
+        assert_eq!(cells[0], vec![3, 9, 15, 21]);
+        // Cells (2..4, 0, 2)
+        assert_eq!(cells[1], vec![14, 20]);
+    }
+}
@@ -0,0 +1,506 @@
+//! Structure for representing a 3D vector field that is stored on disk
+//! as compressed tiles, and read into a bounded cache on demand.
+//!
+//! Tiles are stored one after another in a single file, each compressed
+//! with zlib. Tile `(i, j, k)` holds the vectors on grid points
+//! `[i * tx, (i + 1) * tx]` (inclusive) along x, and similarly along
+//! y and z, where `(tx, ty, tz)` is the number of cells in a tile.
+//! Neighbouring tiles therefore share a layer of grid points, so that the
+//! eight corners of any grid cell are all contained in a single tile.
+use std::cell::{Cell, RefCell};
+use std::collections::HashMap;
+use std::fs::File;
+use std::io::{Read, Seek, SeekFrom};
+use std::path::PathBuf;
+use std::sync::atomic::{AtomicU64, AtomicUsize, Ordering};
+use std::sync::{Arc, Mutex};
+
+use flate2::read::ZlibDecoder;
+use ndarray::parallel::prelude::*;
+use numpy::ndarray::{stack, Array1, Array2, Array3, Array4, ArrayView1, ArrayView2, Axis};
+
+use crate::field::{interp_cell, Bounds, Field, RectilinearGrid};
+use crate::trace::{trace_streamline, StreamlineStatus};
+
+/// Data type of the values stored in a tile file.
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum TileDtype {
+    /// Little-endian 32 bit floats.
+    Float32,
+    /// Little-endian 64 bit floats.
+    Float64,
+}
+
+/// Layout of a tile file on disk.
+pub struct TileStore {
+    /// Path to the tile file.
+    path: PathBuf,
+    /// Open handle to the tile file, shared by all the threads reading tiles.
+    file: Mutex<File>,
+    /// Byte offset of the start of each tile, followed by the total
+    /// file size. Must be shape (ntiles + 1,).
+    offsets: Vec<u64>,
+    /// Number of grid points along each dimension.
+    shape: [usize; 3],
+    /// Number of grid cells along each dimension of a tile.
+    tile_shape: [usize; 3],
+    /// Number of tiles along each dimension.
+    n_tiles: [usize; 3],
+    /// Data type of the stored values.
+    dtype: TileDtype,
+}
+
+impl TileStore {
+    /// Open a tile file, checking that the offsets match the number of tiles.
+    pub fn new(
+        path: PathBuf,
+        offsets: Vec<u64>,
+        shape: [usize; 3],
+        tile_shape: [usize; 3],
+        dtype: TileDtype,
+    ) -> std::io::Result<TileStore> {
+        let mut n_tiles = [0; 3];
+        for i in 0..3 {
+            assert!(
+                shape[i] >= 2,
+                "Grid must have at least two points along each dimension"
+            );
+            assert!(tile_shape[i] >= 1, "Tiles must be at least one cell wide");
+            n_tiles[i] = (shape[i] - 1).div_ceil(tile_shape[i]);
+        }
+        assert_eq!(offsets.len(), n_tiles[0] * n_tiles[1] * n_tiles[2] + 1);
+        let file = Mutex::new(File::open(&path)?);
+
+        return Ok(TileStore {
+            path,
+            file,
+            offsets,
+            shape,
+            tile_shape,
+            n_tiles,
+            dtype,
+        });
+    }
+
+    /// Return the flat index of the tile containing the cell `cell_idx`,
+    /// and the index of the cell relative to the tile origin.
+    pub fn tile_idx(&self, cell_idx: &Array1<usize>) -> (usize, Array1<usize>) {
+        let mut tile = [0; 3];
+        let mut local_idx = Array1::zeros(3);
+        for i in 0..3 {
+            tile[i] = cell_idx[i] / self.tile_shape[i];
+            local_idx[i] = cell_idx[i] - tile[i] * self.tile_shape[i];
+        }
+        let flat_idx = (tile[0] * self.n_tiles[1] + tile[1]) * self.n_tiles[2] + tile[2];
+        return (flat_idx, local_idx);
+    }
+
+    /// Number of grid points along each dimension of the tile `flat_idx`.
+    fn tile_dims(&self, flat_idx: usize) -> [usize; 3] {
+        let tile = [
+            flat_idx / (self.n_tiles[1] * self.n_tiles[2]),
+            (flat_idx / self.n_tiles[2]) % self.n_tiles[1],
+            flat_idx % self.n_tiles[2],
+        ];
+        let mut dims = [0; 3];
+        for i in 0..3 {
+            let start = tile[i] * self.tile_shape[i];
+            let end = (start + self.tile_shape[i]).min(self.shape[i] - 1);
+            dims[i] = end - start + 1;
+        }
+        return dims;
+    }
+
+    /// Read and decompress a single tile from disk.
+    ///
+    /// Returns the tile values, and the number of compressed bytes read, or
+    /// a description of the error if the tile could not be read.
+    pub fn read_tile(&self, flat_idx: usize) -> Result<(Array4<f64>, u64), String> {
+        let start = self.offsets[flat_idx];
+        let n_bytes = self.offsets[flat_idx + 1] - start;
+        let error = |err: std::io::Error| {
+            return format!(
+                "Could not read tile {flat_idx} from {}: {err}",
+                self.path.display()
+            );
+        };
+
+        let mut compressed = vec![0u8; n_bytes as usize];
+        {
+            let mut file = self.file.lock().unwrap();
+            file.seek(SeekFrom::Start(start)).map_err(error)?;
+            file.read_exact(&mut compressed).map_err(error)?;
+        }
+
+        let mut raw = Vec::new();
+        ZlibDecoder::new(&compressed[..])
+            .read_to_end(&mut raw)
+            .map_err(error)?;
+
+        let values: Vec<f64> = match self.dtype {
+            TileDtype::Float32 => raw
+                .chunks_exact(4)
+                .map(|b| return f32::from_le_bytes([b[0], b[1], b[2], b[3]]) as f64)
+                .collect(),
+            TileDtype::Float64 => raw
+                .chunks_exact(8)
+                .map(|b| {
+                    return f64::from_le_bytes([b[0], b[1], b[2], b[3], b[4], b[5], b[6], b[7]]);
+                })
+                .collect(),
+        };
+        let [sx, sy, sz] = self.tile_dims(flat_idx);
+        let n_values = values.len();
+        let tile = Array4::from_shape_vec((sx, sy, sz, 3), values).map_err(|_| {
+            return format!(
+                "Tile {flat_idx} in {} has {n_values} values, expected {}",
+                self.path.display(),
+                sx * sy * sz * 3
+            );
+        })?;
+        return Ok((tile, n_bytes));
+    }
+}
+
+/// Counters describing how well a [`TileCache`] performed.
+#[derive(Clone, Copy, Debug, Default)]
+pub struct CacheStats {
+    /// Number of tile lookups that were already in the cache.
+    pub hits: u64,
+    /// Number of tile lookups that had to be read from disk.
+    pub misses: u64,
+    /// Number of compressed bytes read from disk.
+    pub bytes_read: u64,
+    /// Number of bytes of decompressed tiles added to the cache.
+    pub bytes_decompressed: u64,
+}
+
+/// Contents of a [`TileCache`].
+struct CacheState {
+    /// Cached tiles, and the time each was last used.
+    tiles: HashMap<usize, (Arc<Array4<f64>>, u64)>,
+    /// Counter incremented on every lookup, used to order tiles by use.
+    clock: u64,
+    /// Total size of all cached tiles in bytes.
+    size_bytes: usize,
+}
+
+/// A least-recently-used cache of decompressed tiles, that can be shared
+/// between threads, and kept between traces.
+pub struct TileCache {
+    /// Tile file being cached.
+    store: TileStore,
+    /// Maximum total size of the cached tiles in bytes. At least one tile
+    /// is always kept, even if it is larger than this.
+    capacity_bytes: AtomicUsize,
+    /// Cached tiles.
+    state: Mutex<CacheState>,
+    /// The first error encountered reading a tile, if any.
+    error: Mutex<Option<String>>,
+    hits: AtomicU64,
+    misses: AtomicU64,
+    bytes_read: AtomicU64,
+    bytes_decompressed: AtomicU64,
+}
+
+impl TileCache {
+    /// Create a new empty cache.
+    pub fn new(store: TileStore, capacity_bytes: usize) -> TileCache {
+        return TileCache {
+            store,
+            capacity_bytes: AtomicUsize::new(capacity_bytes),
+            state: Mutex::new(CacheState {
+                tiles: HashMap::new(),
+                clock: 0,
+                size_bytes: 0,
+            }),
+            error: Mutex::new(None),
+            hits: AtomicU64::new(0),
+            misses: AtomicU64::new(0),
+            bytes_read: AtomicU64::new(0),
+            bytes_decompressed: AtomicU64::new(0),
+        };
+    }
+
+    /// Get a tile, reading it from disk if it is not already cached.
+    ///
+    /// Returns `None` if the tile could not be read, in which case the
+    /// error is stored and can be retrieved with [`TileCache::take_error`].
+    pub fn get(&self, flat_idx: usize) -> Option<Arc<Array4<f64>>> {
+        {
+            let mut state = self.state.lock().unwrap();
+            state.clock += 1;
+            let clock = state.clock;
+            if let Some(entry) = state.tiles.get_mut(&flat_idx) {
+                entry.1 = clock;
+                self.hits.fetch_add(1, Ordering::Relaxed);
+                return Some(entry.0.clone());
+            }
+        }
+
+        // Read the tile without holding the lock, so other threads can
+        // carry on using tiles that are already cached.
+        self.misses.fetch_add(1, Ordering::Relaxed);
+        let (tile, n_bytes) = match self.store.read_tile(flat_idx) {
+            Ok(result) => result,
+            Err(err) => {
+                let mut error = self.error.lock().unwrap();
+                if error.is_none() {
+                    *error = Some(err);
+                }
+                return None;
+            }
+        };
+        let tile_bytes = tile.len() * std::mem::size_of::<f64>();
+        self.bytes_read.fetch_add(n_bytes, Ordering::Relaxed);
+        self.bytes_decompressed
+            .fetch_add(tile_bytes as u64, Ordering::Relaxed);
+        let tile = Arc::new(tile);
+
+        let mut state = self.state.lock().unwrap();
+        state.clock += 1;
+        let clock = state.clock;
+        state.size_bytes += tile_bytes;
+        // Another thread may have read the same tile in the meantime
+        let replaced = state.tiles.insert(flat_idx, (tile.clone(), clock));
+        if let Some((old_tile, _)) = replaced {
+            state.size_bytes -= old_tile.len() * std::mem::size_of::<f64>();
+        }
+        // Evict least recently used tiles until under budget
+        let capacity_bytes = self.capacity_bytes.load(Ordering::Relaxed);
+        while state.size_bytes > capacity_bytes && state.tiles.len() > 1 {
+            let lru = *state
+                .tiles
+                .iter()
+                .filter(|entry| return *entry.0 != flat_idx)
+                .min_by_key(|entry| return (entry.1).1)
+                .unwrap()
+                .0;
+            let (old_tile, _) = state.tiles.remove(&lru).unwrap();
+            state.size_bytes -= old_tile.len() * std::mem::size_of::<f64>();
+        }
+        return Some(tile);
+    }
+
+    /// Change the maximum total size of the cached tiles. Tiles over the new
+    /// budget are evicted the next time a tile is read from disk.
+    pub fn set_capacity_bytes(&self, capacity_bytes: usize) {
+        self.capacity_bytes.store(capacity_bytes, Ordering::Relaxed);
+    }
+
+    /// Remove all tiles from the cache.
+    pub fn clear(&self) {
+        let mut state = self.state.lock().unwrap();
+        state.tiles.clear();
+        state.size_bytes = 0;
+    }
+
+    /// Return and clear the first error encountered reading a tile.
+    pub fn take_error(&self) -> Option<String> {
+        return self.error.lock().unwrap().take();
+    }
+
+    /// Current values of the cache counters.
+    pub fn stats(&self) -> CacheStats {
+        return CacheStats {
+            hits: self.hits.load(Ordering::Relaxed),
+            misses: self.misses.load(Ordering::Relaxed),
+            bytes_read: self.bytes_read.load(Ordering::Relaxed),
+            bytes_decompressed: self.bytes_decompressed.load(Ordering::Relaxed),
+        };
+    }
+
+    /// Reset the cache counters to zero.
+    pub fn reset_stats(&self) {
+        for counter in [
+            &self.hits,
+            &self.misses,
+            &self.bytes_read,
+            &self.bytes_decompressed,
+        ] {
+            counter.store(0, Ordering::Relaxed);
+        }
+    }
+}
+
+/// A 3D vector field defined at grid corners, stored in a tile file.
+pub struct TiledField<'a> {
+    /// Grid that the vectors are defined on.
+    pub grid: RectilinearGrid<'a>,
+    /// Cache of tiles read from disk.
+    pub cache: &'a TileCache,
+}
+
+impl TiledField<'_> {
+    /// Create a new TiledField, checking that the grid matches the tiles.
+    pub fn new<'a>(grid: RectilinearGrid<'a>, cache: &'a TileCache) -> TiledField<'a> {
+        assert_eq!(grid.shape(), cache.store.shape);
+        return TiledField { grid, cache };
+    }
+
+    /// Return a key for the tile containing `x`, such that tiles that are
+    /// close together in space have similar keys.
+    pub fn tile_key(&self, x: ArrayView1<f64>) -> u64 {
+        let cell_idx = self.grid.grid_idx(x);
+        let mut key = 0;
+        // Interleave the bits of the tile indices (a Morton/Z-order curve)
+        for bit in 0..21 {
+            for i in 0..3 {
+                let tile = (cell_idx[i] / self.cache.store.tile_shape[i]) as u64;
+                key |= ((tile >> bit) & 1) << (3 * bit + (2 - i));
+            }
+        }
+        return key;
+    }
+}
+
+impl Field for TiledField<'_> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        return TileCursor::new(self).vector_at_position(x);
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return self.grid.wrap_cyclic(x);
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        // Positions become NaN after a tile could not be read
+        if x.iter().any(|v| return !v.is_finite()) {
+            return Bounds::Out;
+        }
+        return self.grid.check_bounds(x);
+    }
+}
+
+/// A [`TiledField`] used to trace a single streamline, which keeps the last
+/// tile it used.
+///
+/// Consecutive samples along a streamline are almost always in the same
+/// tile, so checking the last tile first means the cache lock is only taken
+/// when the streamline moves into a different tile.
+struct TileCursor<'a, 'b> {
+    /// Field being traced through.
+    field: &'b TiledField<'a>,
+    /// Index of the last tile used, and its values.
+    last: RefCell<Option<(usize, Arc<Array4<f64>>)>>,
+    /// Number of lookups of the last tile, added to the cache hits when the
+    /// cursor is dropped.
+    hits: Cell<u64>,
+}
+
+impl<'a, 'b> TileCursor<'a, 'b> {
+    /// Create a new cursor, with no last tile.
+    fn new(field: &'b TiledField<'a>) -> TileCursor<'a, 'b> {
+        return TileCursor {
+            field,
+            last: RefCell::new(None),
+            hits: Cell::new(0),
+        };
+    }
+}
+
+impl Drop for TileCursor<'_, '_> {
+    fn drop(&mut self) {
+        self.field
+            .cache
+            .hits
+            .fetch_add(self.hits.get(), Ordering::Relaxed);
+    }
+}
+
+impl Field for TileCursor<'_, '_> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        let (cell_idx, cell_dist) = self.field.grid.cell_position(x);
+        let (flat_idx, local_idx) = self.field.cache.store.tile_idx(&cell_idx);
+        let mut last = self.last.borrow_mut();
+        if let Some((last_idx, tile)) = &*last {
+            if *last_idx == flat_idx {
+                self.hits.set(self.hits.get() + 1);
+                return interp_cell(&tile.view(), &local_idx, &cell_dist);
+            }
+        }
+        match self.field.cache.get(flat_idx) {
+            Some(tile) => {
+                let value = interp_cell(&tile.view(), &local_idx, &cell_dist);
+                *last = Some((flat_idx, tile));
+                return value;
+            }
+            // Stops the streamline, and the error is raised after tracing
+            None => return Array1::from_elem(3, f64::NAN),
+        }
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return self.field.wrap_cyclic(x);
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        return self.field.check_bounds(x);
+    }
+}
+
+/// Trace streamlines through a tiled field.
+///
+/// Each streamline keeps the last tile it used, and only looks up tiles in the
+/// shared cache when it moves into a different tile. Seeds are grouped by the
+/// tile they start in, so that consecutive streamlines on a thread reuse the
+/// same tiles. Groups are ordered along a Z-order curve, so that threads
+/// starting on neighbouring groups tend to need neighbouring tiles. Groups
+/// larger than an even share of the seeds between the threads are split up, so
+/// that seeds that all start in a few tiles are still traced in parallel. The
+/// returned streamlines are in the same order as `seeds`.
+///
+/// If a tile cannot be read, streamlines that need it end as if they had
+/// left the grid, and the error can be retrieved from the cache with
+/// [`TileCache::take_error`].
+///
+/// # Parameters
+///
+/// * `seeds` - Seed points for streamlines. Must be shape (nseeds, 3).
+/// * `field` - Tiled field to track through.
+/// * `direction` - Direction to trace in, `1` for forwards, `-1` for backwards.
+/// * `step_size` - Size of each individual step to take.
+/// * `max_steps` - Maximum number of steps to take per streamline.
+///   This directly sets the size of the output streamline array.
+pub fn trace_tiled_streamlines(
+    seeds: ArrayView2<f64>,
+    field: &TiledField,
+    direction: i32,
+    step_size: f64,
+    max_steps: usize,
+) -> (Vec<StreamlineStatus>, Array3<f64>) {
+    let mut order: Vec<(u64, usize)> = (0..seeds.nrows())
+        .map(|i| return (field.tile_key(seeds.row(i)), i))
+        .collect();
+    order.sort_unstable();
+    let max_group_size = seeds.nrows().div_ceil(rayon::current_num_threads()).max(1);
+    let groups: Vec<&[(u64, usize)]> = order
+        .chunk_by(|a, b| return a.0 == b.0)
+        .flat_map(|group| return group.chunks(max_group_size))
+        .collect();
+
+    let mut results: Vec<(usize, StreamlineStatus, Array2<f64>)> = groups
+        .into_par_iter()
+        .flat_map_iter(|group| {
+            return group.iter().map(|&(_, i)| {
+                let cursor = TileCursor::new(field);
+                let result =
+                    trace_streamline(seeds.row(i), &cursor, &direction, &step_size, max_steps);
+                return (i, result.status, result.line);
+            });
+        })
+        .collect();
+
+    // Put streamlines back in the order of the seeds
+    results.sort_unstable_by_key(|result| return result.0);
+    let statuses = results
+        .iter()
+        .map(|result| return result.1.clone())
+        .collect();
+    let lines: Vec<ArrayView2<f64>> = results
+        .iter()
+        .map(|result| return result.2.view())
+        .collect();
+    let xs = stack(Axis(0), &lines).unwrap();
+    return (statuses, xs);
+}
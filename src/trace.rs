@@ -2,10 +2,10 @@
 use ndarray::parallel::prelude::*;
 use num_derive::ToPrimitive;
 use numpy::ndarray::{
-    stack, Array, Array1, Array2, Array3, ArrayView1, ArrayView2, ArrayView4, Axis,
+    stack, Array, Array1, Array2, Array3, ArrayView1, ArrayView2, ArrayView4, ArrayView5, Axis,
 };
 
-use crate::field::{Bounds, VectorField};
+use crate::field::{Bounds, Field, VectorField};
 /// Enum denoting status of the streamline tracer
 #[derive(PartialEq, Debug, ToPrimitive, Clone, Copy)]
 pub enum TracerStatus {
@@ -41,7 +41,10 @@ pub struct StreamlineResult {
 /// # Parameters
 ///
 /// * `seeds` - Seed points for streamlines. Must be shape (nseeds, 3).
-/// * `field` - Vector field to track through.
+/// * `xgrid`, `ygrid`, `zgrid`, `values`, `cyclic` - Vector field to track
+///   through, see [`VectorField::new`].
+/// * `derivatives` - Optional derivatives of the field, to use tricubic Hermite
+///   interpolation. See [`VectorField::with_derivatives`].
 /// * `direction` - Direction to trace in, `1` for forwards, `-1` for backwards.
 /// * `step_size` - Size of each individual step to take.
 /// * `max_steps` - Maximum number of steps to take per streamline.
@@ -54,18 +57,41 @@ pub fn trace_streamlines<'a>(
     zgrid: ArrayView1<'a, f64>,
     values: ArrayView4<'a, f64>,
     cyclic: ArrayView1<'a, bool>,
+    derivatives: Option<ArrayView5<'a, f64>>,
     direction: i32,
     step_size: f64,
     max_steps: usize,
 ) -> (Vec<StreamlineStatus>, Array3<f64>) {
-    let field = VectorField::new(xgrid, ygrid, zgrid, values, cyclic);
+    let mut field = VectorField::new(xgrid, ygrid, zgrid, values, cyclic);
+    if let Some(derivatives) = derivatives {
+        field = field.with_derivatives(derivatives);
+    }
+    return trace_field_streamlines(seeds, &field, direction, step_size, max_steps);
+}
 
+/// Trace streamlines through any [`Field`].
+///
+/// # Parameters
+///
+/// * `seeds` - Seed points for streamlines. Must be shape (nseeds, 3).
+/// * `field` - Field to track through.
+/// * `direction` - Direction to trace in, `1` for forwards, `-1` for backwards.
+/// * `step_size` - Size of each individual step to take.
+/// * `max_steps` - Maximum number of steps to take per streamline.
+///   This directly sets the size of the output streamline array.
+pub fn trace_field_streamlines<F: Field + Sync>(
+    seeds: ArrayView2<f64>,
+    field: &F,
+    direction: i32,
+    step_size: f64,
+    max_steps: usize,
+) -> (Vec<StreamlineStatus>, Array3<f64>) {
     // Trace from each seed in turn
     let (statuses, extracted_lines): (Vec<StreamlineStatus>, Vec<Array2<f64>>) = seeds
         .axis_iter(Axis(0))
         .into_par_iter()
         .map(|seed| {
-            let result = trace_streamline(seed, &field, &direction, &step_size, max_steps);
+            let result = trace_streamline(seed, field, &direction, &step_size, max_steps);
             return (result.status, result.line);
         })
         .unzip();
@@ -86,9 +112,9 @@ pub fn trace_streamlines<'a>(
 /// - `direction`: Direction to trace in. Can be 1 for forwards or -1 for backwards.
 /// - `step_size`: Step size to take.
 /// - `max_steps`: The maximum number of steps to take.
-pub fn trace_streamline(
+pub fn trace_streamline<F: Field>(
     x0: ArrayView1<f64>,
-    field: &VectorField,
+    field: &F,
     direction: &i32,
     step_size: &f64,
     max_steps: usize,
@@ -146,7 +172,7 @@ pub fn trace_streamline(
 }
 
 // Update a coordinate (`x`) by taking a single RK4 step
-fn rk4_update(mut x: Array1<f64>, field: &VectorField, step_size: &f64) -> Array1<f64> {
+fn rk4_update<F: Field>(mut x: Array1<f64>, field: &F, step_size: &f64) -> Array1<f64> {
     let mut xu = x.clone();
     let k1 = stream_function(xu.view(), field, step_size);
 
@@ -166,7 +192,7 @@ fn rk4_update(mut x: Array1<f64>, field: &VectorField, step_size: &f64) -> Array
 
 /// Return the step that a linear tracing method would take
 /// at a given position.
-fn stream_function(x: ArrayView1<f64>, field: &VectorField, step_size: &f64) -> Array1<f64> {
+fn stream_function<F: Field>(x: ArrayView1<f64>, field: &F, step_size: &f64) -> Array1<f64> {
     let vec = field.vector_at_position(x);
     let vmag = (vec[[0]].powf(2.) + vec[[1]].powf(2.) + vec[[2]].powf(2.)).sqrt();
     return (*step_size) * vec / vmag;
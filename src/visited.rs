@@ -0,0 +1,107 @@
+//! Recording which grid cells streamlines pass through, so that streamlines
+//! only need re-tracing when the field changes in one of those cells.
+use std::cell::RefCell;
+
+use ndarray::parallel::prelude::*;
+use numpy::ndarray::{stack, Array1, Array2, Array3, ArrayView1, ArrayView2, Axis};
+
+use crate::field::{Bounds, Field, VectorField};
+use crate::trace::{trace_streamline, StreamlineStatus};
+
+/// A wrapper around a [`VectorField`] that records the cells it is sampled in.
+///
+/// Cells are stored as flattened indices, `(i * (ny - 1) + j) * (nz - 1) + k`
+/// for the cell with index `(i, j, k)` on a grid with (nx, ny, nz) points.
+/// A `RecordingField` is not `Sync`, so a new one should be created for each
+/// streamline.
+pub struct RecordingField<'a, 'b> {
+    /// Field being sampled.
+    pub field: &'b VectorField<'a>,
+    /// Cells the field has been sampled in, in the order they were sampled.
+    cells: RefCell<Vec<usize>>,
+}
+
+impl<'a, 'b> RecordingField<'a, 'b> {
+    /// Create a new RecordingField, with no cells recorded.
+    pub fn new(field: &'b VectorField<'a>) -> RecordingField<'a, 'b> {
+        return RecordingField {
+            field,
+            cells: RefCell::new(Vec::new()),
+        };
+    }
+
+    /// Consume the recorder, returning the sorted and deduplicated
+    /// flattened indices of the cells it was sampled in.
+    pub fn into_cells(self) -> Vec<usize> {
+        let mut cells = self.cells.into_inner();
+        cells.sort_unstable();
+        cells.dedup();
+        return cells;
+    }
+}
+
+impl Field for RecordingField<'_, '_> {
+    fn vector_at_position(&self, x: ArrayView1<f64>) -> Array1<f64> {
+        let cell_idx = self.field.grid_idx(x);
+        let shape = self.field.grid.shape();
+        let cell = (cell_idx[0] * (shape[1] - 1) + cell_idx[1]) * (shape[2] - 1) + cell_idx[2];
+        let mut cells = self.cells.borrow_mut();
+        // Consecutive samples are usually in the same cell
+        if cells.last() != Some(&cell) {
+            cells.push(cell);
+        }
+        return self.field.vector_at_position(x);
+    }
+
+    fn wrap_cyclic(&self, x: Array1<f64>) -> Array1<f64> {
+        return self.field.wrap_cyclic(x);
+    }
+
+    fn check_bounds(&self, x: ArrayView1<f64>) -> Bounds {
+        return self.field.check_bounds(x);
+    }
+}
+
+/// Trace streamlines, recording the cells that each streamline passes through.
+///
+/// # Parameters
+///
+/// * `seeds` - Seed points for streamlines. Must be shape (nseeds, 3).
+/// * `field` - Field to track through.
+/// * `direction` - Direction to trace in, `1` for forwards, `-1` for backwards.
+/// * `step_size` - Size of each individual step to take.
+/// * `max_steps` - Maximum number of steps to take per streamline.
+///
+/// Returns the same as [`crate::trace::trace_field_streamlines`], along with
+/// the sorted flattened indices of the cells each streamline passes through.
+/// This includes every cell the field is sampled in, including those of the
+/// intermediate RK4 steps.
+pub fn trace_streamlines_recording(
+    seeds: ArrayView2<f64>,
+    field: &VectorField,
+    direction: i32,
+    step_size: f64,
+    max_steps: usize,
+) -> (Vec<StreamlineStatus>, Array3<f64>, Vec<Vec<usize>>) {
+    let results: Vec<(StreamlineStatus, Array2<f64>, Vec<usize>)> = seeds
+        .axis_iter(Axis(0))
+        .into_par_iter()
+        .map(|seed| {
+            let recorder = RecordingField::new(field);
+            let result = trace_streamline(seed, &recorder, &direction, &step_size, max_steps);
+            return (result.status, result.line, recorder.into_cells());
+        })
+        .collect();
+
+    let mut statuses = Vec::with_capacity(results.len());
+    let mut lines = Vec::with_capacity(results.len());
+    let mut cells = Vec::with_capacity(results.len());
+    for (status, line, line_cells) in results {
+        statuses.push(status);
+        lines.push(line);
+        cells.push(line_cells);
+    }
+    let line_views: Vec<ArrayView2<f64>> = lines.iter().map(|arr| return arr.view()).collect();
+    let xs = stack(Axis(0), &line_views).unwrap();
+    return (statuses, xs, cells);
+}